@@ -1,8 +1,8 @@
 import numpy as np
 import logging
 
+from Analytics.Benchmarks import Benchmarks
 from Utilities import Consts
-from Utilities.DataHelper import DataHelper
 import pandas as pd
 import os
 from Utilities import TimeHelper
@@ -12,17 +12,16 @@ logger = logging.getLogger("Analytics Factory")
 # risk free rate represents us.treasury bill. need to be update every according to time interval change  - https://www.treasury.gov/resource-center/data-chart-center/interest-rates/Pages/TextView.aspx?data=yield
 risk_free_rate = 0.005
 
-_data_helper = DataHelper()
-
-
-def start(start_running_time, coins_for_benchmark, df_simulation, positions_history, capital_history):
+def start(start_running_time, coins_for_benchmark, df_simulation, positions_history, capital_history,
+          df_duplicates=None, benchmarks=None):
     """
     function "get statistics" was build before in version one. and this function arrange the dataframe to
     be sent to "get statistics" correctly. acc = [{date_time,capital},..],benchmark = [{date_time,capital},..]
     :param simulation_result_with_benchmark: dataframe with acc capital and benchmarks capital example pd.DataFrame(
     #     data={'date_time': ['1483228800', '1483232400', '1483236000', '1483239600'],
     #           'capital': [123, 213, 342, 44324], 'benchmark_BTC': [222, 222, 222, 222],
-    :return: dataframe {'subject': ['ACC-BTC', 'ACC-ETH'],
+    :return: list of the results of the simulation and its equivalent simulations, see simulation_result.
+    #     The analytics dataframe of a result is {'subject': ['ACC-BTC', 'ACC-ETH'],
     #                 'alpha': [123, 213, 342, 44324], 'betta': [222, 222, 222, 222],
     #                 'benchmark_ETH': [222, 222, 222, 222], 'rsquared': [222, 222, 222, 222],
     """
@@ -35,14 +34,87 @@ def start(start_running_time, coins_for_benchmark, df_simulation, positions_hist
     #                 'benchmark_ETH': [222, 222, 222, 222], 'rsquared': [222, 222, 222, 222],
     #                 'standard_deviation': [222, 222, 222, 222], 'sharp_ratio': [222, 222, 222, 222]}
 
-    path = os.path.join(Consts.PATH_TO_WRITE_RESULT,
-                        TimeHelper.epoch_to_date_time(start_running_time).strftime(Consts.WRITE_DATE_FORMAT),
-                        str(df_simulation.index[0]))
-    os.makedirs(path, exist_ok=True)
+    return start_many(start_running_time, coins_for_benchmark, [df_simulation], [positions_history],
+                      [capital_history], [df_duplicates], benchmarks)
 
-    positions_history.to_csv(os.path.join(path, 'positions.csv'), index=False)
-    df_simulation.index.names = ['simulation_id']
-    df_simulation.to_csv(os.path.join(path, 'simulation.csv'))
+
+def start_many(start_running_time, coins_for_benchmark, df_simulations, positions_histories, capital_histories,
+               duplicates, benchmarks=None):
+    """
+    Creates the result files of many simulations like start, the statistics of the simulations with the same amount of
+    ticks are computed together.
+    :param start_running_time:
+    :param coins_for_benchmark:
+    :param df_simulations: list of a single row of simulation params per simulation
+    :param positions_histories: list of positions history df per simulation
+    :param capital_histories: list of capital history df per simulation (as created by CapitalHistory.to_df)
+    :param duplicates: list of df of the equivalent simulations (or None) per simulation
+    :param benchmarks: Benchmarks computed once for all simulations, None computes them for every simulation
+    :return: list of the results (see simulation_result) of every simulation and every equivalent simulation
+    """
+    acc_capital_with_banchmark_dfs = []
+    benchmark_column_names = []
+    simulations_by_length = {}
+    for position, (df_simulation, capital_history) in enumerate(zip(df_simulations, capital_histories)):
+        acc_capital_with_banchmark_df, benchmark_column_names = _capital_with_benchmarks(
+            capital_history, coins_for_benchmark, df_simulation['amount_of_capital'].iloc[0], benchmarks)
+        acc_capital_with_banchmark_dfs.append(acc_capital_with_banchmark_df)
+        simulations_by_length.setdefault(len(acc_capital_with_banchmark_df), []).append(position)
+
+    analytics_result_dfs = [None] * len(df_simulations)
+    for positions in simulations_by_length.values():
+        statistics = get_statistics_many(
+            np.array([acc_capital_with_banchmark_dfs[position]['capital'].values for position in positions]),
+            np.array([[acc_capital_with_banchmark_dfs[position][column_benchmark].values
+                       for column_benchmark in benchmark_column_names] for position in positions]))
+
+        for row, position in enumerate(positions):
+            analytics_result_list = []
+            for column, column_benchmark in enumerate(benchmark_column_names):
+                temp_obj = {'simulation_id': df_simulations[position].index[0],
+                            'subject': 'ACC-{}'.format(column_benchmark)}
+                temp_obj.update({name: values[row, column] for name, values in statistics.items()})
+                analytics_result_list.append(temp_obj)
+            analytics_result_dfs[position] = pd.DataFrame(data=analytics_result_list)
+
+    results = []
+    for position in range(len(df_simulations)):
+        acc_capital_with_banchmark_df = acc_capital_with_banchmark_dfs[position]
+        analytics_result_df = analytics_result_dfs[position]
+        analytics_result_df['ACC_ROI'] = (acc_capital_with_banchmark_df['capital'].values[-1] /
+                                          acc_capital_with_banchmark_df['capital'].values[0]) - 1
+
+        last_row_capital_history = capital_histories[position].tail(1).copy()
+
+        # Equivalent simulations have the same results, only their params are different
+        df_simulations_params = [df_simulations[position]]
+        df_duplicates = duplicates[position]
+        if df_duplicates is not None:
+            df_simulations_params += [df_duplicates.iloc[[duplicate_position]]
+                                      for duplicate_position in range(len(df_duplicates))]
+        for df_simulation in df_simulations_params:
+            result = simulation_result(df_simulation, positions_histories[position], acc_capital_with_banchmark_df,
+                                       analytics_result_df, last_row_capital_history)
+            strip_details(result)
+            # When only the top simulations are retained their files are written at the end of the run
+            if Consts.RESULT_STORE_FORMAT == Consts.RESULT_STORE_CSV and Consts.RETAIN_TOP_AMOUNT is None:
+                write_results(start_running_time, result)
+                # The files hold the details, only the analytics are sent back
+                result['positions'], result['capital_history'] = None, None
+            results.append(result)
+
+    return results
+
+
+def _capital_with_benchmarks(capital_history, coins_for_benchmark, amount_of_capital, benchmarks=None):
+    """
+    Adds the total capital and the benchmarks to the capital history
+    :param capital_history: df as created by CapitalHistory.to_df, the capital and benchmarks columns are added to it
+    :param coins_for_benchmark:
+    :param amount_of_capital: the initial capital of the simulation
+    :param benchmarks: Benchmarks computed once for all simulations or None
+    :return: df of the capital history with benchmarks indexed by date_time, the benchmarks column names
+    """
     capital_history['date_time'] = pd.to_datetime(capital_history['date_time'], format=Consts.READ_DATE_FORMAT).apply(
         lambda x: TimeHelper.datetime_to_epoch(x))
     capital_history['capital'] = capital_history['liquid_capital'] + capital_history['shorts_capital'] + \
@@ -51,42 +123,79 @@ def start(start_running_time, coins_for_benchmark, df_simulation, positions_hist
     # acc_capital = capital_history.drop(capital_history.columns.difference(['capital', 'date_time']), 1).to_dict(
     #     'record')
     acc_capital_with_banchmark_df, benchmark_column_names = add_benchmarks(capital_history, coins_for_benchmark,
-                                                                           df_simulation['amount_of_capital'].iloc[0])
+                                                                           amount_of_capital, benchmarks)
 
     acc_capital_with_banchmark_df['date_time'] = acc_capital_with_banchmark_df['date_time'].apply(
         lambda x: TimeHelper.epoch_to_date_time(x))
     acc_capital_with_banchmark_df.set_index('date_time', inplace=True)
     acc_capital_with_banchmark_df.sort_index(inplace=True)
-    acc_capital_with_banchmark_df.to_csv(os.path.join(path, 'capital_history.csv'))
+    return acc_capital_with_banchmark_df, benchmark_column_names
 
-    analytics_result_list = []
-    for column_benchmark in benchmark_column_names:
-        temp_obj = get_statistics(df_simulation.index[0], 'ACC-{}'.format(column_benchmark),
-                                  acc_capital_with_banchmark_df['capital'].values,
-                                  acc_capital_with_banchmark_df[column_benchmark].values)
-        analytics_result_list.append(temp_obj)
 
-    analytics_result_df = pd.DataFrame(
-        data=analytics_result_list)
-    analytics_result_df['ACC_ROI'] = (acc_capital_with_banchmark_df['capital'].values[-1] /
-                                      acc_capital_with_banchmark_df['capital'].values[0]) - 1
+def simulation_result(df_simulation, positions_history, acc_capital_with_banchmark_df, analytics_result_df,
+                      last_row_capital_history):
+    """
+    :param df_simulation: a single row of simulation params, the index is the simulation id
+    :param positions_history: df
+    :param acc_capital_with_banchmark_df: df of the capital history with benchmarks, indexed by date_time
+    :param analytics_result_df: df of the statistics per benchmark
+    :param last_row_capital_history: df of the last row of the capital history
+    :return: {'simulation_id': id, 'simulation': df_simulation, 'positions': positions_history,
+     'capital_history': acc_capital_with_banchmark_df,
+     'analytics': df of the analytics of the simulation, a row per benchmark indexed by simulation_id}
+    """
+    simulation_id = df_simulation.index[0]
+    df_simulation.index.names = ['simulation_id']
 
-    last_row_capital_history = capital_history.tail(1).copy()
-    last_row_capital_history['simulation_id'] = df_simulation.index[0]
+    analytics_result_df = analytics_result_df.copy()
+    analytics_result_df['simulation_id'] = simulation_id
+    last_row_capital_history = last_row_capital_history.copy()
+    last_row_capital_history['simulation_id'] = simulation_id
 
     last_row_capital_history.set_index(['simulation_id'], inplace=True)
     analytics_result_df.set_index(['simulation_id'], inplace=True)
 
     analytics_result_df = analytics_result_df.join(df_simulation).join(last_row_capital_history)
 
-    path_to_analytics = os.path.join(Consts.PATH_TO_WRITE_RESULT,
-                                     TimeHelper.epoch_to_date_time(start_running_time).strftime(
-                                         Consts.WRITE_DATE_FORMAT), 'analytics')
+    return {'simulation_id': simulation_id, 'simulation': df_simulation, 'positions': positions_history,
+            'capital_history': acc_capital_with_banchmark_df, 'analytics': analytics_result_df}
+
+
+def strip_details(result):
+    """
+    Removes the frames of the result which are not written in Consts.OUTPUT_LEVEL
+    :param result: dict as created by simulation_result
+    :return:
+    """
+    if Consts.OUTPUT_LEVEL != Consts.OUTPUT_LEVEL_FULL:
+        result['positions'] = None
+    if Consts.OUTPUT_LEVEL == Consts.OUTPUT_LEVEL_SUMMARY:
+        result['capital_history'] = None
+
+
+def write_results(start_running_time, result):
+    """
+    Writes the result files of a simulation (positions, params and capital history) into a directory per simulation,
+    only the frames which are in the result (see strip_details)
+    :param start_running_time:
+    :param result: dict as created by simulation_result
+    :return:
+    """
+    if result['positions'] is None and result['capital_history'] is None:
+        return
+    path = os.path.join(Consts.PATH_TO_WRITE_RESULT,
+                        TimeHelper.epoch_to_date_time(start_running_time).strftime(Consts.WRITE_DATE_FORMAT),
+                        str(result['simulation_id']))
+    os.makedirs(path, exist_ok=True)
+
+    if result['positions'] is not None:
+        result['positions'].to_csv(os.path.join(path, 'positions.csv'), index=False)
+    result['simulation'].to_csv(os.path.join(path, 'simulation.csv'))
+    if result['capital_history'] is not None:
+        result['capital_history'].to_csv(os.path.join(path, 'capital_history.csv'))
+    logger.info('Finish creating result files for simulation ID: {}, you can look in: {}'.format(
+        result['simulation_id'], path))
 
-    os.makedirs(path_to_analytics, exist_ok=True)
-    path_to_create_result = os.path.join(path_to_analytics, 'Simulation__{}__Analytics.csv'.format(df_simulation.index[0]))
-    analytics_result_df.to_csv(path_to_create_result , index=True)
-    logger.info('Finish creating analytics file for simulation ID: {}, you can look in: {}'.format(df_simulation.index[0], path_to_create_result))
 
 def get_statistics(simulation_id, subject, acc_storyline, benchmark_storyline):
     """
@@ -96,25 +205,49 @@ def get_statistics(simulation_id, subject, acc_storyline, benchmark_storyline):
     :return: {'alpha': alpha, 'beta': beta, 'rsquared': rsquared, 'standard_deviation': standard_deviation,
             'sharp_ratio': sharp_ratio}
     """
+    statistics = get_statistics_many(np.array([acc_storyline], dtype=np.float64),
+                                     np.array([[benchmark_storyline]], dtype=np.float64))
+    return dict({'simulation_id': simulation_id, 'subject': subject},
+                **{name: values[0, 0] for name, values in statistics.items()})
+
 
-    # acc storyline       = {'capital': capital, 'date_time': current_time}
-    # benchmark_storyline = {'capital': capital, 'date_time': current_time}
+def get_statistics_many(acc_storylines, benchmark_storylines):
+    """
+    The statistics of many capital curves against many benchmarks in one pass, the same values as get_statistics
+    for every pair of curve and benchmark.
+    :param acc_storylines: np.array shape (simulations, ticks) of the capital of every simulation
+    :param benchmark_storylines: np.array shape (benchmarks, ticks), or (simulations, benchmarks, ticks) when every
+     simulation has its own benchmarks (e.x. different amount of capital)
+    :return: {'alpha': np.array shape (simulations, benchmarks), 'beta': .., 'rsquared': ..,
+     'standard_deviation': .., 'sharp_ratio': ..}
+    """
+    acc_storylines = np.asarray(acc_storylines, dtype=np.float64)[:, np.newaxis, :]
+    benchmark_storylines = np.asarray(benchmark_storylines, dtype=np.float64)
+    if benchmark_storylines.ndim == 2:
+        benchmark_storylines = benchmark_storylines[np.newaxis, :, :]
 
-    # acc storyline = [capital1,capital2,capital3]
-    # benchmark_only_price = [capital1, capital2, capital3]
-    acc_prices_percentage_change = arrange_by_percentage_change(acc_storyline)
-    benchmark_prices_percentage_change = arrange_by_percentage_change(benchmark_storyline)
-    # acc storyline = [capital1%,capital2%,capital3%]
-    # benchmark_only_price = [capital1%, capital2%, capital3%]
+    acc_prices_percentage_change = percentage_changes(acc_storylines)
+    benchmark_prices_percentage_change = percentage_changes(benchmark_storylines)
     beta = _beta(benchmark_prices_percentage_change, acc_prices_percentage_change)
-    alpha = _alpha(benchmark_storyline, acc_storyline, beta)
-    rsquared = _rsquared(benchmark_storyline, acc_storyline)
+    alpha = _alpha(benchmark_storylines, acc_storylines, beta)
+    rsquared = _rsquared(benchmark_storylines, acc_storylines)
     standard_deviation = _standard_deviation(acc_prices_percentage_change)
     sharp_ratio = _sharp_ratio(acc_prices_percentage_change, standard_deviation)
 
-    return {'simulation_id': simulation_id, 'subject': subject, 'alpha': alpha, 'beta': beta, 'rsquared': rsquared,
-            'standard_deviation': standard_deviation,
-            'sharp_ratio': sharp_ratio}
+    shape = np.broadcast(acc_storylines, benchmark_storylines).shape[:-1]
+    return {'alpha': np.broadcast_to(alpha, shape), 'beta': np.broadcast_to(beta, shape),
+            'rsquared': np.broadcast_to(rsquared, shape),
+            'standard_deviation': np.broadcast_to(standard_deviation, shape),
+            'sharp_ratio': np.broadcast_to(sharp_ratio, shape)}
+
+
+def _sequential_sum(values):
+    """
+    Sums the last axis adding the values one by one (np.sum adds pairwise, which rounds differently)
+    :param values: np.array
+    :return: np.array without the last axis
+    """
+    return np.cumsum(values, axis=-1)[..., -1]
 
 
 def _arrange_by_percentage_change_v2(benchmark_prices):
@@ -162,157 +295,107 @@ def arrange_by_percentage_change(prices):
     return new_change_array
 
 
+def percentage_changes(storylines):
+    """
+    arrange_by_percentage_change of every storyline in the last axis.
+    Storylines with a change bigger than 20 (x20 jump, or a zero price) go through arrange_by_percentage_change,
+    which takes the change from yesterday instead.
+    :param storylines: np.array (..., ticks)
+    :return: np.array (..., ticks)
+    """
+    storylines = np.asarray(storylines, dtype=np.float64)
+    changes = np.zeros(storylines.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        changes[..., 1:] = (storylines[..., 1:] - storylines[..., :-1]) / storylines[..., :-1]
+        guarded = ~(np.abs(changes) <= 20).all(axis=-1)
+    for index in zip(*np.nonzero(guarded)):
+        changes[index] = arrange_by_percentage_change(storylines[index])
+    return changes
+
+
 # takes the last price of benchmark and acc and calculates the alpha for the whole period of time in the csv file.
 def _alpha(benchmark_prices, acc_prices, beta):
-    last_benchmark_price = (benchmark_prices[-1] - benchmark_prices[0]) / benchmark_prices[0]
-    last_acc_price = (acc_prices[-1] - acc_prices[0]) / acc_prices[0]
+    last_benchmark_price = (benchmark_prices[..., -1] - benchmark_prices[..., 0]) / benchmark_prices[..., 0]
+    last_acc_price = (acc_prices[..., -1] - acc_prices[..., 0]) / acc_prices[..., 0]
     alpha = last_acc_price - risk_free_rate - beta * (last_benchmark_price - risk_free_rate)
     return alpha
 
 
 def _beta(benchmark_prices_percentage_change, acc_prices_percentage_change):
-    np_benchmark_array = np.array(benchmark_prices_percentage_change)
-    np_acc_array = np.array(acc_prices_percentage_change)
-    mean_acc = np.mean(np_acc_array)
-    mean_benchmark = np.mean(np_benchmark_array)
+    np_benchmark_array = np.asarray(benchmark_prices_percentage_change, dtype=np.float64)
+    np_acc_array = np.asarray(acc_prices_percentage_change, dtype=np.float64)
+    mean_acc = np.mean(np_acc_array, axis=-1, keepdims=True)
+    mean_benchmark = np.mean(np_benchmark_array, axis=-1, keepdims=True)
 
     # covarriance calculation
-    sum = 0
-    for benchmark_change, acc_change in zip(benchmark_prices_percentage_change, acc_prices_percentage_change):
-        sum += ((acc_change - mean_acc) * (benchmark_change - mean_benchmark))
-    cov = sum / (len(benchmark_prices_percentage_change) - 1)
-    var = np.var(np_acc_array)
+    cov = _sequential_sum((np_acc_array - mean_acc) * (np_benchmark_array - mean_benchmark)) / \
+        (np_benchmark_array.shape[-1] - 1)
+    var = np.var(np_acc_array, axis=-1)
     beta = cov / var
     return beta
 
 
 def _rsquared(benchmark_prices, acc_prices):
-    mean_acc = np.mean(acc_prices)
-    mean_benchmark = np.mean(benchmark_prices)
+    mean_acc = np.mean(acc_prices, axis=-1, keepdims=True)
+    mean_benchmark = np.mean(benchmark_prices, axis=-1, keepdims=True)
 
     # Finding the line of best fit
-    denominator = 0.0
-    numerator = 0.0
-    for benchmark_change, acc_change in zip(benchmark_prices, acc_prices):
-        numerator += (acc_change - mean_acc) * (benchmark_change - mean_benchmark)
-        denominator += ((acc_change - mean_acc) ** 2)
-    m = numerator / denominator
+    numerator = _sequential_sum((acc_prices - mean_acc) * (benchmark_prices - mean_benchmark))
+    denominator = _sequential_sum((acc_prices - mean_acc) ** 2)
+    m = (numerator / denominator)[..., np.newaxis]
     b = mean_benchmark - (m * mean_acc)
 
     # predicted acc price value
-    predicted_price = []
-    for point in acc_prices:
-        predicted_point = (point * m) + b
-        predicted_price.append(predicted_point)
+    predicted_price = (acc_prices * m) + b
 
     # substract the actual price from the predicted and square result
-    prediction_error = []
-    sum_errors = 0.0
-
-    for prediction, real_price in zip(predicted_price, benchmark_prices):
-        new_point = (prediction - real_price) ** 2
-        prediction_error.append(new_point)
-        sum_errors += new_point
+    prediction_error = (predicted_price - benchmark_prices) ** 2
+    sum_errors = _sequential_sum(prediction_error)
 
-    average_error = sum_errors / len(benchmark_prices)
-    second_sum = 0.0
-    for pred_error in prediction_error:
-        second_sum += ((pred_error - average_error) ** 2)
+    average_error = sum_errors / benchmark_prices.shape[-1]
+    second_sum = _sequential_sum((prediction_error - average_error[..., np.newaxis]) ** 2)
 
     return 1 - (sum_errors / second_sum)
 
 
 def _standard_deviation(acc_change):
-    np_acc_array = np.array(acc_change)
-    average_acc = np.average(np_acc_array)
-    sum_st = 0.0
+    np_acc_array = np.asarray(acc_change, dtype=np.float64)
+    average_acc = np.mean(np_acc_array, axis=-1, keepdims=True)
+    sum_st = _sequential_sum((average_acc - np_acc_array) ** 2)
 
-    for change in acc_change:
-        sum_st += ((average_acc - change) ** 2)
-
-    standard_deviation = np.sqrt(sum_st / (len(acc_change) - 1))
+    standard_deviation = np.sqrt(sum_st / (np_acc_array.shape[-1] - 1))
     return standard_deviation
 
 
 def _sharp_ratio(acc_prices_percentage_change, standard_deviation):
-    np_acc_array = np.array(acc_prices_percentage_change)
-    mean = np.mean(np_acc_array)
+    np_acc_array = np.asarray(acc_prices_percentage_change, dtype=np.float64)
+    mean = np.mean(np_acc_array, axis=-1)
 
-    if standard_deviation == 0:
-        standard_deviation = 0.00001
+    standard_deviation = np.where(standard_deviation == 0, 0.00001, standard_deviation)
 
     sharp_ratio = (mean - risk_free_rate) / standard_deviation
 
     return sharp_ratio
 
 
-def calculate_benchmark_for_single_coin(field_date_time, coin_benchamrk, first_value_price, amountOfCapital):
-    """
-    for function get benchmarks calculate benchmark
-    :param x:
-    :param coin_benchamrk:
-    :param first_value_price:
-    :param amountOfCapital:
-    :return:
-    """
-    status, coin_data = _data_helper.get_coin_data(field_date_time, coin_benchamrk)
-    if not status:
-        logger.error("get find key: {} in reddis".format(str(field_date_time) + '__' + coin_benchamrk))
-        exit(1)
-    row_price = coin_data['_open']
-    benchmark = float(row_price) / float(first_value_price) * float(amountOfCapital)
-    return benchmark
-
-
-def calculate_benchmark_for_per_coins(field_date_time, list_coins_to_benchmark, first_value_price_average,
-                                      amountOfCapital):
-    """
-    for function get benchmarks calculate benchmark for pers
-    :param x:
-    :param coin_benchamrk:
-    :param first_value_price:
-    :param amountOfCapital:
-    :return:
-    """
-    sum_coins_prices_btc = 0
-    for coin_to_benchmark in list_coins_to_benchmark:
-        status, coin_data = _data_helper.get_coin_data(field_date_time, coin_to_benchmark)
-        if not status:
-            logger.error("get find key: {} in reddis".format(str(field_date_time) + '__' + coin_to_benchmark))
-            exit(1)
-        sum_coins_prices_btc += float(coin_data['_open'])
-
-    price_average = sum_coins_prices_btc / len(list_coins_to_benchmark)
-    benchmark = float(price_average) / float(first_value_price_average) * float(amountOfCapital)
-    return benchmark
-
-
-def add_benchmarks(capital_history, symbols_list, amountOfCapital):
+def add_benchmarks(capital_history, symbols_list, amountOfCapital, benchmarks=None):
     """
     add column to result with benchmark coins
     :param capital_history:
     :param amountOfCapital
+    :param benchmarks: Benchmarks computed once for all simulations, used if they cover the capital history times
     :return:
     """
 
     capital_history.sort_values(by=['date_time'], inplace=True)
+    times = capital_history['date_time'].values
+    if benchmarks is None or not benchmarks.covers(times):
+        benchmarks = Benchmarks(symbols_list, times)
+
     benchmark_column_names = []
-    for coin_or_list_benchmark in symbols_list:
-        sum_coins_prices_btc = 0
-        for coin_benchmark in coin_or_list_benchmark:
-            status, result = _data_helper.get_coin_data(capital_history['date_time'].values[0],
-                                                        coin_benchmark)
-            if not status:
-                logger.error("error in request, key: {}__{}".format(str(capital_history['date_time'].values[0]),
-                                                                           coin_or_list_benchmark))
-                exit(0)
-            sum_coins_prices_btc += float(result['_open'])
-        first_value_price_average = sum_coins_prices_btc / len(coin_or_list_benchmark)
-        new_col_name = 'benchmark_' + '__'.join(str(e) for e in coin_or_list_benchmark)
+    for new_col_name, benchmark_capital in benchmarks.capital(amountOfCapital):
         benchmark_column_names.append(new_col_name)
-        capital_history[new_col_name] = capital_history['date_time'].apply(
-            lambda x: calculate_benchmark_for_per_coins(x, coin_or_list_benchmark, first_value_price_average,
-                                                        amountOfCapital))
+        capital_history[new_col_name] = benchmark_capital
 
     return capital_history, benchmark_column_names
 
@@ -0,0 +1,67 @@
+import logging
+
+import numpy as np
+from Utilities.DataHelper import DataHelper
+
+logger = logging.getLogger("Benchmarks")
+
+_data_helper = DataHelper()
+
+
+class Benchmarks(object):
+    """
+    The benchmarks of a run normalized to the first tick, computed once and shared by all simulations.
+    A benchmark is a coin or a basket of coins (the average of their open prices), its capital at a tick is
+    normalized * amount of capital of the simulation.
+    """
+
+    def __init__(self, coins_for_benchmark, times):
+        """
+        :param coins_for_benchmark: list of lists of coins, e.x. [['BTC'], ['BTC', 'ETH']]
+        :param times: sorted np.array of epoch timestamps of the ticks
+        """
+        self.times = np.asarray(times, dtype=np.int64)
+        self.column_names = []
+        self.normalized = np.zeros((len(coins_for_benchmark), len(self.times)))
+        for position, coins in enumerate(coins_for_benchmark):
+            self.column_names.append('benchmark_' + '__'.join(str(e) for e in coins))
+            if len(self.times) == 0:
+                continue
+
+            prices = _data_helper.get_many(np.array(coins)[:, np.newaxis], self.times[np.newaxis, :], '_open')
+            missing = np.isnan(prices)
+            if missing.any():
+                coin, time = np.argwhere(missing)[0]
+                logger.error("Missing benchmark price, key: {}__{}".format(self.times[time], coins[coin]))
+                exit(1)
+
+            # Adds the coins one by one like summing the prices of every tick
+            sum_coins_prices = 0
+            for coin_prices in prices:
+                sum_coins_prices = sum_coins_prices + coin_prices
+            price_average = sum_coins_prices / len(coins)
+            self.normalized[position] = price_average / price_average[0]
+
+    @classmethod
+    def for_interval(cls, coins_for_benchmark, start_timestamp, end_timestamp, tick_time_hours):
+        """
+        :return: Benchmarks of the ticks from start_timestamp until (not including) end_timestamp, as in the capital
+         history of a simulation
+        """
+        tick_seconds = tick_time_hours * 60 * 60
+        return cls(coins_for_benchmark, np.arange(start_timestamp, end_timestamp, tick_seconds, dtype=np.int64))
+
+    def covers(self, times):
+        """
+        :param times: sorted np.array of epoch timestamps
+        :return: Boolean, True if the benchmarks can be read for exactly those times
+        """
+        return len(times) == len(self.times) and bool((np.asarray(times) == self.times).all())
+
+    def capital(self, amount_of_capital):
+        """
+        :param amount_of_capital: the initial capital of the simulation
+        :return: list of (column name, np.array of the benchmark capital at every tick)
+        """
+        return [(column_name, normalized * float(amount_of_capital))
+                for column_name, normalized in zip(self.column_names, self.normalized)]
@@ -0,0 +1,226 @@
+import logging
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa, pq = None, None
+
+logger = logging.getLogger("ResultStore")
+
+SIMULATIONS_TABLE = 'simulations'
+POSITIONS_TABLE = 'positions'
+CAPITAL_HISTORY_TABLE = 'capital_history'
+TABLES = [SIMULATIONS_TABLE, POSITIONS_TABLE, CAPITAL_HISTORY_TABLE]
+INDEX_FILE_NAME = 'index.csv'
+NO_ROW_GROUP = -1  # The simulation has no rows in the table (e.x. no positions)
+
+
+def check_pyarrow():
+    """
+    Exits if pyarrow (an optional requirement) is not installed
+    :return:
+    """
+    if pq is None:
+        logger.error("The parquet result store requires pyarrow, install it with: pip install \"pyarrow>=15\"")
+        exit(1)
+
+
+def _table_path(path, table_name):
+    return os.path.join(path, table_name + '.parquet')
+
+
+def _details_key(result):
+    """
+    :return: key of the positions and capital history of the result, equivalent simulations share them
+    """
+    details = result['capital_history'] if result['capital_history'] is not None else result['positions']
+    if details is None:
+        return 'simulation_{}'.format(result['simulation_id'])
+    return id(details)
+
+
+def _simulation_frame(table_name, result):
+    """
+    :param table_name: one of TABLES
+    :param result: result of a simulation, see AnalyticsFactory.simulation_result
+    :return: df of the rows of the simulation in the table with a simulation_id column, None if the result does not
+     have the table (see AnalyticsFactory.strip_details)
+    """
+    if table_name != SIMULATIONS_TABLE and result[table_name] is None:
+        return None
+    if table_name == SIMULATIONS_TABLE:
+        df = result['simulation'].reset_index()
+    elif table_name == CAPITAL_HISTORY_TABLE:
+        df = result['capital_history'].reset_index()
+    else:
+        df = result['positions'].copy()
+    df['simulation_id'] = result['simulation_id']
+
+    # Params like dicts and lists are kept as they are written to csv
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].map(lambda value: value if value is None or isinstance(value, str) else str(value))
+    return df
+
+
+class ResultStoreWriter(object):
+    """
+    Appends the results of all simulations of a run into a parquet file per table (simulations params, positions and
+    capital history), every row has the simulation_id.
+    Every append is a row group of each table, the index file maps every simulation id to its row groups so a
+    simulation is read without scanning the rest. Equivalent simulations have the same results, their positions and
+    capital history are written once and the index points to the simulation which holds them.
+    """
+
+    def __init__(self, path):
+        check_pyarrow()
+        self.path = path
+        self.writers = {}  # table name -> ParquetWriter, opened by the first rows of the table
+        self.row_groups = {table_name: 0 for table_name in TABLES}
+        self.index_rows = []
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, results):
+        """
+        :param results: list of results of simulations (as returned by AnalyticsFactory.start) with their positions
+         and capital history
+        :return:
+        """
+        if len(results) == 0:
+            return
+
+        # Results which share their frames (equivalent simulations) are written once
+        source_ids = {}
+        sources = []
+        for result in results:
+            source_id = source_ids.setdefault(_details_key(result), result['simulation_id'])
+            if source_id == result['simulation_id']:
+                sources.append(result)
+
+        row_groups = {}
+        for table_name in TABLES:
+            table_results = results if table_name == SIMULATIONS_TABLE else sources
+            row_groups[table_name] = self._write(table_name, [_simulation_frame(table_name, result)
+                                                              for result in table_results])
+
+        for result in results:
+            source_id = source_ids[_details_key(result)]
+            index_row = {'simulation_id': result['simulation_id'], 'source_simulation_id': source_id}
+            for table_name in TABLES:
+                row_group, ids_with_rows = row_groups[table_name]
+                row_id = result['simulation_id'] if table_name == SIMULATIONS_TABLE else source_id
+                index_row[table_name] = row_group if row_id in ids_with_rows else NO_ROW_GROUP
+            self.index_rows.append(index_row)
+
+    def _write(self, table_name, dfs):
+        """
+        Writes the frames as a single row group of the table
+        :return: (number of the row group, set of the simulation ids with rows in it)
+        """
+        dfs = [df for df in dfs if df is not None and len(df) > 0]
+        if len(dfs) == 0:
+            return NO_ROW_GROUP, set()
+        df = pd.concat(dfs, ignore_index=True, sort=False)
+
+        if table_name not in self.writers:
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            # Columns without values in the first rows hold strings (as params and positions objects)
+            for position, field in enumerate(schema):
+                if pa.types.is_null(field.type):
+                    schema = schema.set(position, field.with_type(pa.string()))
+            self.writers[table_name] = pq.ParquetWriter(_table_path(self.path, table_name), schema)
+        writer = self.writers[table_name]
+
+        table = pa.Table.from_pandas(df.reindex(columns=writer.schema.names), schema=writer.schema,
+                                     preserve_index=False)
+        writer.write_table(table, row_group_size=len(table))
+        row_group = self.row_groups[table_name]
+        self.row_groups[table_name] += 1
+        return row_group, set(df['simulation_id'].unique())
+
+    def close(self):
+        """
+        Closes the tables and writes the index
+        :return: path of the store
+        """
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        pd.DataFrame(self.index_rows, columns=['simulation_id', 'source_simulation_id'] + TABLES).to_csv(
+            os.path.join(self.path, INDEX_FILE_NAME), index=False)
+        logger.info("Results of {} simulations in {}".format(len(self.index_rows), self.path))
+        return self.path
+
+
+class ResultStoreReader(object):
+    """
+    Reads simulations from a store written by ResultStoreWriter, only the row groups of the requested simulations are
+    read.
+    """
+
+    def __init__(self, path):
+        check_pyarrow()
+        self.path = path
+        self.index = pd.read_csv(os.path.join(path, INDEX_FILE_NAME), index_col='simulation_id')
+        self.files = {}  # table name -> ParquetFile
+
+    def simulation_ids(self):
+        """
+        :return: list of the ids of all simulations in the store
+        """
+        return list(self.index.index)
+
+    def read(self, table_name, simulation_ids):
+        """
+        :param table_name: one of TABLES
+        :param simulation_ids: list of simulation ids (a slice of the run)
+        :return: df of the rows of the simulations in the order of simulation_ids, with a simulation_id column
+        """
+        index = self.index.loc[list(simulation_ids)]
+        sources = index.index.values if table_name == SIMULATIONS_TABLE else index['source_simulation_id'].values
+
+        rows_by_source = {}
+        for row_group in sorted(set(index[table_name].values) - {NO_ROW_GROUP}):
+            if table_name not in self.files:
+                self.files[table_name] = pq.ParquetFile(_table_path(self.path, table_name))
+            df = self.files[table_name].read_row_group(int(row_group)).to_pandas()
+            df = df[df['simulation_id'].isin(sources)]
+            for source_id, df_source in df.groupby('simulation_id', sort=False):
+                rows_by_source[source_id] = df_source
+
+        dfs = []
+        for simulation_id, source_id in zip(index.index.values, sources):
+            if source_id not in rows_by_source:
+                continue
+            df = rows_by_source[source_id]
+            if simulation_id != source_id:
+                df = df.assign(simulation_id=simulation_id)
+            dfs.append(df)
+
+        if len(dfs) == 0:
+            return pd.DataFrame(columns=['simulation_id'])
+        return pd.concat(dfs, ignore_index=True)
+
+    def simulation(self, simulation_id):
+        """
+        :return: df of a single row of the simulation params, indexed by simulation_id as in simulation.csv
+        """
+        return self.read(SIMULATIONS_TABLE, [simulation_id]).set_index('simulation_id')
+
+    def positions(self, simulation_id):
+        """
+        :return: df of the positions history of the simulation, as in positions.csv
+        """
+        return self.read(POSITIONS_TABLE, [simulation_id]).drop(columns=['simulation_id'])
+
+    def capital_history(self, simulation_id):
+        """
+        :return: df of the capital history with benchmarks of the simulation indexed by date_time, as in
+         capital_history.csv
+        """
+        return self.read(CAPITAL_HISTORY_TABLE, [simulation_id]).drop(columns=['simulation_id']).set_index(
+            'date_time')
@@ -0,0 +1,51 @@
+import logging
+import os
+
+logger = logging.getLogger("SummaryWriter")
+
+SUMMARY_FILE_NAME = 'Simulations__Summery__Analytics.csv'
+RUNNING_SUMMARY_FILE_NAME = 'Simulations__Running__Analytics.csv'
+
+
+class SummaryWriter(object):
+    """
+    Builds the analytics summary of a run from the analytics of the simulations as they finish.
+    The rows are appended to a running file (so the results of an interrupted run are kept), which is renamed to the
+    summary file once all simulations finished.
+    """
+
+    def __init__(self, path_to_analytics):
+        self.path_to_analytics = path_to_analytics
+        self.running_path = os.path.join(path_to_analytics, RUNNING_SUMMARY_FILE_NAME)
+        self.summary_path = os.path.join(path_to_analytics, SUMMARY_FILE_NAME)
+        self.columns = None  # Columns of the summary, set by the first analytics
+        self.amount_of_rows = 0
+        os.makedirs(path_to_analytics, exist_ok=True)
+
+    def append(self, results):
+        """
+        :param results: list of results of simulations (as returned by AnalyticsFactory.start), their analytics are
+         indexed by simulation_id
+        :return:
+        """
+        for result in results:
+            analytics_result_df = result['analytics']
+            if self.columns is None:
+                # Same columns order as concatenating the analytics (sorted by name)
+                self.columns = sorted(analytics_result_df.columns)
+                analytics_result_df[self.columns].to_csv(self.running_path, mode='w')
+            else:
+                analytics_result_df.reindex(columns=self.columns).to_csv(self.running_path, mode='a', header=False)
+            self.amount_of_rows += len(analytics_result_df)
+
+    def close(self):
+        """
+        Renames the running file to the summary file
+        :return: path of the summary file, None if there were no analytics
+        """
+        if self.columns is None:
+            logger.warning("There are no analytics to summarize in {}".format(self.path_to_analytics))
+            return None
+        os.replace(self.running_path, self.summary_path)
+        logger.info("Analytics summary of {} rows in {}".format(self.amount_of_rows, self.summary_path))
+        return self.summary_path
@@ -0,0 +1,88 @@
+import heapq
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("TopSimulations")
+
+LOWER_IS_BETTER_METRICS = ['standard_deviation']
+
+
+def score(result, metric):
+    """
+    :param result: result of a simulation (as returned by AnalyticsFactory.start)
+    :param metric: column of the analytics, e.x. ACC_ROI
+    :return: the metric against the first benchmark, the higher the better (-inf for NaN)
+    """
+    value = float(result['analytics'][metric].iloc[0])
+    if np.isnan(value):
+        return -np.inf
+    return -value if metric in LOWER_IS_BETTER_METRICS else value
+
+
+def drop_details_below(results, metric, threshold):
+    """
+    Drops the positions and capital history of the results which can not enter the top simulations, so a worker does
+    not send them back to the parent process
+    :param results: list of results of simulations (as returned by AnalyticsFactory.start)
+    :param metric: column of the analytics the top simulations are ranked by
+    :param threshold: TopSimulations.threshold when the simulations were sent to run, None keeps all details
+    :return: results
+    """
+    if threshold is None:
+        return results
+    for result in results:
+        if score(result, metric) <= threshold:
+            result['positions'] = None
+            result['capital_history'] = None
+    return results
+
+
+class TopSimulations(object):
+    """
+    Keeps the results of the top simulations of a run by a metric of their analytics, the results of the other
+    simulations are dropped as they arrive.
+    A simulation is ranked by its metric against the first benchmark, on equal metric the first simulation is kept.
+    """
+
+    def __init__(self, amount, metric):
+        """
+        :param amount: amount of simulations to keep
+        :param metric: column of the analytics, e.x. ACC_ROI
+        """
+        self.amount = amount
+        self.metric = metric
+        self.heap = []  # (score, -arrival, result) of the kept simulations, the worst on top
+        self.arrival = 0
+
+    def add(self, results):
+        """
+        :param results: list of results of simulations (as returned by AnalyticsFactory.start)
+        :return:
+        """
+        for result in results:
+            item = (score(result, self.metric), -self.arrival, result)
+            self.arrival += 1
+            if len(self.heap) < self.amount:
+                heapq.heappush(self.heap, item)
+            elif item[:2] > self.heap[0][:2]:
+                heapq.heapreplace(self.heap, item)
+
+    def threshold(self):
+        """
+        The threshold only rises, a simulation which score is not above it (also later) is not kept, see
+        drop_details_below
+        :return: the score of the worst kept simulation, None while less than amount simulations are kept
+        """
+        if len(self.heap) < self.amount:
+            return None
+        return self.heap[0][0]
+
+    def results(self):
+        """
+        :return: list of the results of the top simulations, the best first
+        """
+        top = [result for _, _, result in sorted(self.heap, key=lambda item: item[:2], reverse=True)]
+        logger.info("Top {} simulations by {}: {}".format(len(top), self.metric,
+                                                          [result['simulation_id'] for result in top]))
+        return top
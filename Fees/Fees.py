@@ -1,4 +1,5 @@
 from Utilities import Consts
+import numpy as np
 import pandas as pd
 
 # Default fees
@@ -9,11 +10,81 @@ DEFAULT_LEVERAGE_BUY_FEES = 0.00075
 DEFAULT_LEVERAGE_TIME_FOR_FEES_IN_HOURS = 24
 DEFAULT_LEVERAGE_FEE_FOR_INTERVAL_TIME = 0.0015
 
+# column in IndividualFees.csv -> default fee
+FEES_DEFAULTS = {'taker_fee': DEFAULT_TAKER_FEE,
+                 'maker_fee': DEFAULT_MAKER_FEE,
+                 'leverage_buy_fee': DEFAULT_LEVERAGE_BUY_FEES,
+                 'leverage_sell_fee': DEFAULT_LEVERAGE_SELL_FEES,
+                 'leverage_time_for_fees_in_hours': DEFAULT_LEVERAGE_TIME_FOR_FEES_IN_HOURS,
+                 'leverage_fees_for_time_interval': DEFAULT_LEVERAGE_FEE_FOR_INTERVAL_TIME}
+
+
+class FeesTable(object):
+    """
+    The fees compiled into arrays aligned to a list of coin symbols, every function is applied on arrays of
+    symbol offsets (in the list the table was compiled for) and capital.
+    """
+
+    def __init__(self, symbols, individual_fees):
+        self.symbols = list(symbols)
+        self.has_individual_fees = np.array([symbol in individual_fees for symbol in self.symbols], dtype=bool)
+        self.fees = {column: np.array([individual_fees[symbol].get(column, default) if symbol in individual_fees
+                                       else default for symbol in self.symbols], dtype=np.float64)
+                     for column, default in FEES_DEFAULTS.items()}
+
+    def taker_fees(self, symbol_index, capital):
+        """
+        :return: np.array of taker fee for every capital
+        """
+        return capital * self.fees['taker_fee'][symbol_index]
+
+    def leverage_sell_fees(self, symbol_index, capital):
+        """
+        :return: np.array of leverage sell fee for every capital
+        """
+        return capital * self.fees['leverage_sell_fee'][symbol_index]
+
+    def leverage_buy_fees(self, symbol_index, capital):
+        """
+        :return: np.array of leverage buy fee for every capital
+        """
+        return capital * self.fees['leverage_buy_fee'][symbol_index]
+
+    def leverage_time_fees(self, symbol_index, capital):
+        """
+        :return: np.array of the leverage fee for a time interval for every capital
+        """
+        return capital * self.fees['leverage_fees_for_time_interval'][symbol_index]
+
+    def is_time_for_leverage_fee(self, symbol_index, hours_position_open):
+        """
+        Coins with individual fees pay every leverage_time_for_fees_in_hours, the default is paid once after
+        DEFAULT_LEVERAGE_TIME_FOR_FEES_IN_HOURS.
+        :return: np.array of Boolean, if its time to pay leverage fee
+        """
+        time_for_fees = self.fees['leverage_time_for_fees_in_hours'][symbol_index]
+        return np.where(self.has_individual_fees[symbol_index],
+                        (np.mod(hours_position_open, time_for_fees) == 0) & (hours_position_open > 0),
+                        hours_position_open == DEFAULT_LEVERAGE_TIME_FOR_FEES_IN_HOURS)
+
 
 class Fees:
     def __init__(self):
         self.fees_individual_df = pd.read_csv(Consts.FEES_FILE_PATH + Consts.FEES_FILE_NAME)
         self.fees_individual_df.set_index(['coin_symbol'], inplace=True)
+        self.individual_fees = self.fees_individual_df.to_dict(orient='index')  # coin symbol -> {column: fee}
+        self.__tables = {}
+
+    def table(self, symbols):
+        """
+        Fees table for symbols, compiled once per list of symbols
+        :param symbols: list of coin symbols, e.x. the symbols of the price store
+        :return: FeesTable
+        """
+        key = tuple(symbols)
+        if key not in self.__tables:
+            self.__tables[key] = FeesTable(symbols, self.individual_fees)
+        return self.__tables[key]
 
     def apply_maker_fee(self, coin_symbol, capital):
         """
@@ -31,8 +102,8 @@ class Fees:
         :param capital:
         :return: float : fee
         """
-        if coin_symbol in self.fees_individual_df.index.values.tolist():
-            return capital * self.fees_individual_df.loc[coin_symbol, 'taker_fee']
+        if coin_symbol in self.individual_fees:
+            return capital * self.individual_fees[coin_symbol]['taker_fee']
         else:
             return capital * DEFAULT_TAKER_FEE
 
@@ -43,8 +114,8 @@ class Fees:
         :param capital:
         :return: float : fee
         """
-        if coin_symbol in self.fees_individual_df.index.values.tolist():
-            return capital * self.fees_individual_df.loc[coin_symbol, 'leverage_sell_fee']
+        if coin_symbol in self.individual_fees:
+            return capital * self.individual_fees[coin_symbol]['leverage_sell_fee']
         else:
             return capital * DEFAULT_LEVERAGE_SELL_FEES
 
@@ -55,8 +126,8 @@ class Fees:
         :param capital:
         :return: float: fee
         """
-        if coin_symbol in self.fees_individual_df.index.values.tolist():
-            return capital * self.fees_individual_df.loc[coin_symbol, 'leverage_buy_fee']
+        if coin_symbol in self.individual_fees:
+            return capital * self.individual_fees[coin_symbol]['leverage_buy_fee']
         else:
             return capital * DEFAULT_LEVERAGE_BUY_FEES
 
@@ -67,8 +138,8 @@ class Fees:
         :param capital:
         :return: Float - fees
         """
-        if coin_symbol in self.fees_individual_df.index.values.tolist():
-            return capital * self.fees_individual_df.loc[coin_symbol, 'leverage_fees_for_time_interval']
+        if coin_symbol in self.individual_fees:
+            return capital * self.individual_fees[coin_symbol]['leverage_fees_for_time_interval']
 
         else:
             return capital * DEFAULT_LEVERAGE_FEE_FOR_INTERVAL_TIME
@@ -78,8 +149,8 @@ class Fees:
         Checks if its time to pay leverage fee
         :return: Boolean if its time for leverage or not
         """
-        if coin_symbol in self.fees_individual_df.index.values.tolist():
-            if hours_position_open % self.fees_individual_df.loc[coin_symbol, 'leverage_time_for_fees_in_hours'] == 0 \
+        if coin_symbol in self.individual_fees:
+            if hours_position_open % self.individual_fees[coin_symbol]['leverage_time_for_fees_in_hours'] == 0 \
                     and hours_position_open > 0:
                 return True
         elif hours_position_open == DEFAULT_LEVERAGE_TIME_FOR_FEES_IN_HOURS:
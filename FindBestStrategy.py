@@ -1,19 +1,140 @@
+import collections
+import itertools
 import multiprocessing
 import os
 
 import logging
-import pandas as pd
-from Utilities import LoaderHelper, TimeHelper, Consts
-from Simulation import Simulation
+from Analytics import AnalyticsFactory
+from Analytics.Benchmarks import Benchmarks
+from Analytics.ResultStore import ResultStoreWriter
+from Analytics.SummaryWriter import SummaryWriter
+from Analytics.TopSimulations import TopSimulations, drop_details_below
+from Utilities import LoaderHelper, TimeHelper, Consts, SharedArrays, ResultCache
+from Utilities.DataHelper import DataHelper
+from Utilities.MLResultsIndex import MLResultsIndex
+from Simulation import Simulation, MultiSimulation
 from Fees import Fees
 from tqdm import tqdm
 import os.path
 
 logger = logging.getLogger("FindBestStrategy")
 
+SHARED_PRICES_DIR_NAME = 'prices'
+SHARED_ML_RESULTS_DIR_NAME = 'ml_results'
+
+_worker_params = None  # (ml_results, tick_time_hours, fees, _current_time, coins_for_benchmark, result_cache,
+# benchmarks) of a worker
+
+PENDING_TASKS_PER_PROCESS = 4  # Tasks are created from the params grid only when a worker is about to need them
+
+
+def _init_worker(ml_results, tick_time_hours, fees, current_time, benchmark_symbols_list, shared_path=None,
+                 result_cache=None, benchmarks=None):
+    """
+    Pool initializer, receives the inputs which are shared by all simulations once per worker process.
+    In shared memory mode attaches the worker to the price data and the ML results shared by the parent process.
+    :param shared_path: directory created in run, None if not in shared memory mode
+    :param result_cache: ResultCache which stores the results of every simulation, None if disabled
+    :param benchmarks: Benchmarks computed once in run
+    :return:
+    """
+    global _worker_params
+    if shared_path is not None:
+        DataHelper().attach(os.path.join(shared_path, SHARED_PRICES_DIR_NAME))
+        ml_results = MLResultsIndex.attach(os.path.join(shared_path, SHARED_ML_RESULTS_DIR_NAME))
+    _worker_params = (ml_results, tick_time_hours, fees, current_time, benchmark_symbols_list, result_cache,
+                      benchmarks)
+
+
+def _run_simulation(df_simulation, duplicates, top_threshold=None):
+    """
+    Runs a single simulation in a worker process with the inputs received by _init_worker
+    :param df_simulation: a single row of simulation params, the index is the simulation id
+    :param duplicates: simulation id -> df of the equivalent simulations which get the same results
+    :param top_threshold: TopSimulations.threshold of the run, the details of results below it are not sent back
+    :return: list of the results of the simulation and its equivalent simulations (see AnalyticsFactory.start)
+    """
+    ml_results, tick_time_hours, fees, current_time, benchmark_symbols_list, result_cache, benchmarks = _worker_params
+    results = Simulation.Simulation((ml_results, df_simulation, tick_time_hours, fees, current_time,
+                                     benchmark_symbols_list, duplicates, result_cache, benchmarks)).results
+    return drop_details_below(results, Consts.RETAIN_TOP_METRIC, top_threshold)
+
+
+def _run_simulations_batch(df_simulations, duplicates, top_threshold=None):
+    """
+    Runs a batch of simulations together in a worker process with the inputs received by _init_worker
+    :param df_simulations: rows of simulation params, the index is the simulation id
+    :param duplicates: simulation id -> df of the equivalent simulations which get the same results
+    :param top_threshold: TopSimulations.threshold of the run, the details of results below it are not sent back
+    :return: list of the results of the simulations and their equivalent simulations (see AnalyticsFactory.start)
+    """
+    ml_results, tick_time_hours, fees, current_time, benchmark_symbols_list, result_cache, benchmarks = _worker_params
+    results = MultiSimulation.MultiSimulation((ml_results, df_simulations, tick_time_hours, fees, current_time,
+                                               benchmark_symbols_list, duplicates, result_cache, benchmarks)).results
+    return drop_details_below(results, Consts.RETAIN_TOP_METRIC, top_threshold)
+
+
+def _skip_cached_simulations(distinct_simulations, simulations_options, result_cache, current_time,
+                             benchmark_symbols_list, benchmarks, collect_results, pbar):
+    """
+    Writes the results of the simulations which are in the result cache, without running them
+    :param distinct_simulations: from LoaderHelper.iter_distinct_simulation_params
+    :param simulations_options: from LoaderHelper.simulation_params_options
+    :param result_cache: ResultCache
+    :param current_time: the start of the running time
+    :param benchmark_symbols_list:
+    :param benchmarks: Benchmarks computed once in run
+    :param collect_results: function which receives the results of the simulations taken from the cache
+    :param pbar: progress bar, updated with the simulations taken from the cache
+    :return: generator of the simulations of distinct_simulations which are not in the cache
+    """
+    for simulation_id, params, duplicates in distinct_simulations:
+        cached_results = result_cache.get(params)
+        if cached_results is None:
+            yield simulation_id, params, duplicates
+            continue
+
+        positions_history, capital_history = cached_results
+        df_duplicates = None
+        if len(duplicates) > 0:
+            df_duplicates = LoaderHelper.simulation_params_frame(duplicates, simulations_options)
+        logger.info('Creating analytics file for simulation ID: {} from the result cache'.format(simulation_id))
+        collect_results(AnalyticsFactory.start(
+            current_time, benchmark_symbols_list,
+            LoaderHelper.simulation_params_frame([(simulation_id, params)], simulations_options), positions_history,
+            capital_history, df_duplicates, benchmarks))
+        pbar.update(1 + len(duplicates))
+
+
+def _simulation_tasks(distinct_simulations, simulations_options, task_size):
+    """
+    Groups the distinct simulations of the params grid into tasks, lazily
+    :param distinct_simulations: from LoaderHelper.iter_distinct_simulation_params
+    :param simulations_options: from LoaderHelper.simulation_params_options
+    :param task_size: amount of distinct simulations in a task
+    :return: generator of (df of the simulations to run, {simulation id: df of its equivalent simulations},
+     amount of simulations in the task including the equivalent simulations)
+    """
+    while True:
+        task = list(itertools.islice(distinct_simulations, task_size))
+        if len(task) == 0:
+            return
+
+        duplicates = {}
+        amount_of_simulations = len(task)
+        for simulation_id, _, simulation_duplicates in task:
+            if len(simulation_duplicates) > 0:
+                duplicates[simulation_id] = LoaderHelper.simulation_params_frame(simulation_duplicates,
+                                                                                 simulations_options)
+                amount_of_simulations += len(simulation_duplicates)
+
+        df_task = LoaderHelper.simulation_params_frame([(simulation_id, params) for simulation_id, params, _ in task],
+                                                       simulations_options)
+        yield df_task, duplicates, amount_of_simulations
+
 
 def run(path_to_data_file, current_time=TimeHelper.current_time_stamp(), tick_time_hours=Consts.TICK_TIME_HOURS,
-        benchmark_symbols_list=None):
+        benchmark_symbols_list=None, shared_memory=False, batch_size=None):
     """
     1) fetch data from files - 1.a. simulation params 1.b. fees 1.c. ml result
     2) run multiprocess all simulation
@@ -21,50 +142,112 @@ def run(path_to_data_file, current_time=TimeHelper.current_time_stamp(), tick_ti
     :param id:
     :param tick_time_hours:
     :param benchmark_symbols_list:
+    :param shared_memory: if True the candle sticks and ML results are placed once in memory-mapped files that all
+     workers attach to read-only, instead of every worker holding its own copy.
+    :param batch_size: if set, every task is a batch of up to batch_size simulations which run together
+     (MultiSimulation), otherwise every task is a single simulation
     :return:
     """
     if benchmark_symbols_list is None:
         benchmark_symbols_list = [['BTC']]
     # Anlayze results
     logger.info("Getting alto results")
-    df_ml_results, df_simulations = LoaderHelper.fetch_simulations(benchmark_symbols_list, path_to_data_file)
+    ml_results, simulations_options = LoaderHelper.fetch_simulations_index(benchmark_symbols_list, path_to_data_file)
     _fees = Fees.Fees()
 
+    # The benchmarks are the same for all simulations, up to the amount of capital
+    benchmarks = Benchmarks.for_interval(benchmark_symbols_list, ml_results.start_time, ml_results.end_time,
+                                         tick_time_hours)
+
+    shared_path = None
+    if shared_memory:
+        shared_path = SharedArrays.create_shared_dir('trading_simulator_')
+        logger.info("Sharing market data and ML results in {}".format(shared_path))
+        DataHelper().share(os.path.join(shared_path, SHARED_PRICES_DIR_NAME))
+        ml_results.share(os.path.join(shared_path, SHARED_ML_RESULTS_DIR_NAME))
+        ml_results = None  # Workers use the shared ML results
+
+    # Results of simulations which already ran on the same data are taken from the cache
+    result_cache = None
+    if Consts.RESULT_CACHE_PATH is not None:
+        result_cache = ResultCache.ResultCache(Consts.RESULT_CACHE_PATH,
+                                               ResultCache.data_fingerprint(path_to_data_file, tick_time_hours))
+
     # Multi proccesing to run simulation classes which writes results into Simulator/Results/{id}
-    data_for_run = []
-    df_simulations.index.names = ['index']
-    gb = df_simulations.groupby('index')
-    for _df in [gb.get_group(x) for x in gb.groups]:
-        data_for_run.append((df_ml_results, _df, tick_time_hours, _fees, current_time, benchmark_symbols_list))
-
-    pbar = tqdm(total=len(data_for_run))
-
-    def print_progress(res):
-        pbar.update()
-
-    with multiprocessing.Pool(multiprocessing.cpu_count()) as p:
-        print(data_for_run)
-        res = [p.apply_async(Simulation.Simulation, args=(_single_run,), callback=print_progress) for _single_run in
-               data_for_run]
-        for func_res in res:
-            func_res.get()
-        p.close()
-        p.join()
+    # Inputs shared by all simulations are sent once per worker, every task is only its simulation params rows.
+    # Equivalent simulations run once and their results are written for all of them
+    pool_initializer_args = (ml_results, tick_time_hours, _fees, current_time, benchmark_symbols_list, shared_path,
+                             result_cache, benchmarks)
+
+    pbar = tqdm(total=LoaderHelper.simulation_params_grid_size(simulations_options))
+
+    # The analytics of every simulation are sent back from the workers and summarized as they arrive
+    path_to_run_result = os.path.join(Consts.PATH_TO_WRITE_RESULT, TimeHelper.epoch_to_date_time(
+        current_time).strftime(Consts.WRITE_DATE_FORMAT))
+    summary_writer = SummaryWriter(os.path.join(path_to_run_result, 'analytics'))
+
+    # With a result store the workers send back all results, which are appended to the store
+    store_writer = None
+    if Consts.RESULT_STORE_FORMAT == Consts.RESULT_STORE_PARQUET and Consts.OUTPUT_LEVEL != Consts.OUTPUT_LEVEL_SUMMARY:
+        store_writer = ResultStoreWriter(os.path.join(path_to_run_result, 'store'))
+
+    # Only the details of the top simulations are written, once all simulations finished. Every task is sent with
+    # the current threshold of the top simulations, so workers send back only the details which can still enter them
+    top_simulations = None
+    if Consts.RETAIN_TOP_AMOUNT is not None and Consts.OUTPUT_LEVEL != Consts.OUTPUT_LEVEL_SUMMARY:
+        top_simulations = TopSimulations(Consts.RETAIN_TOP_AMOUNT, Consts.RETAIN_TOP_METRIC)
+
+    def collect_results(results):
+        summary_writer.append(results)
+        if top_simulations is not None:
+            top_simulations.add(results)
+        elif store_writer is not None:
+            store_writer.append(results)
+
+    distinct_simulations = LoaderHelper.iter_distinct_simulation_params(simulations_options)
+    if result_cache is not None:
+        distinct_simulations = _skip_cached_simulations(distinct_simulations, simulations_options, result_cache,
+                                                        current_time, benchmark_symbols_list, benchmarks,
+                                                        collect_results, pbar)
+
+    if batch_size is None:
+        task_func, task_size = _run_simulation, 1
+    else:
+        task_func, task_size = _run_simulations_batch, max(1, batch_size)
+
+    try:
+        with multiprocessing.Pool(multiprocessing.cpu_count(), initializer=_init_worker,
+                                  initargs=pool_initializer_args) as p:
+            pending = collections.deque()
+            for df_task, duplicates, amount_of_simulations in _simulation_tasks(distinct_simulations,
+                                                                                simulations_options, task_size):
+                if len(pending) >= multiprocessing.cpu_count() * PENDING_TASKS_PER_PROCESS:
+                    collect_results(pending.popleft().get())
+                top_threshold = top_simulations.threshold() if top_simulations is not None else None
+                pending.append(p.apply_async(task_func, args=(df_task, duplicates, top_threshold),
+                                             callback=lambda res, amount=amount_of_simulations: pbar.update(amount)))
+            while len(pending) > 0:
+                collect_results(pending.popleft().get())
+            p.close()
+            p.join()
+
+        if top_simulations is not None:
+            top_results = top_simulations.results()
+            if store_writer is not None:
+                store_writer.append(top_results)
+            else:
+                for result in top_results:
+                    AnalyticsFactory.write_results(current_time, result)
+    finally:
+        if shared_path is not None:
+            SharedArrays.release_shared_dir(shared_path)
+        if store_writer is not None:
+            store_writer.close()
     pbar.close()
 
-    path_to_analytics = os.path.join(Consts.PATH_TO_WRITE_RESULT, TimeHelper.epoch_to_date_time(
-        current_time).strftime(
-        Consts.WRITE_DATE_FORMAT), 'analytics')
-
-    analytics_files = os.listdir(path_to_analytics)
-    list_analytics_files_dfs = []
-    for file_name in analytics_files:
-        list_analytics_files_dfs.append(pd.read_csv(os.path.join(path_to_analytics, file_name)))
-
-    all_analytics_files_df = pd.concat(list_analytics_files_dfs, ignore_index=True, sort=True)
-    path_to_write_summery = os.path.join(path_to_analytics, 'Simulations__Summery__Analytics.csv')
-    all_analytics_files_df.set_index('simulation_id', inplace=True)
-    all_analytics_files_df.to_csv(path_to_write_summery)
-    logger.info('Finished all simlations, base path result:{}, analytics summery: {}'.format(os.path.join(Consts.PATH_TO_WRITE_RESULT, TimeHelper.epoch_to_date_time(
-        current_time).strftime(
-        Consts.WRITE_DATE_FORMAT)), path_to_write_summery))
+    if result_cache is not None:
+        result_cache.evict(Consts.RESULT_CACHE_MAX_SIZE_MB)
+
+    path_to_write_summery = summary_writer.close()
+    logger.info('Finished all simlations, base path result:{}, analytics summery: {}'.format(path_to_run_result,
+                                                                                             path_to_write_summery))
@@ -6,6 +6,7 @@ import logging
 import pandas as pd
 
 from Utilities import TimeHelper, Consts
+from Analytics import ResultStore
 import FindBestStrategy
 
 # Ignore SettingWithCopyWarning
@@ -42,6 +43,62 @@ parser.add_argument("-resultPath", type=str, nargs='?',
                     const=True, default=os.getcwd(),
                     help="The path to create the results folder. default the working dir.")
 
+parser.add_argument("-priceCachePath", type=str, default=None,
+                    help="The directory for the binary cache of the coins price file. "
+                         "default: next to the coins price file.")
+
+parser.add_argument("-noPriceCache", type=bool, nargs='?',
+                    const=True, default=False,
+                    help="Always parse the coins price file, do not read or write the binary cache.")
+
+parser.add_argument("-sharedMemory", type=bool, nargs='?',
+                    const=True, default=False,
+                    help="Place the coins prices and ML results once in shared memory (memory-mapped files) for all "
+                         "the simulation processes, keeps memory flat as the number of processes grows.")
+
+parser.add_argument("-batchSize", type=int, nargs='?',
+                    const=None, default=None,
+                    help="Run the simulations in batches of batchSize simulations which advance together tick by tick "
+                         "(every batch shares the price fetches and the ML results of every tick). "
+                         "default: every simulation runs on its own.")
+
+parser.add_argument("-resultCachePath", type=str, default=None,
+                    help="A directory to keep the results of every simulation, a simulation that already ran with the "
+                         "same params, coins prices, ML results and fees is taken from it instead of running again. "
+                         "default: no result cache.")
+
+parser.add_argument("-resultCacheMaxSizeMB", type=int, nargs='?',
+                    const=None, default=None,
+                    help="Disk budget of the result cache, the least recently used results are removed once a run "
+                         "ends. default: {}.".format(Consts.RESULT_CACHE_MAX_SIZE_MB))
+
+parser.add_argument("-resultStore", type=str, nargs='?',
+                    const=Consts.RESULT_STORE_FORMAT, default=Consts.RESULT_STORE_FORMAT,
+                    choices=Consts.RESULT_STORE_FORMATS,
+                    help="How to write the positions, params and capital history of the simulations. csv: a directory "
+                         "per simulation. parquet: a single store for all simulations in the store directory of the "
+                         "run, read with Analytics.ResultStore.ResultStoreReader (requires pyarrow). "
+                         "default: {}.".format(Consts.RESULT_STORE_FORMAT))
+
+parser.add_argument("-outputLevel", type=str, nargs='?',
+                    const=Consts.OUTPUT_LEVEL, default=Consts.OUTPUT_LEVEL, choices=Consts.OUTPUT_LEVELS,
+                    help="What to write for every simulation besides the analytics summary. summary: nothing. "
+                         "capital: the params and the capital history. full: the params, the capital history and the "
+                         "positions. default: {}.".format(Consts.OUTPUT_LEVEL))
+
+parser.add_argument("-retainTopN", type=int, nargs='?',
+                    const=None, default=None,
+                    help="Write the output level details only for the N simulations with the highest "
+                         "-retainTopMetric, the others have only their analytics in the summary. "
+                         "default: details for all simulations.")
+
+parser.add_argument("-retainTopMetric", type=str, nargs='?',
+                    const=Consts.RETAIN_TOP_METRIC, default=Consts.RETAIN_TOP_METRIC,
+                    choices=Consts.RETAIN_TOP_METRICS,
+                    help="The analytics metric (against the first benchmark) which ranks the simulations for "
+                         "-retainTopN, the lowest standard_deviation is the top. "
+                         "default: {}.".format(Consts.RETAIN_TOP_METRIC))
+
 parser.add_argument("-AnalyzeExistingResults", type=bool, nargs='?',
                     const=True, default=None,
                     help="take the result of the simulation that already finished. and summarizes it.")
@@ -52,11 +109,20 @@ if __name__ == '__main__':
     current_time = TimeHelper.current_time_stamp()
     Consts.BENCHMARKS = args.benchmarkCoins
     Consts.set_path_to_write_result(args.resultPath)
+    Consts.set_price_cache(args.priceCachePath, not args.noPriceCache)
+    Consts.set_result_cache(args.resultCachePath, args.resultCacheMaxSizeMB)
+    Consts.set_result_store(args.resultStore)
+    Consts.set_output_level(args.outputLevel, args.retainTopN, args.retainTopMetric)
     if not args.RunSimulations and not args.AnalyzeExistingResults:
         print("Please select at least one runStage in order to start Manager.")
         quit(1)
 
     if args.RunSimulations:
+        if args.retainTopN is not None and args.retainTopN < 1:
+            print("retainTopN must be at least 1.")
+            quit(1)
+        if args.resultStore == Consts.RESULT_STORE_PARQUET:
+            ResultStore.check_pyarrow()
         if args.pathToCoinsPrice is None:
             print("Please specify the pathToCoinsPrice.")
             quit(1)
@@ -66,7 +132,11 @@ if __name__ == '__main__':
         if not args.pathToCoinsPrice.endswith('.csv.gz'):
             print("pathToCoinsPrice must be csv and gzip compressed.")
             quit(1)
-        FindBestStrategy.run(args.pathToCoinsPrice, benchmark_symbols_list=Consts.BENCHMARKS)
+        if args.priceCachePath is not None and not os.path.isdir(args.priceCachePath):
+            print("priceCachePath is not a directory {}.".format(args.priceCachePath))
+            quit(1)
+        FindBestStrategy.run(args.pathToCoinsPrice, benchmark_symbols_list=Consts.BENCHMARKS,
+                             shared_memory=args.sharedMemory, batch_size=args.batchSize)
 
     elif args.AnalyzeExistingResults:
         # Remove files from old runs in Consts.PATH_TO_WRITE_PARTIAL_RESULT
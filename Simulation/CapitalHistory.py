@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+CAPITAL_HISTORY_COLUMNS = ['liquid_capital', 'shorts_capital', 'long_capital', 'leverage_capital', 'fees_paid',
+                           'miss_positions', 'hit_positions', 'stopped_positions', 'expired_positions',
+                           'hit_trail_positions', 'total_number_of_active_positions', 'hours_with_no_predictions']
+
+
+class CapitalHistory(object):
+    """
+    Preallocated columnar buffer of the portfolio status in every tick, filled in place and converted to a
+    dataframe once at the end of the simulation.
+    With amount_of_simulations every column has a value per simulation of a batch in every tick.
+    """
+
+    def __init__(self, amount_of_ticks, amount_of_simulations=None):
+        self.length = 0
+        self.date_time = np.zeros(amount_of_ticks, dtype=np.int64)  # epoch timestamps
+        shape = (amount_of_ticks,) if amount_of_simulations is None else (amount_of_ticks, amount_of_simulations)
+        self.columns = {column: np.zeros(shape) for column in CAPITAL_HISTORY_COLUMNS}
+
+    @classmethod
+    def for_interval(cls, start_timestamp, end_timestamp, tick_time_hours, amount_of_simulations=None):
+        """
+        :return: CapitalHistory sized for ticking from start_timestamp until (not including) end_timestamp
+        """
+        tick_seconds = tick_time_hours * 60 * 60
+        return cls(max(0, int(np.ceil((end_timestamp - start_timestamp) / float(tick_seconds)))),
+                   amount_of_simulations)
+
+    def __len__(self):
+        return self.length
+
+    def _grow(self):
+        capacity = max(1, 2 * len(self.date_time))
+        self.date_time = np.resize(self.date_time, capacity)
+        for column in CAPITAL_HISTORY_COLUMNS:
+            values = self.columns[column]
+            self.columns[column] = np.zeros((capacity,) + values.shape[1:])
+            self.columns[column][:self.length] = values[:self.length]
+
+    def append(self, date_time, **values):
+        """
+        Adds a row
+        :param date_time: epoch timestamp of the tick
+        :param values: value (or np.array of a value per simulation) for every column in CAPITAL_HISTORY_COLUMNS
+        :return:
+        """
+        if self.length == len(self.date_time):
+            self._grow()
+        self.date_time[self.length] = date_time
+        for column, value in values.items():
+            self.columns[column][self.length] = value
+        self.length += 1
+
+    def extend(self, date_times, **values):
+        """
+        Adds rows
+        :param date_times: np.array of epoch timestamps of the ticks
+        :param values: for every column in CAPITAL_HISTORY_COLUMNS a value which is broadcast to the rows (a single value,
+         a value per row or a value per simulation)
+        :return:
+        """
+        while self.length + len(date_times) > len(self.date_time):
+            self._grow()
+        rows = slice(self.length, self.length + len(date_times))
+        self.date_time[rows] = date_times
+        for column, value in values.items():
+            self.columns[column][rows] = value
+        self.length += len(date_times)
+
+    def to_df(self, simulation_index=None):
+        """
+        :param simulation_index: position of the simulation in the batch, None if there is no simulation dimension
+        :return: df with date_time (datetime) and all CAPITAL_HISTORY_COLUMNS, columns sorted by name
+        """
+        if simulation_index is None:
+            data = {column: values[:self.length] for column, values in self.columns.items()}
+        else:
+            data = {column: values[:self.length, simulation_index] for column, values in self.columns.items()}
+        data['date_time'] = pd.to_datetime(self.date_time[:self.length], unit='s')
+        return pd.DataFrame(data=data, columns=sorted(data.keys()))
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+
+import numpy as np
+
+HIGH_FIELD = '_high'
+LOW_FIELD = '_low'
+MAX_HIGH_LOW_RATIO = 2  # a bigger jump between high and low in a single candle closes the position as a loss
+
+# Reasons of a hit, flags of the checks which the candle of the hit passed
+NO_HIT = 0
+REACH_HIGH = 1  # the high price reached the positive target
+REACH_LOW = 2  # the low price reached the negative target
+JUMP = 4  # 2 times jump between high and low
+MISSING_PRICE = 8  # the high or low price is missing
+
+
+def first_hit(price_store, symbol_index, time_index, stride, buy_price, positive_target, negative_target,
+              max_steps=None):
+    """
+    Finds in one forward scan over the high and low prices of a coin the first tick a position reaches its positive
+    target, its negative target or a 2 times jump between high and low, the same checks as
+    PositionBook.reach_target_update.
+    A tick with a missing high or low price is returned as a hit, so the per-tick check of that tick handles it (it
+    raises on missing market data) instead of the scan skipping it.
+    :param price_store: PriceStore
+    :param symbol_index: offset of the coin in the price store
+    :param time_index: offset of the current tick in the price store, the scan starts at the next tick
+    :param stride: amount of price store steps in a tick
+    :param buy_price: the last buy price of the position
+    :param positive_target:
+    :param negative_target:
+    :param max_steps: amount of ticks to scan (e.x. until the position expires), None scans until the end of the data
+    :return: amount of ticks until the first hit (or missing price), -1 if there is no hit, and the reason of the hit
+     (flags of REACH_HIGH, REACH_LOW, JUMP and MISSING_PRICE, NO_HIT if there is no hit)
+    """
+    stop = price_store.amount_of_steps
+    if max_steps is not None:
+        stop = min(stop, time_index + max_steps * stride + 1)
+    candles = price_store.values[symbol_index, time_index + stride:stop:stride]
+    high = candles[:, price_store.field_to_index[HIGH_FIELD]]
+    low = candles[:, price_store.field_to_index[LOW_FIELD]]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reach_high = ((high / buy_price) - 1) >= positive_target
+        reach_low = ((low / buy_price) - 1) <= negative_target
+        jump = high / low > MAX_HIGH_LOW_RATIO
+    missing_price = np.isnan(high) | np.isnan(low)
+    hit = reach_high | reach_low | jump | missing_price
+    if not hit.any():
+        return -1, NO_HIT
+    step = int(np.argmax(hit))
+    reason = (REACH_HIGH if reach_high[step] else 0) | (REACH_LOW if reach_low[step] else 0) | \
+        (JUMP if jump[step] else 0) | (MISSING_PRICE if missing_price[step] else 0)
+    return step + 1, reason
+
+
+class FirstHitCache(object):
+    """
+    LRU memo of first_hit (the steps and the reason of the hit). The result depends only on the coin, the tick, the
+    buy price, the targets and the expiry, not on the capital or on the simulation, so the positions opened by many
+    simulations (e.x. a params sweep which changes only the capital or the leverage) share the scan.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size  # max amount of results to keep, 0 disables the cache
+        self.price_store = None  # the price store of the results
+        self.hits = 0
+        self.misses = 0
+        self.__results = OrderedDict()
+
+    def first_hit(self, price_store, symbol_index, time_index, stride, buy_price, positive_target, negative_target,
+                  max_steps=None):
+        """
+        Same as first_hit
+        """
+        if self.max_size <= 0:
+            return first_hit(price_store, symbol_index, time_index, stride, buy_price, positive_target,
+                             negative_target, max_steps)
+
+        if price_store is not self.price_store:
+            self.__results.clear()
+            self.price_store = price_store
+
+        key = (int(symbol_index), int(time_index), int(stride), float(buy_price), float(positive_target),
+               float(negative_target), max_steps)
+        if key in self.__results:
+            self.hits += 1
+            self.__results.move_to_end(key)
+            return self.__results[key]
+
+        self.misses += 1
+        result = first_hit(price_store, symbol_index, time_index, stride, buy_price, positive_target, negative_target,
+                           max_steps)
+        self.__results[key] = result
+        if len(self.__results) > self.max_size:
+            self.__results.popitem(last=False)
+        return result
@@ -0,0 +1,385 @@
+import logging
+
+import numpy as np
+from Simulation import Sizing
+from Simulation.PositionBook import PositionBook
+from Simulation.PositionLedger import PositionLedger
+from Utilities import Consts, TimeHelper
+from Utilities import DataHelper
+
+logger = logging.getLogger("MultiPortfolio")
+
+# Market data with all coins
+coins_market_data_getter = DataHelper.DataHelper()
+
+
+def sum_by_simulation(values, simulation_index, amount_of_simulations):
+    """
+    Sums values per simulation, adding them one by one in the order of values like the single portfolio does
+    :param values: np.array
+    :param simulation_index: np.array, the simulation of every value
+    :param amount_of_simulations:
+    :return: np.array of a sum per simulation
+    """
+    sums = np.zeros(amount_of_simulations)
+    np.add.at(sums, simulation_index, values)
+    return sums
+
+
+def simulations_param(df_simulations, column, dtype=np.float64):
+    """
+    :return: np.array of the param of every simulation
+    """
+    return np.array([value for value in df_simulations[column]], dtype=dtype)
+
+
+def simulations_strategy_param(df_simulations, column, key):
+    """
+    :param column: a strategy param (dict), e.x. long_investment_strategy
+    :param key: key in the strategy, e.x. min_prob_positive
+    :return: np.array of the value of key in the strategy of every simulation, NaN if the strategy does not have it
+    """
+    return np.array([strategy.get(key, np.nan) for strategy in df_simulations[column]], dtype=np.float64)
+
+
+class MultiPortfolio(object):
+    """
+    The portfolios of a batch of simulations which share the time ticker and the fees.
+    The statistics and the params are arrays with a value per simulation and the open positions of all simulations
+    are kept in a single position book, so every update is one pass over the positions of the whole batch.
+    The new positions of the simulations which invest in the same coins are decided together, as a matrix of
+    (simulations x predictions), with the same decisions as Portfolio.enter_new_positions for every simulation.
+    """
+
+    def __init__(self, df_simulations, fees, time_ticker):
+        self.time_ticker = time_ticker
+        self.position_book = PositionBook(fees, time_ticker)  # all active positions of all simulations
+        self.amount_of_simulations = len(df_simulations)
+        self.positions_ledgers = [PositionLedger() for _ in range(self.amount_of_simulations)]  # closed positions
+        self.sizing_table = Sizing.sizing_table()  # None if the position sizes are not precomputed
+
+        # Params of every simulation, see Portfolio
+        self.trailing_strategy = simulations_param(df_simulations, 'trailing_strategy', bool)
+        self.shorts = simulations_param(df_simulations, 'shorts', bool)
+        self.longs = simulations_param(df_simulations, 'longs', bool)
+        self.leverage = simulations_param(df_simulations, 'leverage')
+        self.min_prob_for_leverage = simulations_param(df_simulations, 'min_prob_for_leverage')
+        self.max_percent_cap_investment_in_a_round = simulations_param(df_simulations,
+                                                                       'max_percent_cap_investment_in_a_round')
+        self.max_percent_out_of_volume = simulations_param(df_simulations, 'max_percent_out_of_volume')
+        self.min_investment = simulations_param(df_simulations, 'min_investment')
+        self.accept_short_and_long_same_tick_and_symbol = simulations_param(
+            df_simulations, 'accept_short_and_long_same_tick_and_symbol', bool)
+        self.apply_leverage_fees_on_all_capital = simulations_param(df_simulations,
+                                                                    'apply_leverage_fees_on_all_capital', bool)
+        self.long_min_prob_positive = simulations_strategy_param(df_simulations, 'long_investment_strategy',
+                                                                 'min_prob_positive')
+        self.long_max_prob_negative = simulations_strategy_param(df_simulations, 'long_investment_strategy',
+                                                                 'max_prob_negative')
+        self.short_max_prob_positive = simulations_strategy_param(df_simulations, 'short_investment_strategy',
+                                                                  'max_prob_positive')
+        self.short_min_prob_negative = simulations_strategy_param(df_simulations, 'short_investment_strategy',
+                                                                  'min_prob_negative')
+        self.long_trailing_high_boundary = simulations_strategy_param(df_simulations, 'long_trailing_strategy',
+                                                                      'high_boundary')
+        self.long_trailing_low_boundary = simulations_strategy_param(df_simulations, 'long_trailing_strategy',
+                                                                     'low_boundary')
+        self.short_trailing_high_boundary = simulations_strategy_param(df_simulations, 'short_trailing_strategy',
+                                                                       'high_boundary')
+        self.short_trailing_low_boundary = simulations_strategy_param(df_simulations, 'short_trailing_strategy',
+                                                                      'low_boundary')
+        self.active_long_max_prob_negative = simulations_strategy_param(
+            df_simulations, 'active_long_investment_strategy', 'max_prob_negative')
+        self.active_short_max_prob_positive = simulations_strategy_param(
+            df_simulations, 'active_short_investment_strategy', 'max_prob_positive')
+
+        self.liquid_capital = simulations_param(df_simulations, 'amount_of_capital')
+        self.leverage_capital = np.zeros(self.amount_of_simulations)
+        self.long_capital = np.zeros(self.amount_of_simulations)
+        self.short_capital = np.zeros(self.amount_of_simulations)
+        self.fees_paid = np.zeros(self.amount_of_simulations)
+        self.miss_positions = np.zeros(self.amount_of_simulations, dtype=np.int64)
+        self.hit_positions = np.zeros(self.amount_of_simulations, dtype=np.int64)
+        self.expired_positions_counter = np.zeros(self.amount_of_simulations, dtype=np.int64)
+        self.stopped_positions_counter = np.zeros(self.amount_of_simulations, dtype=np.int64)
+        self.hit_trail_positions = np.zeros(self.amount_of_simulations, dtype=np.int64)
+
+    def is_there_open_positions(self):
+        """
+        Checks if there are open positions in any portfolio
+        :return: Boolean
+        """
+        return len(self.position_book) > 0
+
+    def active_positions_count(self):
+        """
+        :return: np.array of the amount of open positions of every simulation
+        """
+        return np.bincount(self.position_book.simulation_index, minlength=self.amount_of_simulations)
+
+    def closed_positions(self, closed_rows):
+        """
+        Actions which reflects closed positions
+        :param closed_rows: dict column -> np.array of the closed positions, short positions first
+        :return: None
+        """
+        simulation_index = closed_rows['simulation_index']
+        is_short = closed_rows['is_short']
+        liquid_capital = closed_rows['current_capital'] - closed_rows['leverage_capital']
+        liquidated_short_capital = sum_by_simulation(liquid_capital[is_short], simulation_index[is_short],
+                                                     self.amount_of_simulations)
+        liquidated_long_capital = sum_by_simulation(liquid_capital[~is_short], simulation_index[~is_short],
+                                                    self.amount_of_simulations)
+        fees_paid = sum_by_simulation(closed_rows['fees_paid'], simulation_index, self.amount_of_simulations)
+        leveraged_capital = sum_by_simulation(closed_rows['leverage_capital'], simulation_index,
+                                              self.amount_of_simulations)
+
+        # Update if trailing has been activate
+        self.hit_trail_positions += np.bincount(simulation_index, weights=closed_rows['trailing_activated'],
+                                                minlength=self.amount_of_simulations).astype(np.int64)
+
+        # Update hit/miss/expired/stopped counters
+        hit = closed_rows['hit_profit_target']
+        expired = ~hit & closed_rows['expired']
+        stopped = ~hit & ~expired & closed_rows['stopped']
+        missed = ~hit & ~expired & ~stopped
+        self.hit_positions += np.bincount(simulation_index[hit], minlength=self.amount_of_simulations)
+        self.expired_positions_counter += np.bincount(simulation_index[expired], minlength=self.amount_of_simulations)
+        self.stopped_positions_counter += np.bincount(simulation_index[stopped], minlength=self.amount_of_simulations)
+        self.miss_positions += np.bincount(simulation_index[missed], minlength=self.amount_of_simulations)
+
+        # Update portfolios statistics according to the closed positions
+        self.fees_paid += fees_paid
+        self.liquid_capital += liquidated_long_capital + liquidated_short_capital
+        self.leverage_capital -= leveraged_capital
+
+    def updater(self, func_name, ml_results=None):
+        """
+        Applies a function of PositionBook which closes positions upon all active positions of all simulations.
+        :param func_name: The string of the function name in PositionBook Class.
+        :param ml_results: If required the ml result of the current time for the function
+        :return:
+        """
+        closed = getattr(self.position_book, func_name)(ml_results=ml_results)
+
+        if closed.any():
+            coin_symbols = self.position_book.coin_symbols(closed)
+            closed_rows = self.position_book.take_closed(closed)
+
+            # Short positions first, each side in opening order
+            order = np.argsort(~closed_rows['is_short'], kind='mergesort')
+            closed_rows = {column: values[order] for column, values in closed_rows.items()}
+            coin_symbols = [coin_symbols[row] for row in order]
+
+            for simulation_index in np.unique(closed_rows['simulation_index']):
+                rows = np.flatnonzero(closed_rows['simulation_index'] == simulation_index)
+                self.positions_ledgers[simulation_index].record_many(
+                    {column: values[rows] for column, values in closed_rows.items()},
+                    [coin_symbols[row] for row in rows], self.position_book.position_end_time)
+
+            # Updates Portfolios stats according to new closed positions
+            self.closed_positions(closed_rows)
+
+        # Updates capital stats after last operations
+        self.update_capital_stats()
+
+    def apply_time_leverage_fees(self):
+        """
+        applies leverage fee on active positions with leverage
+        :return:
+        """
+        if len(self.position_book) == 0:
+            return
+
+        self.position_book.apply_time_leverage_fees()
+        self.update_capital_stats()
+
+    def update_capital_stats(self):
+        """
+        Updates capital statistics of every simulation according to all open positions
+        :return:
+        """
+        liquid_capital = self.position_book.get_current_liquid_capital()
+        is_short = self.position_book.is_short
+        simulation_index = self.position_book.simulation_index
+
+        self.short_capital = sum_by_simulation(liquid_capital[is_short], simulation_index[is_short],
+                                               self.amount_of_simulations)
+        self.long_capital = sum_by_simulation(liquid_capital[~is_short], simulation_index[~is_short],
+                                              self.amount_of_simulations)
+
+    def enter_new_positions(self, simulations_indexes, current_ml_results):
+        """
+        Lets simulations which invest in the same coins invest in the predictions of current time according to their
+        strategies, like Portfolio.enter_new_positions of every simulation
+        :param simulations_indexes: positions of the simulations in the batch
+        :param current_ml_results: df of the predictions of current time for the coins of the simulations
+        :return: None
+        """
+        simulations = np.asarray(simulations_indexes)
+        coin_symbols = current_ml_results['coin_symbol'].values
+        order_type = current_ml_results['order_type'].values
+        prob_positive = current_ml_results[Consts.PROB_POSITIVE_HEADER].values.astype(np.float64)
+        prob_negative = current_ml_results[Consts.PROB_NEGATIVE_HEADER].values.astype(np.float64)
+        is_long = order_type == Consts.LONG
+        is_short = order_type == Consts.SHORT
+
+        # The predictions every simulation considers, a row per simulation. Simulations which do not accept short
+        # and long position on the same coin at the same time keep the first prediction of every coin
+        first_of_coin = ~current_ml_results.duplicated('coin_symbol').values
+        candidates = (self.accept_short_and_long_same_tick_and_symbol[simulations, None] | first_of_coin) & \
+            (self.longs[simulations, None] | ~is_long) & (self.shorts[simulations, None] | ~is_short)
+
+        # Volume boundary of the coins at current time, fetched once for all simulations
+        volume = np.full(len(coin_symbols), np.nan)
+        for row in np.flatnonzero(candidates.any(axis=0)):
+            volume[row] = self.fetch_coins_24h_volumeto(coin_symbols[row])
+        coins_max_capital_volume_boundary = self.max_percent_out_of_volume[simulations, None] * volume
+
+        # Not enough volume to invest
+        not_enough_volume = candidates & (coins_max_capital_volume_boundary < self.min_investment[simulations, None])
+        for row in np.argwhere(not_enough_volume)[:, 1]:
+            logger.warning("Not enough volume to invest in {} at {}".format(
+                coin_symbols[row], TimeHelper.epoch_to_date_time(self.time_ticker.current_time)))
+        candidates &= ~not_enough_volume
+
+        # Long and short investment strategies, predictions of other order types stay
+        long_strategy = (prob_positive >= self.long_min_prob_positive[simulations, None]) & \
+            (prob_negative < self.long_max_prob_negative[simulations, None])
+        short_strategy = (prob_positive < self.short_max_prob_positive[simulations, None]) & \
+            (prob_negative >= self.short_min_prob_negative[simulations, None])
+        candidates &= np.where(is_long, long_strategy, np.where(is_short, short_strategy, True))
+
+        # Available capital for current round
+        available_capital = self.liquid_capital[simulations] * self.max_percent_cap_investment_in_a_round[simulations]
+        investing = candidates.any(axis=1) & (available_capital >= self.min_investment[simulations])
+        if not investing.any():
+            logger.debug("There are no new positions for time: {}".format(
+                TimeHelper.epoch_to_date_time(self.time_ticker.current_time)))
+            return
+        simulations, candidates, available_capital = \
+            simulations[investing], candidates[investing], available_capital[investing]
+
+        capital_to_invest = self.capital_allocation_strategy(simulations, candidates, available_capital, volume,
+                                                             current_ml_results)
+
+        # Leverage for the positions which probability is high enough
+        prob = np.where(is_long, prob_positive, prob_negative)
+        leveraged_capital = np.where((self.leverage[simulations, None] > 1) &
+                                     (prob >= self.min_prob_for_leverage[simulations, None]),
+                                     (capital_to_invest * self.leverage[simulations, None]) - capital_to_invest, 0)
+
+        # Create new positions, every simulation its positions in the order of the predictions
+        simulation_of_position, row_of_position = np.nonzero(candidates)
+        simulation_index = simulations[simulation_of_position]
+        position_is_short = is_short[row_of_position]
+        trailing_high_boundary = np.where(position_is_short, self.short_trailing_high_boundary[simulation_index],
+                                          self.long_trailing_high_boundary[simulation_index])
+        trailing_low_boundary = np.where(position_is_short, self.short_trailing_low_boundary[simulation_index],
+                                         self.long_trailing_low_boundary[simulation_index])
+        active_max_prob = np.where(position_is_short, self.active_short_max_prob_positive[simulation_index],
+                                   self.active_long_max_prob_negative[simulation_index])
+        position_leveraged_capital = leveraged_capital[candidates]
+        rows = self.position_book.open_positions(
+            coins_market_data_getter.price_store.symbols_indexes(coin_symbols[row_of_position]), position_is_short,
+            current_ml_results['high_boundary'].values[row_of_position],
+            current_ml_results['low_boundary'].values[row_of_position],
+            capital_to_invest[candidates] + position_leveraged_capital, position_leveraged_capital,
+            current_ml_results['time_predict'].values[row_of_position], self.leverage[simulation_index],
+            self.trailing_strategy[simulation_index], trailing_high_boundary, trailing_low_boundary,
+            active_max_prob, self.apply_leverage_fees_on_all_capital[simulation_index], simulation_index)
+        liquid_capital = self.position_book.get_current_liquid_capital()[rows]
+        leverage_capital = self.position_book.leverage_capital[rows]
+
+        # Allocates each position to its relevant statistics, one by one in the order of the positions
+        np.add.at(self.short_capital, simulation_index[position_is_short], liquid_capital[position_is_short])
+        np.add.at(self.long_capital, simulation_index[~position_is_short], liquid_capital[~position_is_short])
+        np.subtract.at(self.liquid_capital, simulation_index, liquid_capital)
+        np.add.at(self.leverage_capital, simulation_index, leverage_capital)
+
+        logger.debug("Finished investment cycle of {} simulations for time {}".format(
+            len(simulations), TimeHelper.epoch_to_date_time(self.time_ticker.current_time)))
+
+    def capital_allocation_strategy(self, simulations, candidates, available_capital, volume, current_ml_results):
+        """
+        Allocates the available capital of every simulation to its new positions, like
+        Portfolio.capital_allocation_strategy for every simulation: every round divides the available capital
+        equally by the positions which are not fully invested, caps each by its volume boundary, scales it by the
+        probability and divides what is left again in the next round.
+        :param simulations: np.array of positions of the simulations in the batch
+        :param candidates: mask of (simulations x predictions), the new positions of every simulation
+        :param available_capital: np.array of the available capital of every simulation for this round
+        :param volume: np.array of the volume of every prediction
+        :param current_ml_results: df of the predictions
+        :return: np.array of (simulations x predictions) of the capital to invest
+        """
+        available_capital = available_capital.copy()
+        fully_invested = ~candidates
+        capital_to_invest = np.zeros(candidates.shape)
+        min_investment = self.min_investment[simulations]
+        max_percent_out_of_volume = self.max_percent_out_of_volume[simulations, None]
+        active = np.ones(len(simulations), dtype=bool)
+
+        # The risk indicator of a position is the same in every round and for every simulation
+        capital_percent = Sizing.percent_capital_according_to_probability(
+            current_ml_results[Consts.PROB_POSITIVE_HEADER].values, current_ml_results[Consts.PROB_NEGATIVE_HEADER].values,
+            current_ml_results['order_type'].values, self.sizing_table)
+        zero_volume = volume == 0.0
+        coins_max_capital_volume_boundary = max_percent_out_of_volume * volume
+
+        while True:
+
+            # Count positions which capital size is not equal to max capacity of investment, a simulation stops
+            # allocating if there are no such positions or its equal share is smaller then min investment
+            not_fully_invested = ~fully_invested & active[:, None]
+            total_positions_count = not_fully_invested.sum(axis=1)
+            coins_available_capital = np.zeros(len(simulations))
+            counted = total_positions_count > 0
+            coins_available_capital[counted] = available_capital[counted] / total_positions_count[counted]
+            active &= counted & (coins_available_capital >= min_investment)
+            if not active.any():
+                break
+            not_fully_invested &= active[:, None]
+
+            not_invested = not_fully_invested & zero_volume
+            if logger.isEnabledFor(logging.DEBUG):
+                for row in np.argwhere(not_invested)[:, 1]:
+                    logger.debug("Volume is zero. Not investing in: {}, at time: {}".format(
+                        current_ml_results['coin_symbol'].values[row],
+                        TimeHelper.epoch_to_date_time(self.time_ticker.current_time)))
+
+            # If the volume boundary is smaller then available capital, then there is maximum capital in current
+            # position means = fully invested
+            reach_volume_boundary = not_fully_invested & ~zero_volume & \
+                (coins_max_capital_volume_boundary < coins_available_capital[:, None])
+            max_amount_to_invest_in_coin = np.where(reach_volume_boundary, coins_max_capital_volume_boundary,
+                                                    coins_available_capital[:, None])
+            fully_invested |= not_invested | reach_volume_boundary
+
+            # Risk indicator which decreases positions size according to probability
+            invested = not_fully_invested & ~zero_volume
+            current_capital_to_invest_in_position = np.where(invested, capital_percent * max_amount_to_invest_in_coin,
+                                                             0.0)
+            capital_to_invest[invested] = capital_to_invest[invested] + current_capital_to_invest_in_position[invested]
+
+            # Positions are added one by one, like the capital is used (adding the zeros of other positions is exact)
+            used_capital = np.cumsum(current_capital_to_invest_in_position, axis=1)[:, -1]
+            available_capital[active] -= used_capital[active]
+
+            # Nothing was used and nothing became fully invested, the next round would be the same
+            active &= (used_capital > 0) | (not_invested | reach_volume_boundary).any(axis=1)
+
+        return capital_to_invest
+
+    def fetch_coins_24h_volumeto(self, coin_symbol):
+        """
+        Aggregated volumeto for the last 24h, raises if there is no market data
+        :param coin_symbol:
+        :return: volumeto24h
+        """
+        success, volumeto = coins_market_data_getter.get_coin_volumeto_24h(self.time_ticker.current_time, coin_symbol)
+        if not success:
+            logger.error("Skipping coin {}, there is no market data for the 24h before {}".format(
+                coin_symbol, TimeHelper.epoch_to_date_time(self.time_ticker.current_time)))
+            raise Exception
+        return volumeto
@@ -0,0 +1,177 @@
+import logging
+import numpy as np
+from Analytics import AnalyticsFactory
+from Simulation import TimeTicker
+from Simulation.CapitalHistory import CapitalHistory
+from Simulation.MultiPortfolio import MultiPortfolio
+from Utilities import Consts
+from Utilities.DataHelper import DataHelper
+
+logger = logging.getLogger("MultiSimulation")
+
+data_helper = DataHelper()
+
+
+class MultiSimulation:
+    def __init__(self,
+                 params):  # params_order = (ml_results, df_simulations, tick_time_hours, fees, _current_time, coins_for_benchmark, duplicates, result_cache, benchmarks)
+        self.ml_results = params[0]  # All ml result for the simulations, bucketed by prediction time
+        self.df_simulations = params[1]  # Params for simulations, a row per simulation
+        self.tick_time_hours = params[2]  # The time to tick for simulation in hours
+        self.fees = params[3]  # The fees class which includes individual fees and default fees
+        self.capital_history = None  # Will be initiated at the run function, updated after every tick
+        self.start_running_time = params[4]  # The start of the running time
+        self.time_ticker = None  # Will be initiated at the run function as a class
+        self.coins_for_benchmark = params[5]  # The requested benchmarks
+        self.duplicates = params[6] if len(params) > 6 else {}  # simulation id -> df of its equivalent simulations
+        self.result_cache = params[7] if len(params) > 7 else None  # ResultCache to store the results, None if disabled
+        self.benchmarks = params[8] if len(params) > 8 else None  # Benchmarks shared by all simulations of the run
+        self.results = None  # Will be set at the end of the run function, list of results (with the analytics)
+        self.hours_with_no_predictions = 0
+
+        # Simulations which invest in the same coins share the ml results of every tick
+        self.simulations_by_coins = {}
+        for position, coins_to_invest in enumerate(self.df_simulations['coins_to_invest_in']):
+            key = tuple(sorted(coins_to_invest))
+            if key not in self.simulations_by_coins:
+                self.simulations_by_coins[key] = (self.ml_results.for_coins(coins_to_invest), [])
+            self.simulations_by_coins[key][1].append(position)
+
+        # start running simulations
+        self.run()
+
+    def run(self):
+        """
+        Runs all simulations together, tick by tick, in the same order as Simulation.run.
+        The prices of every tick are fetched once for the open positions of all simulations and the ml results of
+        every tick are fetched once for every group of simulations which invest in the same coins, the new positions
+        of a group are decided together (see MultiPortfolio.enter_new_positions).
+        At the end of the run creates the same files as Simulation for each simulation.
+        :return:
+        """
+
+        logger.info('Starting {} simulations, IDs: {} - {}'.format(len(self.df_simulations), self.df_simulations.index[0],
+                                                                  self.df_simulations.index[-1]))
+
+        # Start time is according to oldest ML result
+        start_timestamp, end_timestamp = self.ml_results.start_time, self.ml_results.end_time
+
+        # Create a time ticker for simulations
+        self.time_ticker = TimeTicker.TimeTicker(start_timestamp, self.tick_time_hours)
+        self.capital_history = CapitalHistory.for_interval(start_timestamp, end_timestamp, self.tick_time_hours,
+                                                           len(self.df_simulations))
+
+        # Initial Portfolios
+        portfolios = MultiPortfolio(self.df_simulations, self.fees, self.time_ticker)
+
+        # Ticks with predictions, the simulations jump over the ticks between them while there are no open positions
+        ticks_with_predictions = self.ml_results.ticks_with_predictions(start_timestamp, self.tick_time_hours)
+
+        while self.time_ticker.current_time < end_timestamp:
+
+            # Without open positions nothing changes until the next ml results
+            if not portfolios.is_there_open_positions() and self.ml_results.count(self.time_ticker.current_time) == 0:
+                self.skip_idle_ticks(portfolios, ticks_with_predictions, end_timestamp)
+                continue
+
+            # Update portfolios according to new time for next round
+            portfolios.updater(Consts.UPDATES_NEW_TIME_IS_LIQUIDATE)
+
+            # If There are leveraged positions, decrease fees
+            portfolios.apply_time_leverage_fees()
+
+            # If active positions, update them
+            if portfolios.is_there_open_positions():
+                portfolios.updater(Consts.REACH_TARGET_UPDATE)
+                portfolios.updater(Consts.IS_EXPIRED)
+
+            if self.ml_results.count(self.time_ticker.current_time) == 0:
+                self.hours_with_no_predictions += 1
+            else:
+                # Every position is checked only against the predictions of its own coin, so all simulations share
+                # the probabilities of all coins
+                probabilities = self.ml_results.probabilities_by_symbol(self.time_ticker.current_time,
+                                                                        data_helper.price_store.symbols_indexes,
+                                                                        len(data_helper.price_store.symbols))
+                portfolios.updater(Consts.IS_ACTIVE_INVEST_STRATEGY, ml_results=probabilities)
+
+                for ml_results_to_invest, simulations_indexes in self.simulations_by_coins.values():
+                    current_ml_results_to_invest = ml_results_to_invest.get(self.time_ticker.current_time)
+                    if len(current_ml_results_to_invest) > 0:
+                        portfolios.enter_new_positions(simulations_indexes, current_ml_results_to_invest)
+
+            # Update capital history
+            self.capital_history.append(
+                self.time_ticker.current_time,
+                liquid_capital=portfolios.liquid_capital,
+                shorts_capital=portfolios.short_capital,
+                long_capital=portfolios.long_capital,
+                leverage_capital=portfolios.leverage_capital,
+                fees_paid=portfolios.fees_paid,
+                miss_positions=portfolios.miss_positions,
+                hit_positions=portfolios.hit_positions,
+                stopped_positions=portfolios.stopped_positions_counter,
+                expired_positions=portfolios.expired_positions_counter,
+                hit_trail_positions=portfolios.hit_trail_positions,
+                hours_with_no_predictions=self.hours_with_no_predictions,
+                total_number_of_active_positions=portfolios.active_positions_count())
+
+            # Advance current_timestamp
+            self.time_ticker.advance_one_step()
+
+        # Closing all open positions
+        if portfolios.is_there_open_positions():
+            logger.info("There are open positions, closing all")
+            portfolios.updater(Consts.FORCE_CLOSE_ALL_POSITIONS)
+
+        df_simulations, positions_histories, capital_histories = [], [], []
+        for simulation_index, positions_ledger in enumerate(portfolios.positions_ledgers):
+            df_simulation = self.df_simulations.iloc[[simulation_index]]
+            positions_history = positions_ledger.to_df()
+            capital_history = self.capital_history.to_df(simulation_index)
+            if self.result_cache is not None:
+                self.result_cache.put(df_simulation, positions_history, capital_history)
+            df_simulations.append(df_simulation)
+            positions_histories.append(positions_history)
+            capital_histories.append(capital_history)
+
+        # The statistics of all simulations are computed together
+        logger.info('Creating analytics files for simulations IDs: {} - {}'.format(self.df_simulations.index[0],
+                                                                                   self.df_simulations.index[-1]))
+        self.results = AnalyticsFactory.start_many(
+            self.start_running_time, self.coins_for_benchmark, df_simulations, positions_histories, capital_histories,
+            [self.duplicates.get(simulation_id) for simulation_id in self.df_simulations.index], self.benchmarks)
+
+        logger.info('end of simulations IDs: {} - {}'.format(self.df_simulations.index[0], self.df_simulations.index[-1]))
+
+    def skip_idle_ticks(self, portfolios, ticks_with_predictions, end_timestamp):
+        """
+        Advances the time ticker to the next tick with ml results (or to the end) and fills the capital history of the
+        skipped ticks, there are no open positions so only hours_with_no_predictions changes.
+        :param portfolios: MultiPortfolio without open positions
+        :param ticks_with_predictions: sorted np.array of the ticks with ml results
+        :param end_timestamp:
+        :return:
+        """
+        amount_of_ticks = self.time_ticker.idle_steps(ticks_with_predictions, end_timestamp)
+        date_times = self.time_ticker.current_time + \
+            np.arange(amount_of_ticks) * (self.tick_time_hours * 60 * 60)
+        hours_with_no_predictions = self.hours_with_no_predictions + np.arange(1, amount_of_ticks + 1)
+        self.hours_with_no_predictions += amount_of_ticks
+
+        self.capital_history.extend(
+            date_times,
+            liquid_capital=portfolios.liquid_capital,
+            shorts_capital=0,
+            long_capital=0,
+            leverage_capital=portfolios.leverage_capital,
+            fees_paid=portfolios.fees_paid,
+            miss_positions=portfolios.miss_positions,
+            hit_positions=portfolios.hit_positions,
+            stopped_positions=portfolios.stopped_positions_counter,
+            expired_positions=portfolios.expired_positions_counter,
+            hit_trail_positions=portfolios.hit_trail_positions,
+            hours_with_no_predictions=hours_with_no_predictions[:, np.newaxis],
+            total_number_of_active_positions=0)
+
+        self.time_ticker.advance_steps(amount_of_ticks)
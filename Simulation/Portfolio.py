@@ -1,7 +1,8 @@
 import logging
-from Simulation import Position
+import numpy as np
+from Simulation import Sizing
+from Simulation.PositionBook import PositionBook
 from Utilities import Consts, TimeHelper
-from scipy.stats import norm
 from Utilities import DataHelper
 from Simulation.Statistics import Stats
 
@@ -12,7 +13,7 @@ coins_market_data_getter = DataHelper.DataHelper()
 
 
 class Portfolio(Stats):
-    def __init__(self, df_simulation, fees, TimeTicker):
+    def __init__(self, df_simulation, fees, TimeTicker, position_book=None, simulation_index=0):
 
         # Inherit from stats, and initialize with capital
         Stats.__init__(self, df_simulation['amount_of_capital'].iloc[0])
@@ -48,6 +49,11 @@ class Portfolio(Stats):
         self.short_trailing_strategy = df_simulation['short_trailing_strategy'].iloc[0]
         self.time_ticker = TimeTicker  # Tracks the current time of the portfolio
         self.fees = fees  # List of specific fees for specific coin_symbols
+        self.sizing_table = Sizing.sizing_table()  # None if the position sizes are not precomputed
+        self.simulation_index = simulation_index  # position of the simulation in a batch of simulations
+        self.position_book = position_book  # all active positions, shared by all portfolios of a batch
+        if self.position_book is None:
+            self.position_book = PositionBook(fees, TimeTicker)
 
         logger.info("The Portfolio has been created successfully with capital: {}".format(self.liquid_capital))
 
@@ -56,47 +62,39 @@ class Portfolio(Stats):
         Checks if there are open positions in portfolio
         :return: Boolean
         """
-        if len(self.active_long_positions + self.active_short_positions) > 0:
+        if len(self.position_book) > 0:
             return True
         else:
             return False
 
-    def closed_positions(self, closed_pos):
+    def closed_positions(self, closed_rows):
         """
         Actions which reflects a closed position
-        :param closed_pos: A list of closed positions
+        :param closed_rows: dict column -> np.array of the closed positions, short positions first
         :return: None
         """
-        liquidated_short_capital = 0
-        liquidated_long_capital = 0
-        leveraged_capital = 0
-        fees_paid = 0
-
-        for pos in closed_pos:
-            if pos.order_type == Consts.SHORT:
-                liquidated_short_capital += pos.get_current_liquid_capital()
-            else:
-                liquidated_long_capital += pos.get_current_liquid_capital()
+        is_short = closed_rows['is_short']
+        liquid_capital = closed_rows['current_capital'] - closed_rows['leverage_capital']
+        liquidated_short_capital = sequential_sum(liquid_capital[is_short])
+        liquidated_long_capital = sequential_sum(liquid_capital[~is_short])
 
-            # Calculates the amount of fees for the current closed position.
-            fees_paid += pos.fees_paid
+        # Calculates the amount of fees for the closed positions.
+        fees_paid = sequential_sum(closed_rows['fees_paid'])
 
-            # Calculates the amount of leveraged capital for current closed position.
-            leveraged_capital += pos.leverage_capital
+        # Calculates the amount of leveraged capital for the closed positions.
+        leveraged_capital = sequential_sum(closed_rows['leverage_capital'])
 
-            # Update if trailing has been activate
-            if pos.trailing_activated > 0:
-                self.hit_trail_positions += pos.trailing_activated
+        # Update if trailing has been activate
+        self.hit_trail_positions += int(closed_rows['trailing_activated'].sum())
 
-            # Update hit/miss/expired/stopped counters
-            if pos.hit_profit_target:
-                self.hit_positions += 1
-            elif pos.expired:
-                self.expired_positions_counter += 1
-            elif pos.stopped:
-                self.stopped_positions_counter += 1
-            else:
-                self.miss_positions += 1
+        # Update hit/miss/expired/stopped counters
+        hit = closed_rows['hit_profit_target']
+        expired = ~hit & closed_rows['expired']
+        stopped = ~hit & ~expired & closed_rows['stopped']
+        self.hit_positions += int(hit.sum())
+        self.expired_positions_counter += int(expired.sum())
+        self.stopped_positions_counter += int(stopped.sum())
+        self.miss_positions += int((~hit & ~expired & ~stopped).sum())
 
         # Update portfolio statistics according to the closed position
         self.fees_paid += fees_paid
@@ -106,31 +104,30 @@ class Portfolio(Stats):
     def updater(self, func_name, ml_results=None):
         """
         The updater applies different functions which requires to close a position upon all active positions.
-        The functions returns boolean that indicates if the position which the function was applied on need to be closed.
-        :param func_name: The string of the function name in Position Class.
+        The functions returns a mask of the positions which need to be closed.
+        :param func_name: The string of the function name in PositionBook Class.
         :param ml_results: If required the ml result of the current time for the function
         :return:
         """
+        if len(self.position_book) == 0:
+            return
 
-        closed_pos = []
-
-        # Iterates all active positions
-        for pos in self.active_short_positions + self.active_long_positions:
+        # Check which positions reached target /expired / active strategy, and updates the positions accordingly
+        closed = getattr(self.position_book, func_name)(ml_results=ml_results)
 
-            # Check if position reached target /expired / active strategy, and updates the position accordingly
-            if getattr(pos, func_name)(ml_results=ml_results):
+        if closed.any():
+            coin_symbols = self.position_book.coin_symbols(closed)
+            closed_rows = self.position_book.take_closed(closed)
 
-                closed_pos.append(pos)
+            # Short positions first, each side in opening order
+            order = np.argsort(~closed_rows['is_short'], kind='mergesort')
+            closed_rows = {column: values[order] for column, values in closed_rows.items()}
+            coin_symbols = [coin_symbols[row] for row in order]
 
-                if pos.order_type == Consts.LONG and self.longs:
-                    self.active_long_positions.remove(pos)
-                    self.closed_long_positions.append(pos)
-                if pos.order_type == Consts.SHORT and self.shorts:
-                    self.active_short_positions.remove(pos)
-                    self.closed_short_positions.append(pos)
+            self.positions_ledger.record_many(closed_rows, coin_symbols, self.position_book.position_end_time)
 
-        # Updates Portfolio stats according to new closed positions
-        self.closed_positions(closed_pos)
+            # Updates Portfolio stats according to new closed positions
+            self.closed_positions(closed_rows)
 
         # Updates capital stats after last operations
         self.update_capital_stats()
@@ -140,12 +137,11 @@ class Portfolio(Stats):
         applies leverage fee on active positions with leverage
         :return:
         """
-        if len(self.active_long_positions + self.active_short_positions) == 0:
+        if len(self.position_book) == 0:
             return
 
         if self.leverage > 1:
-            for pos in (self.active_long_positions + self.active_short_positions):
-                pos.apply_time_leverage_fees()
+            self.position_book.apply_time_leverage_fees()
 
             self.update_capital_stats()
 
@@ -154,18 +150,11 @@ class Portfolio(Stats):
         Updates capital statistics according to all open positions
         :return:
         """
-        short_capital = 0
-        long_capital = 0
+        liquid_capital = self.position_book.get_current_liquid_capital()
+        is_short = self.position_book.is_short
 
-        for pos in (self.active_long_positions + self.active_short_positions):
-
-            if pos.order_type == Consts.LONG:
-                long_capital += pos.get_current_liquid_capital()
-            else:
-                short_capital += pos.get_current_liquid_capital()
-
-        self.short_capital = short_capital
-        self.long_capital = long_capital
+        self.short_capital = sequential_sum(liquid_capital[is_short])
+        self.long_capital = sequential_sum(liquid_capital[~is_short])
 
     def enter_new_positions(self, current_ml_results):
         """"
@@ -265,29 +254,39 @@ class Portfolio(Stats):
             new_positions = self.add_leverage_by_conditions(new_positions)
 
         # Create new positions
-        for index, position in new_positions.iterrows():
-            order_type = position['order_type']
-
-            # Create a new position
-            pos = Position.Position(position['coin_symbol'], order_type, self.time_ticker,
-                                    position['high_boundary'], position['low_boundary'],
-                                    position['capital_to_invest'] + position[Consts.LEVERAGED_CAPITAL],
-                                    self.trailing_strategy, self.fees, position[Consts.LEVERAGED_CAPITAL],
-                                    self.apply_leverage_fees_on_all_capital, self.leverage, self.long_trailing_strategy,
-                                    self.short_trailing_strategy, position['time_predict'],
-                                    self.active_long_investment_strategy, self.active_short_investment_strategy)
+        is_short = (new_positions['order_type'] == Consts.SHORT).values
+
+        # Trailing boundaries and active strategy thresholds of each position, NaN if there is no strategy
+        trailing_high_boundary = np.where(is_short, self.short_trailing_strategy.get('high_boundary', np.nan),
+                                          self.long_trailing_strategy.get('high_boundary', np.nan))
+        trailing_low_boundary = np.where(is_short, self.short_trailing_strategy.get('low_boundary', np.nan),
+                                         self.long_trailing_strategy.get('low_boundary', np.nan))
+        active_max_prob = np.where(is_short, self.active_short_investment_strategy.get('max_prob_positive', np.nan),
+                                   self.active_long_investment_strategy.get('max_prob_negative', np.nan))
+        amount = len(new_positions)
+        rows = self.position_book.open_positions(
+            coins_market_data_getter.price_store.symbols_indexes(new_positions['coin_symbol']), is_short,
+            new_positions['high_boundary'].values, new_positions['low_boundary'].values,
+            (new_positions['capital_to_invest'] + new_positions[Consts.LEVERAGED_CAPITAL]).values,
+            new_positions[Consts.LEVERAGED_CAPITAL].values, new_positions['time_predict'].values,
+            np.full(amount, self.leverage), np.full(amount, bool(self.trailing_strategy)), trailing_high_boundary,
+            trailing_low_boundary, active_max_prob, np.full(amount, bool(self.apply_leverage_fees_on_all_capital)),
+            self.simulation_index)
+        liquid_capital = self.position_book.get_current_liquid_capital()[rows]
+        leverage_capital = self.position_book.leverage_capital[rows]
+
+        for position_is_short, position_liquid_capital, position_leverage_capital in \
+                zip(is_short.tolist(), liquid_capital.tolist(), leverage_capital.tolist()):
 
             # Allocates each order to its relevant statistics
-            if order_type == Consts.SHORT:
-                self.active_short_positions.append(pos)
-                self.short_capital += pos.get_current_liquid_capital()
+            if position_is_short:
+                self.short_capital += position_liquid_capital
             else:
-                self.active_long_positions.append(pos)
-                self.long_capital += pos.get_current_liquid_capital()
+                self.long_capital += position_liquid_capital
 
             # Update portfolio liquid capital and leverage capital
-            self.liquid_capital -= pos.get_current_liquid_capital()
-            self.leverage_capital += pos.leverage_capital
+            self.liquid_capital -= position_liquid_capital
+            self.leverage_capital += position_leverage_capital
 
         logger.debug("Finished investment cycle for time {}".format(
             TimeHelper.epoch_to_date_time(self.time_ticker.current_time)))
@@ -304,132 +303,108 @@ class Portfolio(Stats):
         :return: new_positions df with leverage column accordingly
         """
 
-        for index, coin_data_to_invest in new_positions.copy().iterrows():
-
-            # If long position we check that the prob positive stands in the min prob for leverage condition
-            if coin_data_to_invest['order_type'] == Consts.LONG:
-                if coin_data_to_invest[Consts.PROB_POSITIVE_HEADER] >= self.min_prob_for_leverage:
-                    new_positions.loc[index, Consts.LEVERAGED_CAPITAL] = (coin_data_to_invest[
-                                                                              'capital_to_invest'] * self.leverage) - \
-                                                                         coin_data_to_invest['capital_to_invest']
-
-            # If short position we check that the prob negative stands in the min prob for leverage condition
-            else:
-                if coin_data_to_invest[Consts.PROB_NEGATIVE_HEADER] >= self.min_prob_for_leverage:
-                    new_positions.loc[index, Consts.LEVERAGED_CAPITAL] = (coin_data_to_invest[
-                                                                              'capital_to_invest'] * self.leverage) - \
-                                                                         coin_data_to_invest['capital_to_invest']
+        # Long positions are checked by the prob positive, short positions by the prob negative
+        is_long = (new_positions['order_type'] == Consts.LONG).values
+        prob = np.where(is_long, new_positions[Consts.PROB_POSITIVE_HEADER].values,
+                        new_positions[Consts.PROB_NEGATIVE_HEADER].values)
+        capital_to_invest = new_positions['capital_to_invest'].values
+        new_positions[Consts.LEVERAGED_CAPITAL] = np.where(prob >= self.min_prob_for_leverage,
+                                                           (capital_to_invest * self.leverage) - capital_to_invest, 0)
         return new_positions
 
     @staticmethod
     def calc_invest(prob):
         """
-        Calculation according to literature
+        Calculation according to literature, see Sizing.calc_invest
         :param prob:
         :return:
         """
-        if prob == 1.0:
-            prob = 0.999
-        elif prob == 0.0:
-            prob = 0.001
-
-        signal = (prob - (1.0 / Consts.NUM_OF_CLASSES)) / ((prob * (1.0 - prob)) ** 0.5)
-
-        res = (2 * norm.cdf(signal) - 1)
-
-        return res
+        return float(Sizing.calc_invest(prob))
 
     def percent_capital_according_to_probability(self, prob_pos, prob_neg, order_type):
         """
-        Calculates the percentage of capital to invest.
+        Calculates the percentage of capital to invest, see Sizing.percent_capital_according_to_probability
         :param prob_pos: The probability of the positive output
         :param prob_neg: The probability of the negative output
         :param order_type: short/long
         :return: The percentage of capital to invest out of max_amount_to_invest_in_coin
         """
-        pos = self.calc_invest(prob_pos)
-        neg = self.calc_invest(prob_neg)
-
-        # TODO: CAN BE DONE BETTER
-        if order_type == Consts.LONG:
-            return pos
-            # if neg < neutral:
-            #     return pos
-            # else:
-            #     return pos - abs(neg)
-        else:
-            return neg
-            # if pos < neutral:
-            #     return neg
-            # else:
-            #     return neg - abs(pos)
+        return float(Sizing.percent_capital_according_to_probability(prob_pos, prob_neg, order_type,
+                                                                      self.sizing_table))
 
     def capital_allocation_strategy(self, coins_to_invest, available_capital):
         """
-        Recursive function which allocates funds according to simulation conditions and then allocates capital according to probability and 24h volume
+        Allocates funds according to simulation conditions and then allocates capital according to probability and 24h volume.
+        Every round divides the available capital equally by the positions which are not fully invested, caps each by
+        its volume boundary, scales it by the probability and divides what is left again in the next round, until all
+        positions are fully invested or the share of a position is smaller then min investment.
         :param coins_to_invest:
         :param available_capital:
         :return: coins_to_invest and Adds 'capital_to_invest' column and 'fully_invested' column to each row
         """
-        coins_available_capital = 0
-        used_capital = 0
+        fully_invested = coins_to_invest[Consts.FULLY_INVESTED].values.astype(bool)
+        capital_to_invest = coins_to_invest[Consts.CAPITAL_TO_INVEST].values.astype(np.float64)
+        coins_current_volume = None
+        capital_percent = None
 
-        # Count positions which capital size is not equal to max capacity of investment
-        total_positions_count = len(coins_to_invest[coins_to_invest[Consts.FULLY_INVESTED] == False])
+        while True:
 
-        if total_positions_count > 0:
+            # Count positions which capital size is not equal to max capacity of investment
+            not_fully_invested = np.flatnonzero(~fully_invested)
+            total_positions_count = len(not_fully_invested)
+
+            # Stopping condition: If there are no more position not fully invested or coins_available_capital is smaller then min investment
+            if total_positions_count == 0:
+                break
 
             # Divide all available capital equally by all the positions
             coins_available_capital = available_capital / total_positions_count
-
-        # Stopping condition: If there are no more position not fully invested or coins_available_capital is smaller then min investment
-        if total_positions_count == 0 or coins_available_capital < self.min_investment:
-            return coins_to_invest
-
-        # Iterate all coins to invest which are not fully invested
-        for index, coins_prediction in coins_to_invest[coins_to_invest[Consts.FULLY_INVESTED] == False].copy().iterrows():
-
-            coin_symbol = coins_prediction['coin_symbol']
-
-            success, coin_current_volume = self.fetch_coins_24h_volumeto(coin_symbol)
-
-            # exit if failed to fetch volume
-            if not success:
-                raise Exception
-
-            if coin_current_volume == 0.0:
-                logger.debug("Volume is zero. Not investing in: {}, at time: {}".format(coin_symbol,
-                                                                                        TimeHelper.epoch_to_date_time(
-                                                                                            self.time_ticker.current_time)))
-                coins_to_invest.loc[index, Consts.FULLY_INVESTED] = True
-                continue
+            if coins_available_capital < self.min_investment:
+                break
+
+            # The volume and the risk indicator of a position are the same in every round
+            if coins_current_volume is None:
+                coins_current_volume = np.array([self.fetch_coins_24h_volumeto(coin_symbol)[1]
+                                                 for coin_symbol in coins_to_invest['coin_symbol']], dtype=np.float64)
+                capital_percent = Sizing.percent_capital_according_to_probability(
+                    coins_to_invest[Consts.PROB_POSITIVE_HEADER].values,
+                    coins_to_invest[Consts.PROB_NEGATIVE_HEADER].values, coins_to_invest['order_type'].values,
+                    self.sizing_table)
+
+            coin_current_volume = coins_current_volume[not_fully_invested]
+            zero_volume = coin_current_volume == 0.0
+            for coin_symbol in coins_to_invest['coin_symbol'].values[not_fully_invested[zero_volume]]:
+                logger.debug("Volume is zero. Not investing in: {}, at time: {}".format(
+                    coin_symbol, TimeHelper.epoch_to_date_time(self.time_ticker.current_time)))
 
             # Volume boundary of the specific coin symbol at the specific time
             coins_max_capital_volume_boundary = self.max_percent_out_of_volume * coin_current_volume
 
             # If the volume boundary is smaller then available capital, then there is maximum capital in current position means = fully invested
-            if coins_max_capital_volume_boundary < coins_available_capital:
-                coins_to_invest.loc[index, Consts.FULLY_INVESTED] = True
-                max_amount_to_invest_in_coin = coins_max_capital_volume_boundary
-            else:
-                max_amount_to_invest_in_coin = coins_available_capital
+            reach_volume_boundary = ~zero_volume & (coins_max_capital_volume_boundary < coins_available_capital)
+            max_amount_to_invest_in_coin = np.where(reach_volume_boundary, coins_max_capital_volume_boundary,
+                                                    coins_available_capital)
+            fully_invested[not_fully_invested[zero_volume | reach_volume_boundary]] = True
 
             # Risk indicator which decreases positions size according to probability
-            capital_percent = self.percent_capital_according_to_probability(coins_prediction[Consts.PROB_POSITIVE_HEADER],
-                                                                            coins_prediction[Consts.PROB_NEGATIVE_HEADER],
-                                                                            coins_prediction['order_type'])
-
-            current_capital_to_invest_in_position = capital_percent * max_amount_to_invest_in_coin
+            invested = not_fully_invested[~zero_volume]
+            current_capital_to_invest_in_position = capital_percent[invested] * \
+                max_amount_to_invest_in_coin[~zero_volume]
 
-            # Add to capital to invest for current row
-            coins_to_invest.loc[index, Consts.CAPITAL_TO_INVEST] = coins_to_invest.loc[
-                                                                       index, Consts.CAPITAL_TO_INVEST] + current_capital_to_invest_in_position
+            # Add to capital to invest for current rows
+            capital_to_invest[invested] = capital_to_invest[invested] + current_capital_to_invest_in_position
 
-            used_capital += current_capital_to_invest_in_position
+            # Positions are added one by one, like the capital is used
+            used_capital = np.cumsum(current_capital_to_invest_in_position)[-1] if len(invested) > 0 else 0
+            available_capital -= used_capital
 
-        available_capital -= used_capital
+            # Nothing was used and nothing became fully invested, the next round would be the same
+            if used_capital <= 0 and not (zero_volume | reach_volume_boundary).any():
+                break
 
-        return self.capital_allocation_strategy(coins_to_invest, available_capital)
+        coins_to_invest[Consts.FULLY_INVESTED] = fully_invested
+        coins_to_invest[Consts.CAPITAL_TO_INVEST] = capital_to_invest
+        return coins_to_invest
 
     def fetch_coins_24h_volumeto(self, coin_symbol):
         """
@@ -437,21 +412,12 @@ class Portfolio(Stats):
         :param coin_symbol:
         :return: success, volumeto24h
         """
-        volumeto = 0
-        hours_to_calculate = 25
-        counter = 1
-        while counter <= hours_to_calculate:
-            _time_to_fetch = self.time_ticker.current_time - (counter * 60 * 60)
-            success, coins_market = coins_market_data_getter.get_coin_data(int(_time_to_fetch),
-                                                                           coin_symbol)
-            if not success:
-                logger.error("Skipping coin {}, there is no market data from db in {}".format(coin_symbol,
-                                                                                              TimeHelper.epoch_to_date_time(
-                                                                                                  _time_to_fetch)))
-                raise Exception
+        success, volumeto = coins_market_data_getter.get_coin_volumeto_24h(self.time_ticker.current_time, coin_symbol)
+        if not success:
+            logger.error("Skipping coin {}, there is no market data for the 24h before {}".format(
+                coin_symbol, TimeHelper.epoch_to_date_time(self.time_ticker.current_time)))
+            raise Exception
 
-            volumeto += coins_market['_volumeto']
-            counter += 1
         return True, volumeto
 
     def is_long_according_to_invest_strategy(self, prob_positive, prob_negative):
@@ -470,3 +436,14 @@ class Portfolio(Stats):
         """
         return prob_positive < self.short_investment_strategy['max_prob_positive'] and \
                prob_negative >= self.short_investment_strategy['min_prob_negative']
+
+
+def sequential_sum(values):
+    """
+    Sum in the order of values, one by one (np.sum uses pairwise summation which rounds differently)
+    :param values: np.array
+    :return: float, 0 for no values
+    """
+    if len(values) == 0:
+        return 0
+    return np.cumsum(values)[-1]
@@ -0,0 +1,453 @@
+import heapq
+import logging
+
+import numpy as np
+from Simulation import FirstHit
+from Utilities import Consts, DataHelper, TimeHelper
+
+logger = logging.getLogger("PositionBook")
+
+# Market data with all coins
+coins_market_data_getter = DataHelper.DataHelper()
+
+# First hit results shared by all the position books (simulations) of the process
+first_hit_cache = FirstHit.FirstHitCache(Consts.FIRST_HIT_CACHE_SIZE)
+
+# Parallel arrays of the book, one row per open position
+BOOK_COLUMNS = [
+    ('position_id', np.int64),  # increasing id of the position in the book, rows are sorted by it
+    ('simulation_index', np.int64),  # position of the simulation in a batch of simulations, 0 for a single one
+    ('symbol_index', np.int64),  # offset of the coin in the price store
+    ('is_short', bool),  # position is short or long
+    ('initial_time', np.int64),  # the timestamp the position has been opened
+    ('initial_position_life_time', np.float64),
+    ('position_life_time', np.float64),  # extended by trailing
+    ('positive_target', np.float64),
+    ('negative_target', np.float64),
+    ('initial_capital', np.float64),
+    ('current_capital', np.float64),
+    ('leverage_capital', np.float64),
+    ('leverage', np.float64),
+    ('fees_paid', np.float64),
+    ('buy_price', np.float64),  # the last buy price (the entry price or the price trailing re-armed at)
+    ('last_price', np.float64),
+    ('hours_position_open', np.float64),
+    ('trailing_activated', np.int64),
+    ('resolve_time', np.float64),  # the tick the position reaches a target according to the first hit kernel
+    ('resolve_reason', np.int64),  # the reason of the hit at resolve_time, flags of FirstHit (e.x. FirstHit.JUMP)
+    ('hit_profit_target', bool),
+    ('hit_loss_target', bool),
+    ('expired', bool),
+    ('stopped', bool),
+    ('liquidated', bool),
+    ('trailing', bool),
+    ('trailing_high_boundary', np.float64),  # NaN if there is no trailing strategy for the position side
+    ('trailing_low_boundary', np.float64),
+    ('active_max_prob', np.float64),  # active investment strategy threshold, NaN if there is no active strategy
+    ('apply_leverage_fees_on_all_capital', bool),
+    ('buy_price_history', object),  # list of all buy prices, the entry price first
+]
+
+
+class PositionBook(object):
+    """
+    All open positions of a portfolio (or of a batch of portfolios, see MultiPortfolio) as parallel arrays (struct
+    of arrays), rows are kept in opening order.
+    Every check (liquidation, target, expiry, active strategy) is one vectorized pass over all open positions that
+    marks the positions it closes. Closed rows are taken out of the book with take_closed.
+    Every column is kept in a buffer which doubles its capacity when it is full (like CapitalHistory), the column
+    attributes are views of the open rows, so opening positions does not copy the book.
+    """
+
+    def __init__(self, fees, time_ticker):
+        self.fees = fees
+        self.time_ticker = time_ticker
+        self.position_end_time = None  # time the last closed positions finished
+        self.positions_opened = 0  # the id of the next position
+        self.expiry_schedule = []  # min-heap of (expiry time, position id), entries of closed positions are skipped
+        self.length = 0  # amount of open positions, the first rows of the buffers
+        self.buffers = {column: np.zeros(0, dtype=dtype) for column, dtype in BOOK_COLUMNS}
+        self.__fees_table = None
+        self._set_views()
+
+    def __len__(self):
+        return self.length
+
+    def _set_views(self):
+        """
+        Points every column attribute to the open rows of its buffer
+        :return:
+        """
+        for column, _ in BOOK_COLUMNS:
+            setattr(self, column, self.buffers[column][:self.length])
+
+    def _grow(self, amount):
+        """
+        Makes room for amount new rows, doubling the capacity of the buffers
+        :param amount: amount of rows to add
+        :return:
+        """
+        capacity = len(self.buffers['position_id'])
+        if self.length + amount <= capacity:
+            return
+        capacity = max(self.length + amount, 2 * capacity)
+        for column, dtype in BOOK_COLUMNS:
+            values = np.zeros(capacity, dtype=dtype)
+            values[:self.length] = self.buffers[column][:self.length]
+            self.buffers[column] = values
+
+    @property
+    def fees_table(self):
+        """
+        :return: Fees.FeesTable aligned to the symbols of the price store (the symbol_index column), compiled once
+        """
+        if self.__fees_table is None:
+            self.__fees_table = self.fees.table(coins_market_data_getter.price_store.symbols)
+        return self.__fees_table
+
+    def coin_symbols(self, rows=None):
+        """
+        :param rows: mask or indexes of rows, None for all rows
+        :return: list of coin symbols of the rows
+        """
+        symbols = coins_market_data_getter.price_store.symbols
+        indexes = self.symbol_index if rows is None else self.symbol_index[rows]
+        return [symbols[index] for index in indexes]
+
+    def _fetch_market_data(self, field, rows=None):
+        """
+        :param rows: mask or slice of rows to fetch, None for all rows
+        :return: np.array of field for every open position at current time (NaN for rows not fetched), raises if any
+         is missing
+        """
+        if rows is None:
+            values = coins_market_data_getter.get_many(self.symbol_index, self.time_ticker.current_time, field)
+            missing = np.isnan(values)
+        else:
+            values = np.full(len(self), np.nan)
+            values[rows] = coins_market_data_getter.get_many(self.symbol_index[rows], self.time_ticker.current_time,
+                                                             field)
+            missing = np.zeros(len(self), dtype=bool)
+            missing[rows] = np.isnan(values[rows])
+        if missing.any():
+            coin_symbol = self.coin_symbols(missing)[0]
+            logger.error("No {} for coin {} at time {}".format(field, coin_symbol, self.time_ticker.current_time))
+            raise Exception("No {} for coin {} at time {}".format(field, coin_symbol, self.time_ticker.current_time))
+        return values
+
+    def open_positions(self, symbol_index, is_short, positive_target, negative_target, capital, leverage_capital,
+                       time_predict, leverage, trailing, trailing_high_boundary, trailing_low_boundary,
+                       active_max_prob, apply_leverage_fees_on_all_capital, simulation_index=0):
+        """
+        Enters new positions at the open price of current time and updates capital according to the fees.
+        All params are arrays with one value per new position, simulation_index may also be a single int.
+        :return: slice of the new rows
+        """
+        amount = len(symbol_index)
+        first_row = self.length
+        new_rows = {column: np.zeros(amount, dtype=dtype) for column, dtype in BOOK_COLUMNS}
+        new_rows['simulation_index'][:] = simulation_index
+        new_rows['position_id'][:] = np.arange(self.positions_opened, self.positions_opened + amount)
+        self.positions_opened += amount
+        new_rows.update(symbol_index=symbol_index, is_short=is_short, positive_target=positive_target,
+                        negative_target=negative_target, initial_capital=capital, current_capital=capital,
+                        leverage_capital=leverage_capital, initial_position_life_time=time_predict,
+                        position_life_time=time_predict, leverage=leverage, trailing=trailing,
+                        trailing_high_boundary=trailing_high_boundary, trailing_low_boundary=trailing_low_boundary,
+                        active_max_prob=active_max_prob,
+                        apply_leverage_fees_on_all_capital=apply_leverage_fees_on_all_capital)
+        new_rows['initial_time'][:] = self.time_ticker.current_time
+
+        self._grow(amount)
+        rows = slice(first_row, first_row + amount)
+        for column, _ in BOOK_COLUMNS:
+            self.buffers[column][rows] = new_rows[column]
+        self.length += amount
+        self._set_views()
+
+        open_price = self._fetch_market_data('_open', rows)[rows]
+        self.buy_price[rows] = open_price
+        self.last_price[rows] = open_price
+        for row, price in zip(range(first_row, first_row + amount), open_price.tolist()):
+            self.buy_price_history[row] = [price]
+        self.schedule_targets(np.arange(first_row, first_row + amount))
+        self.schedule_expiry(np.arange(first_row, first_row + amount))
+
+        # Calculate fees
+        fees_table = self.fees_table
+        leverage_fee = np.where(self.leverage[rows] > 1,
+                                fees_table.leverage_buy_fees(self.symbol_index[rows], self.leverage_capital[rows]), 0)
+        capital_taker_fee = fees_table.taker_fees(self.symbol_index[rows], self.current_capital[rows])
+
+        # Update paid fees
+        self.fees_paid[rows] = capital_taker_fee + leverage_fee
+
+        # Update current capital minus takers fee
+        self.current_capital[rows] = self.current_capital[rows] - capital_taker_fee - leverage_fee
+
+        if logger.isEnabledFor(logging.DEBUG):
+            for row in range(first_row, first_row + amount):
+                logger.debug(
+                    "{} position for {} in {} has been created successfully with {} capital which includes {} "
+                    "leverage, with the cost of {} fees".format(
+                        'short' if self.is_short[row] else 'long', self.coin_symbols([row])[0],
+                        TimeHelper.epoch_to_date_time(self.initial_time[row]), self.initial_capital[row],
+                        self.leverage_capital[row], self.fees_paid[row]))
+        return rows
+
+    def updates_new_time_is_liquidate(self, ml_results=None):
+        """
+        Updates capital and hours positions open according to new time
+        :return: mask of liquidated positions
+        """
+        new_price = self._fetch_market_data('_open')
+
+        # If Long then we profit from positive change and if short we profit from negative change
+        current_change = (new_price / self.last_price) - 1
+        current_change = np.where(self.is_short, current_change * (-1), current_change)
+
+        self.current_capital += self.current_capital * current_change
+
+        # Updates last price
+        self.last_price[:] = new_price
+
+        # Updates hours position opened
+        self.hours_position_open += self.time_ticker.hours_tick_time_interval
+
+        # Check if position got liquidated
+        liquidated = self.current_capital <= self.leverage_capital
+        for coin_symbol in self.coin_symbols(liquidated):
+            logger.error("The position with coin symbol: {} got liquidated at {}".format(
+                coin_symbol, TimeHelper.epoch_to_date_time(self.time_ticker.current_time)))
+        self.liquidated |= liquidated
+        self.close_positions(liquidated)
+        return liquidated
+
+    def apply_time_leverage_fees(self):
+        """
+        Checks if its time fo leverage fees and updates positions with leverage stats accordingly
+        :return:
+        """
+        fees_table = self.fees_table
+        is_time_for_fee = (self.leverage > 1) & \
+            fees_table.is_time_for_leverage_fee(self.symbol_index, self.hours_position_open)
+        capital = np.where(self.apply_leverage_fees_on_all_capital, self.current_capital, self.leverage_capital)
+        fees = fees_table.leverage_time_fees(self.symbol_index, capital)
+
+        # Update paid fees and current capital minus fees
+        self.fees_paid[is_time_for_fee] += fees[is_time_for_fee]
+        self.current_capital[is_time_for_fee] -= fees[is_time_for_fee]
+
+    def reach_target_update(self, ml_results=None):
+        """
+        Checks if positions reached target, and updates accordingly.
+        Only positions which the first hit kernel scheduled for current time are checked (see schedule_targets), by
+        the reason of the hit which the kernel found in the high and low prices of current time.
+        :return: mask of positions which reached positive or negative target
+        """
+        due = self.resolve_time <= self.time_ticker.current_time
+        if not due.any():
+            return due
+
+        # Missing high or low prices raise like any missing market data
+        missing_price = due & ((self.resolve_reason & FirstHit.MISSING_PRICE) != 0)
+        if missing_price.any():
+            self._fetch_market_data('_high', missing_price)
+            self._fetch_market_data('_low', missing_price)
+
+        reach_high = due & ((self.resolve_reason & FirstHit.REACH_HIGH) != 0)
+        reach_low = due & ((self.resolve_reason & FirstHit.REACH_LOW) != 0)
+        jump = due & ((self.resolve_reason & FirstHit.JUMP) != 0)
+        for coin_symbol in self.coin_symbols(jump):
+            logger.error("In time {} there was 2 times jump between high and low price for coin {}".format(
+                TimeHelper.epoch_to_date_time(self.time_ticker.current_time), coin_symbol))
+
+        both_targets = ~jump & reach_high & reach_low
+        for coin_symbol in self.coin_symbols(both_targets):
+            logger.error("In time {} the price reached the high and low boundary for coin {}".format(
+                TimeHelper.epoch_to_date_time(self.time_ticker.current_time), coin_symbol))
+
+        undecided = ~jump & ~both_targets
+
+        # If hits target for short or long
+        hit_target = undecided & ((reach_low & self.is_short) | (reach_high & ~self.is_short))
+
+        # If trailing is on, apply
+        trail = hit_target & self.trailing & ~np.isnan(self.trailing_high_boundary)
+        self.handle_trailing(trail)
+
+        profit = hit_target & ~trail
+
+        # if miss target for short or long
+        miss_target = undecided & ~hit_target & ((reach_high & self.is_short) | (reach_low & ~self.is_short))
+
+        loss = jump | both_targets | miss_target
+        self.hit_profit_target |= profit
+        self.hit_loss_target |= loss
+        closed = profit | loss
+        self.close_positions(closed)
+
+        # Trailing positions continue with new targets
+        self.schedule_targets(np.flatnonzero(due & ~closed))
+        return closed
+
+    def schedule_targets(self, rows):
+        """
+        Sets resolve_time of positions, the first tick after current time the position reaches a target (or inf), and
+        resolve_reason, the reason it reaches the target in that tick
+        :param rows: indexes of rows
+        :return:
+        """
+        price_store = coins_market_data_getter.price_store
+        time_index = price_store.time_index(self.time_ticker.current_time)
+        tick_hours = self.time_ticker.hours_tick_time_interval
+        stride = int(tick_hours * 60 * 60 // price_store.seconds_per_step)
+        for row in rows:
+
+            # A target can not be reached after the position expired
+            hours_left = self.position_life_time[row] - self.hours_position_open[row]
+            max_steps = int(hours_left // tick_hours) if hours_left > 0 and hours_left % tick_hours == 0 else None
+
+            steps, self.resolve_reason[row] = first_hit_cache.first_hit(
+                price_store, self.symbol_index[row], time_index, stride, self.buy_price[row],
+                self.positive_target[row], self.negative_target[row], max_steps)
+            self.resolve_time[row] = np.inf if steps < 0 else \
+                self.time_ticker.current_time + steps * tick_hours * 60 * 60
+
+    def handle_trailing(self, trail):
+        """
+        Updates positions according to trailing strategy and resets the buy price
+        :param trail: mask of positions to apply trailing on
+        :return:
+        """
+        if not trail.any():
+            return
+
+        # Reset buy price to current price
+        self.buy_price[trail] = self.last_price[trail]
+        for row in np.flatnonzero(trail):
+            self.buy_price_history[row].append(self.last_price[row])
+
+        # Update that trailing has been applied
+        self.trailing_activated[trail] += 1
+
+        # Extend position life time
+        self.position_life_time[trail] = (self.position_life_time[trail] * 2)
+
+        self.positive_target[trail] = self.trailing_high_boundary[trail]
+        self.negative_target[trail] = self.trailing_low_boundary[trail]
+
+        # The old expiry entries are skipped since the life time changed
+        self.schedule_expiry(np.flatnonzero(trail))
+
+    def schedule_expiry(self, rows):
+        """
+        Adds the time positions expire (hours_position_open == position_life_time) to the expiry schedule.
+        Positions which life time is not a multiple of the tick time never expire.
+        :param rows: indexes of rows
+        :return:
+        """
+        tick_hours = self.time_ticker.hours_tick_time_interval
+        for row in rows:
+            hours_left = self.position_life_time[row] - self.hours_position_open[row]
+            if hours_left > 0 and hours_left % tick_hours == 0:
+                heapq.heappush(self.expiry_schedule, (self.time_ticker.current_time + hours_left * 60 * 60,
+                                                      int(self.position_id[row])))
+
+    def close_positions(self, closed):
+        """
+        Close positions, applies the sell fees
+        :param closed: mask of positions to close
+        :return:
+        """
+        if not closed.any():
+            return
+
+        self.position_end_time = self.time_ticker.current_time
+
+        fees_table = self.fees_table
+        symbol_index = self.symbol_index[closed]
+
+        # Fetch leverage fee if exist
+        leverage_sell_fee = np.where(self.leverage[closed] > 1,
+                                     fees_table.leverage_sell_fees(symbol_index, self.leverage_capital[closed]), 0)
+
+        # Calculate the taker fee
+        taker_capital_sell_fee = fees_table.taker_fees(symbol_index, self.current_capital[closed])
+
+        # Update paid fees
+        self.fees_paid[closed] = self.fees_paid[closed] + leverage_sell_fee + taker_capital_sell_fee
+
+        # Update current capital minus fees
+        self.current_capital[closed] = self.current_capital[closed] - taker_capital_sell_fee - leverage_sell_fee
+
+    def is_expired(self, ml_results=None):
+        """
+        Checks if positions are expired, only the positions which are due in the expiry schedule
+        :return: mask of expired positions
+        """
+        due_positions_ids = []
+        while self.expiry_schedule and self.expiry_schedule[0][0] <= self.time_ticker.current_time:
+            due_positions_ids.append(heapq.heappop(self.expiry_schedule)[1])
+
+        # Skip positions which are closed or which life time was extended since they were scheduled
+        expired = np.zeros(len(self), dtype=bool)
+        if len(due_positions_ids) > 0 and len(self) > 0:
+            due_positions_ids = np.array(due_positions_ids, dtype=np.int64)
+            rows = np.minimum(np.searchsorted(self.position_id, due_positions_ids), len(self) - 1)
+            expired[rows[self.position_id[rows] == due_positions_ids]] = True
+        expired &= self.hours_position_open == self.position_life_time
+        self.expired |= expired
+        self.close_positions(expired)
+        return expired
+
+    def force_close(self, ml_results=None):
+        """
+        Closes all positions, force closed positions are not moved out of the book (they are not part of the
+        positions history)
+        :return: mask of no positions
+        """
+        everything = np.ones(len(self), dtype=bool)
+        self.expired |= everything
+        self.close_positions(everything)
+        return ~everything
+
+    def is_active_invest_strategy(self, ml_results=None):
+        """
+        Checks if positions needs to be closed according to ml results, by the first prediction of every coin
+        :param ml_results: prob_positive, prob_negative of current time, np.arrays indexed by symbol offset
+         (see MLResultsIndex.probabilities_by_symbol)
+        :return: mask of stopped positions
+        """
+        prob_positive, prob_negative = ml_results
+
+        # Long positions are stopped by the negative probability, short positions by the positive probability
+        prob = np.where(self.is_short, prob_positive[self.symbol_index], prob_negative[self.symbol_index])
+        stopped = self.active_max_prob <= prob
+        self.stopped |= stopped
+        self.close_positions(stopped)
+        return stopped
+
+    def get_current_liquid_capital(self):
+        """
+        Returns current liquid capital of every position.
+        :return: np.array
+        """
+        return self.current_capital - self.leverage_capital
+
+    def take_closed(self, closed):
+        """
+        Removes closed positions from the book
+        :param closed: mask of positions to remove
+        :return: dict column -> np.array of the removed rows
+        """
+        closed_rows = {}
+        kept = ~closed
+        amount_kept = int(kept.sum())
+        for column, _ in BOOK_COLUMNS:
+            values = getattr(self, column)
+            closed_rows[column] = values[closed]
+            self.buffers[column][:amount_kept] = values[kept]
+        self.length = amount_kept
+        self._set_views()
+        return closed_rows
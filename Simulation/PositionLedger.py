@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+from Utilities import Consts
+
+# Numeric columns of the positions history
+POSITION_NUMERIC_COLUMNS = ['life_time_in_hours', 'positive_target', 'negative_target',
+                            'initial_capital_include_leverage', 'final_capital', 'last_price', 'hit_profit_target',
+                            'hit_loss_target', 'expired', 'stopped', 'liquidated', 'trailing_activated',
+                            'hours_position_open', 'fees_paid', 'leverage_capital', 'leverage']
+# Flags and counters of a position, written as ints
+POSITION_INT_COLUMNS = ['hit_profit_target', 'hit_loss_target', 'expired', 'stopped', 'liquidated',
+                        'trailing_activated', 'hours_position_open']
+
+
+class PositionLedger(object):
+    """
+    Closed positions recorded into typed, growable columns as they close.
+    The buy price history of every position (the entry price and the price every trailing re-armed at) is kept as an
+    offsets/values pair: the buy prices of row i are buy_price_values[buy_price_offsets[i]:buy_price_offsets[i + 1]].
+    """
+
+    def __init__(self, capacity=64):
+        self.length = 0
+        self.initial_time = np.zeros(capacity, dtype=np.int64)
+        self.end_time = np.zeros(capacity, dtype=np.int64)
+        self.symbol_code = np.zeros(capacity, dtype=np.int64)
+        self.is_short = np.zeros(capacity, dtype=bool)
+        self.numeric = {column: np.zeros(capacity) for column in POSITION_NUMERIC_COLUMNS}
+        self.symbols = []  # symbol code -> coin symbol
+        self.__symbol_to_code = {}
+        self.buy_price_offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self.buy_price_values = np.zeros(capacity)
+
+    def __len__(self):
+        return self.length
+
+    def _reserve(self, amount_of_rows, amount_of_buy_prices):
+        capacity = len(self.initial_time)
+        if self.length + amount_of_rows > capacity:
+            capacity = max(2 * capacity, self.length + amount_of_rows)
+            self.initial_time = np.resize(self.initial_time, capacity)
+            self.end_time = np.resize(self.end_time, capacity)
+            self.symbol_code = np.resize(self.symbol_code, capacity)
+            self.is_short = np.resize(self.is_short, capacity)
+            for column in POSITION_NUMERIC_COLUMNS:
+                self.numeric[column] = np.resize(self.numeric[column], capacity)
+            self.buy_price_offsets = np.resize(self.buy_price_offsets, capacity + 1)
+
+        buy_prices_end = self.buy_price_offsets[self.length] + amount_of_buy_prices
+        if buy_prices_end > len(self.buy_price_values):
+            self.buy_price_values = np.resize(self.buy_price_values, max(2 * len(self.buy_price_values),
+                                                                         buy_prices_end))
+
+    def _symbol_code(self, coin_symbol):
+        if coin_symbol not in self.__symbol_to_code:
+            self.__symbol_to_code[coin_symbol] = len(self.symbols)
+            self.symbols.append(coin_symbol)
+        return self.__symbol_to_code[coin_symbol]
+
+    def record_many(self, closed_rows, coin_symbols, end_time):
+        """
+        Records closed positions of the position book
+        :param closed_rows: dict column -> np.array, as returned by PositionBook.take_closed
+        :param coin_symbols: list of coin symbols of the rows
+        :param end_time: the timestamp the positions have been closed
+        :return:
+        """
+        amount = len(coin_symbols)
+        buy_price_history = closed_rows['buy_price_history']
+        buy_price_lengths = np.array([len(buy_prices) for buy_prices in buy_price_history], dtype=np.int64)
+        self._reserve(amount, int(buy_price_lengths.sum()))
+        rows = slice(self.length, self.length + amount)
+        self.initial_time[rows] = closed_rows['initial_time']
+        self.end_time[rows] = end_time
+        self.symbol_code[rows] = [self._symbol_code(coin_symbol) for coin_symbol in coin_symbols]
+        self.is_short[rows] = closed_rows['is_short']
+        values = {'life_time_in_hours': 'initial_position_life_time', 'positive_target': 'positive_target',
+                  'negative_target': 'negative_target', 'initial_capital_include_leverage': 'initial_capital',
+                  'final_capital': 'current_capital', 'last_price': 'last_price',
+                  'hit_profit_target': 'hit_profit_target', 'hit_loss_target': 'hit_loss_target',
+                  'expired': 'expired', 'stopped': 'stopped', 'liquidated': 'liquidated',
+                  'trailing_activated': 'trailing_activated', 'hours_position_open': 'hours_position_open',
+                  'fees_paid': 'fees_paid', 'leverage_capital': 'leverage_capital', 'leverage': 'leverage'}
+        for column, book_column in values.items():
+            self.numeric[column][rows] = closed_rows[book_column]
+
+        if amount > 0:
+            buy_prices_start = self.buy_price_offsets[self.length]
+            offsets = buy_prices_start + np.cumsum(buy_price_lengths)
+            self.buy_price_values[buy_prices_start:offsets[-1]] = \
+                [price for buy_prices in buy_price_history for price in buy_prices]
+            self.buy_price_offsets[self.length + 1:self.length + amount + 1] = offsets
+        self.length += amount
+
+    def buy_prices(self, row):
+        """
+        :param row: row number in the ledger
+        :return: np.array of the buy prices of the position, the entry price first
+        """
+        return self.buy_price_values[self.buy_price_offsets[row]:self.buy_price_offsets[row + 1]]
+
+    def to_df(self):
+        """
+        Creates the positions history in one step, long positions first then short positions, each in closing order.
+        buy_price is the list of buy prices of the position (the entry price and the prices trailing re-armed at) and
+        entry_price is the first of them.
+        :return: df of positions history, columns sorted by name
+        """
+        length = self.length
+        offsets = self.buy_price_offsets[:length + 1]
+        data = {column: values[:length] for column, values in self.numeric.items()}
+        for column in POSITION_INT_COLUMNS:
+            data[column] = data[column].astype(np.int64)
+        data['initial_time'] = pd.to_datetime(self.initial_time[:length], unit='s')
+        data['end_time'] = pd.to_datetime(self.end_time[:length], unit='s')
+        data['coin_symbol'] = np.array(self.symbols, dtype=object)[self.symbol_code[:length]] if length > 0 \
+            else np.array([], dtype=object)
+        data['order_type'] = np.where(self.is_short[:length], Consts.SHORT, Consts.LONG).astype(object)
+        data['buy_price'] = np.empty(length, dtype=object)
+        for row in range(length):
+            data['buy_price'][row] = self.buy_price_values[offsets[row]:offsets[row + 1]].tolist()
+        data['entry_price'] = self.buy_price_values[offsets[:-1]] if length > 0 else np.zeros(0)
+        data['ROI'] = (data['final_capital'] - data['leverage_capital']) / \
+                      (data['initial_capital_include_leverage'] - data['leverage_capital'])
+
+        positions_history = pd.DataFrame(data=data, columns=sorted(data.keys()))
+        order = np.argsort(self.is_short[:length], kind='mergesort')
+        return positions_history.iloc[order].reset_index(drop=True)
@@ -1,7 +1,9 @@
 import logging
+import numpy as np
 import pandas as pd
 from Analytics import AnalyticsFactory
 from Simulation import Portfolio, TimeTicker
+from Simulation.CapitalHistory import CapitalHistory
 from Utilities import Consts, TimeHelper
 from Utilities.DataHelper import DataHelper
 
@@ -12,22 +14,22 @@ data_helper = DataHelper()
 
 class Simulation:
     def __init__(self,
-                 params):  # params_order = (ml_results_df, df_simulation, tick_time_hours, fees, _current_time, coins_for_benchmark)
-        self.ml_results_df = params[0]  # All ml result for current simulation
+                 params):  # params_order = (ml_results, df_simulation, tick_time_hours, fees, _current_time, coins_for_benchmark, duplicates, result_cache, benchmarks)
+        self.ml_results = params[0]  # All ml result for current simulation, bucketed by prediction time
         self.df_simulation = params[1]  # Params for simulation
         self.coins_to_invest = self.df_simulation['coins_to_invest_in'].iloc[
             0]  # Coin to invest in - if Consts.ALL then invest in all coins in mlresults
+        self.ml_results_to_invest = self.ml_results.for_coins(self.coins_to_invest)  # ml results of coins_to_invest
         self.tick_time_hours = params[2]  # The time to tick for simulation in hours
         self.fees = params[3]  # The fees class which includes individual fees and default fees
-        self.capital_history = pd.DataFrame(
-            data={'date_time': [], 'liquid_capital': [], 'shorts_capital': [], 'long_capital': [],
-                  'leverage_capital': [], 'fees_paid': [], 'miss_positions': [], 'hit_positions': [],
-                  'stopped_positions': [], 'expired_positions': [], 'hit_trail_positions': [],
-                  'total_number_of_active_positions': [], 'hours_with_no_predictions': []
-                  })  # Will be updated after every tick
+        self.capital_history = None  # Will be initiated at the run function, updated after every tick
         self.start_running_time = params[4]  # The start of the running time
         self.time_ticker = None  # Will be initiated at the run function as a class
         self.coins_for_benchmark = params[5]  # The requested benchmarks
+        self.duplicates = params[6] if len(params) > 6 else {}  # simulation id -> df of its equivalent simulations
+        self.result_cache = params[7] if len(params) > 7 else None  # ResultCache to store the results, None if disabled
+        self.benchmarks = params[8] if len(params) > 8 else None  # Benchmarks shared by all simulations of the run
+        self.results = None  # Will be set at the end of the run function, list of results (with the analytics)
         self.hours_with_no_predictions = 0
 
         # start running simulation
@@ -57,13 +59,24 @@ class Simulation:
 
         # Create a time ticker for simulation
         self.time_ticker = TimeTicker.TimeTicker(start_timestamp, self.tick_time_hours)
+        self.capital_history = CapitalHistory.for_interval(start_timestamp, end_timestamp, self.tick_time_hours)
 
         # Initial Portfolio
         active_portfolio = Portfolio.Portfolio(self.df_simulation, self.fees, self.time_ticker)
 
+        # Ticks with predictions, the simulation jumps over the ticks between them while there are no open positions
+        ticks_with_predictions = self.ml_results.ticks_with_predictions(start_timestamp, self.tick_time_hours)
+        ticks_to_invest = self.ml_results_to_invest.ticks_with_predictions(start_timestamp, self.tick_time_hours)
+
         # Loop according to tick time, while there are still positions open or while there are still MLResults left to iterate
         while self.time_ticker.current_time < end_timestamp:
 
+            # Without open positions nothing changes until the next ml results to invest in
+            if not active_portfolio.is_there_open_positions() and \
+                    self.ml_results_to_invest.count(self.time_ticker.current_time) == 0:
+                self.skip_idle_ticks(active_portfolio, ticks_with_predictions, ticks_to_invest, end_timestamp)
+                continue
+
             # Update portfolio according to new time for next round
             active_portfolio.updater(Consts.UPDATES_NEW_TIME_IS_LIQUIDATE)
 
@@ -75,40 +88,37 @@ class Simulation:
                 active_portfolio.updater(Consts.REACH_TARGET_UPDATE)
                 active_portfolio.updater(Consts.IS_EXPIRED)
 
-            # Fetch ml results for
-            current_ml_results = self.ml_results_df.loc[
-                self.ml_results_df['prediction_time'] == self.time_ticker.current_time]
-
-            if len(current_ml_results) == 0:
+            if self.ml_results.count(self.time_ticker.current_time) == 0:
                 self.hours_with_no_predictions += 1
 
-            # Filter according to coin_to_invest
-            if self.coins_to_invest[0] != Consts.ALL:
-                current_ml_results = current_ml_results.loc[
-                    self.ml_results_df['coin_symbol'].isin(self.coins_to_invest)]
+            # Fetch ml results for current time, filtered according to coin_to_invest
+            current_ml_results = self.ml_results_to_invest.get(self.time_ticker.current_time)
 
             # If there is MLResult in current time
             if len(current_ml_results) > 0:
-                active_portfolio.updater(Consts.IS_ACTIVE_INVEST_STRATEGY, ml_results=current_ml_results)
+
+                # Probabilities of every coin for the active investment strategy of all open positions
+                probabilities = self.ml_results.probabilities_by_symbol(self.time_ticker.current_time,
+                                                                        data_helper.price_store.symbols_indexes,
+                                                                        len(data_helper.price_store.symbols))
+                active_portfolio.updater(Consts.IS_ACTIVE_INVEST_STRATEGY, ml_results=probabilities)
                 active_portfolio.enter_new_positions(current_ml_results)
 
             # Update capital history
-            self.capital_history = self.capital_history.append(pd.DataFrame(
-                data={'date_time': [TimeHelper.epoch_to_date_time(self.time_ticker.current_time)],
-                      'liquid_capital': [active_portfolio.liquid_capital],
-                      'shorts_capital': [active_portfolio.short_capital],
-                      'long_capital': [active_portfolio.long_capital],
-                      'leverage_capital': [active_portfolio.leverage_capital],
-                      'fees_paid': [active_portfolio.fees_paid],
-                      'miss_positions': [active_portfolio.miss_positions],
-                      'hit_positions': [active_portfolio.hit_positions],
-                      'stopped_positions': [active_portfolio.stopped_positions_counter],
-                      'expired_positions': [active_portfolio.expired_positions_counter],
-                      'hit_trail_positions': [active_portfolio.hit_trail_positions],
-                      'hours_with_no_predictions': [self.hours_with_no_predictions],
-                      'total_number_of_active_positions': [
-                          len(active_portfolio.active_long_positions + active_portfolio.active_short_positions)]
-                      }), ignore_index=True, sort=True)
+            self.capital_history.append(
+                self.time_ticker.current_time,
+                liquid_capital=active_portfolio.liquid_capital,
+                shorts_capital=active_portfolio.short_capital,
+                long_capital=active_portfolio.long_capital,
+                leverage_capital=active_portfolio.leverage_capital,
+                fees_paid=active_portfolio.fees_paid,
+                miss_positions=active_portfolio.miss_positions,
+                hit_positions=active_portfolio.hit_positions,
+                stopped_positions=active_portfolio.stopped_positions_counter,
+                expired_positions=active_portfolio.expired_positions_counter,
+                hit_trail_positions=active_portfolio.hit_trail_positions,
+                hours_with_no_predictions=self.hours_with_no_predictions,
+                total_number_of_active_positions=len(active_portfolio.position_book))
 
             # Advance current_timestamp
             self.time_ticker.advance_one_step()
@@ -120,19 +130,57 @@ class Simulation:
 
         logger.info('Creating analytics file for simulation ID: {}'.format(self.df_simulation.index[0]))
         positions_history = self.fetch_positions_history_df(active_portfolio)
-        AnalyticsFactory.start(self.start_running_time, self.coins_for_benchmark, self.df_simulation, positions_history,
-                               self.capital_history)
+        capital_history = self.capital_history.to_df()
+        if self.result_cache is not None:
+            self.result_cache.put(self.df_simulation, positions_history, capital_history)
+        self.results = AnalyticsFactory.start(self.start_running_time, self.coins_for_benchmark, self.df_simulation,
+                                              positions_history, capital_history,
+                                              self.duplicates.get(self.df_simulation.index[0]), self.benchmarks)
 
         logger.info('end of simulation ID: {}'.format(self.df_simulation.index[0]))
         # TODO: send to analytics factory and the write posion_history,capital history and and stats
 
+    def skip_idle_ticks(self, active_portfolio, ticks_with_predictions, ticks_to_invest, end_timestamp):
+        """
+        Advances the time ticker to the next tick with ml results to invest in (or to the end) and fills the capital
+        history of the skipped ticks, the portfolio has no open positions so only hours_with_no_predictions changes.
+        :param active_portfolio: Portfolio without open positions
+        :param ticks_with_predictions: sorted np.array of the ticks with ml results
+        :param ticks_to_invest: sorted np.array of the ticks with ml results of coins_to_invest
+        :param end_timestamp:
+        :return:
+        """
+        amount_of_ticks = self.time_ticker.idle_steps(ticks_to_invest, end_timestamp)
+        date_times = self.time_ticker.current_time + \
+            np.arange(amount_of_ticks) * (self.tick_time_hours * 60 * 60)
+        hours_with_no_predictions = self.hours_with_no_predictions + \
+            np.cumsum(~np.isin(date_times, ticks_with_predictions))
+        self.hours_with_no_predictions = int(hours_with_no_predictions[-1])
+
+        self.capital_history.extend(
+            date_times,
+            liquid_capital=active_portfolio.liquid_capital,
+            shorts_capital=0,
+            long_capital=0,
+            leverage_capital=active_portfolio.leverage_capital,
+            fees_paid=active_portfolio.fees_paid,
+            miss_positions=active_portfolio.miss_positions,
+            hit_positions=active_portfolio.hit_positions,
+            stopped_positions=active_portfolio.stopped_positions_counter,
+            expired_positions=active_portfolio.expired_positions_counter,
+            hit_trail_positions=active_portfolio.hit_trail_positions,
+            hours_with_no_predictions=hours_with_no_predictions,
+            total_number_of_active_positions=0)
+
+        self.time_ticker.advance_steps(amount_of_ticks)
+
     def simulation_time_interval(self):
         """
-        according to ml_results_df oldest and latest date
+        according to ml_results oldest and latest date
         :return: start_timestamp, end_timestamp
         """
 
-        return self.ml_results_df['prediction_time'].min(), self.ml_results_df['prediction_time'].max()
+        return self.ml_results.start_time, self.ml_results.end_time
 
     def fetch_positions_history_df(self, active_portfolio):
         """
@@ -140,31 +188,7 @@ class Simulation:
         :param active_portfolio:
         :return: df of positions histroy
         """
-
-        positions_history = pd.DataFrame(
-            data={'initial_time': [], 'end_time': [], 'coin_symbol': [], 'order_type': [], 'life_time_in_hours': [],
-                  'positive_target': [], 'negative_target': [],
-                  'initial_capital_include_leverage': [], 'final_capital': [], 'buy_price': [], 'last_price': [],
-                  'hit_profit_target': [],
-                  'hit_loss_target': [], 'expired': [], 'stopped': [], 'liquidated': [],
-                  'trailing_activated': [], 'hours_position_open': [], 'fees_paid': [], 'leverage_capital': [],
-                  'leverage': [], 'ROI': []})
-        for pos in active_portfolio.closed_long_positions + active_portfolio.closed_short_positions:
-            positions_history = positions_history.append(pd.DataFrame(
-                data={'initial_time': [TimeHelper.epoch_to_date_time(pos.initial_time)],
-                      'end_time': [TimeHelper.epoch_to_date_time(pos.position_end_time)],
-                      'coin_symbol': [pos.coin_symbol],
-                      'order_type': [pos.order_type], 'life_time_in_hours': [pos.initial_position_life_time],
-                      'positive_target': [pos.positive_target], 'negative_target': [pos.negative_target],
-                      'initial_capital_include_leverage': [pos.initial_capital], 'final_capital': [pos.current_capital],
-                      'buy_price': [pos.buy_price],
-                      'last_price': [pos.last_price],
-                      'hit_profit_target': [pos.hit_profit_target], 'hit_loss_target': [pos.hit_loss_target],
-                      'expired': [pos.expired], 'stopped': [pos.stopped], 'liquidated': [pos.liquidated],
-                      'trailing_activated': [pos.trailing_activated], 'hours_position_open': [pos.hours_position_open],
-                      'fees_paid': [pos.fees_paid], 'leverage_capital': [pos.leverage_capital],
-                      'leverage': [pos.leverage], 'ROI': [pos.get_roi_status()]}), ignore_index=True, sort=True)
-        return positions_history
+        return active_portfolio.positions_ledger.to_df()
 
     def calculate_benchmark(self, field_date_time, coin_benchamrk, first_value_price, amountOfCapital):
         """
@@ -0,0 +1,77 @@
+import numpy as np
+from scipy.special import ndtr
+from Utilities import Consts
+
+_sizing_tables = {}  # steps -> SizingTable
+
+
+def calc_invest(prob):
+    """
+    Calculation according to literature, vectorized
+    :param prob: np.array of probabilities
+    :return: np.array of the percentage of capital to invest for every probability
+    """
+    prob = np.asarray(prob, dtype=np.float64)
+    prob = np.where(prob == 1.0, 0.999, np.where(prob == 0.0, 0.001, prob))
+
+    # float_power keeps the rounding of the scalar prob ** 0.5 (power and sqrt may differ in the last bit)
+    signal = (prob - (1.0 / Consts.NUM_OF_CLASSES)) / np.float_power(prob * (1.0 - prob), 0.5)
+
+    # ndtr is the standard normal cdf (the one scipy.stats.norm.cdf calls)
+    return 2 * ndtr(signal) - 1
+
+
+class SizingTable(object):
+    """
+    calc_invest precomputed for the probabilities on a grid (0, 1 / steps, ..., 1).
+    Probabilities on the grid are looked up, all other probabilities are calculated, so the result is always the
+    same as calc_invest.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.values = calc_invest(np.arange(steps + 1) / steps)
+
+    def calc_invest(self, prob):
+        """
+        :param prob: np.array of probabilities
+        :return: np.array of the percentage of capital to invest for every probability
+        """
+        prob = np.asarray(prob, dtype=np.float64)
+        index = np.rint(prob * self.steps)
+        on_grid = (index >= 0) & (index <= self.steps) & (index / self.steps == prob)
+        result = np.empty(prob.shape)
+        result[on_grid] = self.values[index[on_grid].astype(np.int64)]
+        result[~on_grid] = calc_invest(prob[~on_grid])
+        return result
+
+
+def sizing_table(steps=None):
+    """
+    :param steps: grid steps, None for Consts.SIZING_TABLE_STEPS
+    :return: SizingTable built once per steps, None if there is no grid
+    """
+    if steps is None:
+        steps = Consts.SIZING_TABLE_STEPS
+    if steps is None:
+        return None
+    if steps not in _sizing_tables:
+        _sizing_tables[steps] = SizingTable(steps)
+    return _sizing_tables[steps]
+
+
+def percent_capital_according_to_probability(prob_positive, prob_negative, order_type, table=None):
+    """
+    Calculates the percentage of capital to invest of every position.
+    :param prob_positive: np.array of the probability of the positive output
+    :param prob_negative: np.array of the probability of the negative output
+    :param order_type: np.array of short/long
+    :param table: SizingTable, None calculates every probability
+    :return: np.array of the percentage of capital to invest out of max_amount_to_invest_in_coin
+    """
+    size = calc_invest if table is None else table.calc_invest
+    pos = size(prob_positive)
+    neg = size(prob_negative)
+
+    # TODO: CAN BE DONE BETTER (e.x. long: pos - abs(neg) if neg is not neutral, short: neg - abs(pos))
+    return np.where(np.asarray(order_type) == Consts.LONG, pos, neg)
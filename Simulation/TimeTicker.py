@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 from Utilities import TimeHelper
 
 logger = logging.getLogger("TimeTicker")
@@ -15,4 +16,24 @@ class TimeTicker:
         :return:
         """
         self.current_time += (self.hours_tick_time_interval * 60 * 60)
-        logger.debug("Simulation has advance to time {}".format(TimeHelper.epoch_to_date_time(self.current_time)))
\ No newline at end of file
+        logger.debug("Simulation has advance to time {}".format(TimeHelper.epoch_to_date_time(self.current_time)))
+
+    def advance_steps(self, amount_of_steps):
+        """
+        Advances current time by amount_of_steps tick time intervals
+        :return:
+        """
+        self.current_time += amount_of_steps * (self.hours_tick_time_interval * 60 * 60)
+        logger.debug("Simulation has advance to time {}".format(TimeHelper.epoch_to_date_time(self.current_time)))
+
+    def idle_steps(self, ticks_with_events, end_time):
+        """
+        Amount of steps until the next tick with an event
+        :param ticks_with_events: sorted np.array of tick times
+        :param end_time: the time ticking stops (not including)
+        :return: amount of ticks from current time (including) until the next tick in ticks_with_events or end_time
+        """
+        position = np.searchsorted(ticks_with_events, self.current_time)
+        next_time = ticks_with_events[position] if position < len(ticks_with_events) else end_time
+        tick_seconds = self.hours_tick_time_interval * 60 * 60
+        return int(np.ceil((min(next_time, end_time) - self.current_time) / float(tick_seconds)))
\ No newline at end of file
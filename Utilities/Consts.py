@@ -27,6 +27,8 @@ LONG = 'long'
 SHORT = 'short'
 ALL = 'All'
 NUM_OF_CLASSES = 3
+FIRST_HIT_CACHE_SIZE = 100000  # results of the first hit kernel kept per process, 0 disables the cache
+SIZING_TABLE_STEPS = None  # e.x. 1000 precomputes the position size of the probabilities 0, 0.001, ..., 1
 FULLY_INVESTED = 'fully_invested'
 CAPITAL_TO_INVEST = 'capital_to_invest'
 LEVERAGED_CAPITAL = 'leveraged_capital'
@@ -36,6 +38,7 @@ COIN_SYMBOL = 'coin_symbol'
 TIME_COLUMN_PREDICTION = 'prediction_time'
 TIME_COLUMN_PRICE = 'ptime'
 COINS_CANDLE_STICK_HEADERS = {'ptime', 'coin_symbol', '_close', '_high', '_low', '_open', '_volumeto'}
+COINS_CANDLE_STICK_FIELDS = ['_open', '_high', '_low', '_close', '_volumeto']
 
 # ------------------ Updaters ------------------ #
 REACH_TARGET_UPDATE = 'reach_target_update'
@@ -55,10 +58,53 @@ ML_RESULT_LONG_PATH = 'MLResultsLongs/'
 ML_RESULT_SHORT_PATH = 'MLResultsShorts/'
 PATH_TO_WRITE_RESULT = "/opt/simulation"
 PATH_TO_WRITE_PARTIAL_RESULT = "/tmp/"
+PRICE_CACHE_PATH = None  # None keeps the cache next to the coins price file
+PRICE_CACHE_SUFFIX = '.cache'
+USE_PRICE_CACHE = True
+RESULT_CACHE_PATH = None  # None disables the simulation results cache
+RESULT_CACHE_MAX_SIZE_MB = 1024  # disk budget of the simulation results cache
+RESULT_STORE_CSV = 'csv'  # result files in a directory per simulation
+RESULT_STORE_PARQUET = 'parquet'  # results of all simulations in a single columnar store, requires pyarrow
+RESULT_STORE_FORMATS = [RESULT_STORE_CSV, RESULT_STORE_PARQUET]
+RESULT_STORE_FORMAT = RESULT_STORE_CSV
+OUTPUT_LEVEL_SUMMARY = 'summary'  # only the analytics summary
+OUTPUT_LEVEL_CAPITAL = 'capital'  # the summary, the params and the capital history of every simulation
+OUTPUT_LEVEL_FULL = 'full'  # the summary, the params, the capital history and the positions of every simulation
+OUTPUT_LEVELS = [OUTPUT_LEVEL_SUMMARY, OUTPUT_LEVEL_CAPITAL, OUTPUT_LEVEL_FULL]
+OUTPUT_LEVEL = OUTPUT_LEVEL_FULL
+RETAIN_TOP_AMOUNT = None  # None writes the details of all simulations, otherwise only of the top simulations
+RETAIN_TOP_METRICS = ['ACC_ROI', 'alpha', 'beta', 'rsquared', 'sharp_ratio', 'standard_deviation']
+RETAIN_TOP_METRIC = 'ACC_ROI'  # the analytics column which ranks the simulations
 os.makedirs(ML_RESULT_LONG_PATH, exist_ok=True)
 os.makedirs(ML_RESULT_SHORT_PATH, exist_ok=True)
 
 
 def set_path_to_write_result(result_path):
     global PATH_TO_WRITE_RESULT
-    PATH_TO_WRITE_RESULT = os.path.join(result_path, 'simulation')
\ No newline at end of file
+    PATH_TO_WRITE_RESULT = os.path.join(result_path, 'simulation')
+
+
+def set_price_cache(cache_path, use_cache=True):
+    global PRICE_CACHE_PATH, USE_PRICE_CACHE
+    PRICE_CACHE_PATH = cache_path
+    USE_PRICE_CACHE = use_cache
+
+
+def set_result_cache(cache_path, max_size_mb=None):
+    global RESULT_CACHE_PATH, RESULT_CACHE_MAX_SIZE_MB
+    RESULT_CACHE_PATH = cache_path
+    if max_size_mb is not None:
+        RESULT_CACHE_MAX_SIZE_MB = max_size_mb
+
+
+def set_result_store(result_store_format):
+    global RESULT_STORE_FORMAT
+    RESULT_STORE_FORMAT = result_store_format
+
+
+def set_output_level(output_level, retain_top_amount=None, retain_top_metric=None):
+    global OUTPUT_LEVEL, RETAIN_TOP_AMOUNT, RETAIN_TOP_METRIC
+    OUTPUT_LEVEL = output_level
+    RETAIN_TOP_AMOUNT = retain_top_amount
+    if retain_top_metric is not None:
+        RETAIN_TOP_METRIC = retain_top_metric
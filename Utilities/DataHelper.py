@@ -1,59 +1,107 @@
 import logging
+import os
 
-import pandas as pd
-from Utilities import Consts
+from Utilities import PriceCache
+from Utilities import SharedArrays
 from Utilities import TimeHelper
+from Utilities.PriceStore import PriceStore
 
 logger = logging.getLogger("DataGetter")
 
+VOLUMETO_HOURS_TO_CALCULATE = 25  # The "24h" volume is aggregated over the last 25 candles
+VOLUMETO_24H_FILE_NAME = 'volumeto_24h.npy'
+
 
 class DataHelper(object):
 
     class __DataHelper:
         def __init__(self):
-            self.__df = None
-
-        def init_data(self, symbols_list, path_to_data_file, start_date, end_date, compression='gzip'):
-            df_data = pd.read_csv(path_to_data_file, compression=compression)
-            diff_col = Consts.COINS_CANDLE_STICK_HEADERS - set(df_data.columns)
-            if len(diff_col) > 0:
-                logger.error("There are missing columns in candle stick info, headers: {}".format(diff_col))
-                quit(1)
+            self.__store = None  # type: PriceStore
+            self.__volumeto_24h = None  # rolling volumeto sum per (symbol, hour)
 
-            df_data.set_index([Consts.COIN_SYMBOL, Consts.TIME_COLUMN_PRICE], inplace=True)
+        @property
+        def price_store(self):
+            if self.__store is None:
+                raise Exception('Please call init_data before using the price store')
+            return self.__store
 
+        def init_data(self, symbols_list, path_to_data_file, start_date, end_date, compression='gzip'):
             # Leaving only coins that are going to be predict
-            idx = pd.IndexSlice
-            self.__df = df_data.loc[idx[symbols_list, :]]  # type: pd.DataFrame
+            try:
+                self.__store = PriceCache.load_price_store(path_to_data_file, compression).select(symbols_list)
+            except KeyError as e:
+                logger.error("Missing coins in the coins price file {}, error: {}".format(path_to_data_file, e))
+                quit(1)
+            self.__volumeto_24h = self.__store.trailing_sum('_volumeto', VOLUMETO_HOURS_TO_CALCULATE)
 
-            for coin_symbol, df_group in self.__df.reset_index().groupby(Consts.COIN_SYMBOL):
-                min_time, max_time = df_group[Consts.TIME_COLUMN_PRICE].min(), df_group[Consts.TIME_COLUMN_PRICE].max()
+            for coin_symbol, min_time, max_time in zip(self.__store.symbols, self.__store.first_times,
+                                                       self.__store.last_times):
                 if min_time > start_date or max_time < end_date:
                     logger.error("Missing data for coin {} (in data: min time {}, max time {}, "
                                  "in predictions: min time {}, max time {})"
                                  .format(coin_symbol, min_time, max_time, start_date, end_date))
                     quit(1)
 
+        def share(self, path):
+            """
+            Moves the price store into memory-mapped files in path, so processes that attach (or fork) read the
+            same pages instead of holding their own copy.
+            :param path: directory, e.x. from SharedArrays.create_shared_dir
+            :return:
+            """
+            self.price_store.save(path)
+            SharedArrays.share_array(os.path.join(path, VOLUMETO_24H_FILE_NAME), self.__volumeto_24h)
+            self.attach(path)
+
+        def attach(self, path):
+            """
+            Uses the price store shared by share, read-only
+            :param path: directory passed to share
+            :return:
+            """
+            self.__store = PriceStore.load(path, mmap_mode='r')
+            self.__volumeto_24h = SharedArrays.attach_array(os.path.join(path, VOLUMETO_24H_FILE_NAME))
+
         def get_coin_data(self, ptime, symbol):
             """
-            coin data from redis by ptime and symbol
+            coin data by ptime and symbol, compatibility wrapper on top of the price store
             :param ptime:string
             :param symbol:
-            :return:
+            :return: success, {field: value}
             """
-            if self.__df is None:
-                raise Exception('Please call init_data before using get_coin_data')
-
-            try:
-                return True, self.__df.loc[symbol, ptime]
-            except KeyError as e:
-                logger.warning("(KeyError) There is no {} for {} (human date {}), error: {}"
-                               .format(symbol, ptime, TimeHelper.epoch_to_date_time(ptime), e))
-                return False, []
-            except TypeError as e2:
-                logger.warning("(TypeError) There is no {} for {} (human date {}), error: {}"
-                               .format(symbol, ptime, TimeHelper.epoch_to_date_time(ptime), e2))
+            row = self.price_store.get(symbol, ptime)
+            if row is None:
+                logger.warning("There is no {} for {} (human date {})"
+                               .format(symbol, ptime, TimeHelper.epoch_to_date_time(ptime)))
                 return False, []
+            return True, dict(zip(self.__store.fields, row.tolist()))
+
+        def get_coin_volumeto_24h(self, ptime, symbol):
+            """
+            Aggregated volumeto of the 25 hours before ptime, precomputed in init_data
+            :param ptime: epoch timestamp
+            :param symbol: coin symbol
+            :return: success, volumeto24h
+            """
+            store = self.price_store
+            symbol_index = store.symbol_index(symbol)
+            time_index = store.time_index(ptime)
+            if symbol_index < 0 or time_index < 0:
+                return False, 0
+            volumeto = self.__volumeto_24h[symbol_index, time_index]
+            if volumeto != volumeto:
+                return False, 0
+            return True, volumeto
+
+        def get_many(self, symbols, times, fields=None):
+            """
+            Vectorized coin data, see PriceStore.get_many
+            :param symbols: array like of coin symbols or symbol offsets
+            :param times: array like of epoch timestamps
+            :param fields: a single field name, a list of field names or None for all fields
+            :return: np.array, NaN where there is no data
+            """
+            return self.price_store.get_many(symbols, times, fields)
 
     instance = None
 
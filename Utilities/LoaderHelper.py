@@ -6,6 +6,7 @@ from Utilities import Consts
 from Utilities.SimulationParams import SimulationParamsOptions
 import itertools
 from Utilities.DataHelper import DataHelper
+from Utilities.MLResultsIndex import MLResultsIndex
 from Utilities import TimeHelper
 
 _data_helper = DataHelper()
@@ -27,30 +28,158 @@ def load_ml_results(path, order_type):
     return all_MLResult_df
 
 
-def load_simulation_params():
+# Params which have no effect on a simulation, according to the value of another param
+PARAMS_IGNORED_WITHOUT_LEVERAGE = ['min_prob_for_leverage', 'apply_leverage_fees_on_all_capital']
+PARAMS_IGNORED_WITHOUT_SHORTS = ['short_investment_strategy', 'short_trailing_strategy',
+                                 'active_short_investment_strategy']
+PARAMS_IGNORED_WITHOUT_LONGS = ['long_investment_strategy', 'long_trailing_strategy',
+                                'active_long_investment_strategy']
+
+
+def simulation_params_options():
     """
     Loads Utilities/SimulationParams
-     get all params from simulation params file.
-    and create dataframe with all the combinations that can be.
-    :return:
+    :return: list of (param name, list of param values) in the order of the grid, params without values are skipped
     """
     temp_obj = SimulationParamsOptions()
-    list_of_params = []
-    simulations_params_names = []
+    options = []
     for att in dir(temp_obj):
         if att[:2] == '__':
             continue
         param_value = getattr(temp_obj, att)
         if len(param_value) == 0:
             continue
-        simulations_params_names.append(att.lower())
-        list_of_params.append(param_value)
+        options.append((att.lower(), param_value))
+    return options
+
+
+def simulation_params_grid_size(options=None):
+    """
+    :param options: from simulation_params_options, None loads them
+    :return: amount of simulations in the grid (simulation ids are 0 ... size - 1)
+    """
+    if options is None:
+        options = simulation_params_options()
+    size = 1
+    for _, param_values in options:
+        size *= len(param_values)
+    return size
 
-    data = list(itertools.product(*list_of_params))
-    all_simulation_options_df = pd.DataFrame.from_records(data, columns=simulations_params_names)
+
+def load_simulation_params():
+    """
+    Loads Utilities/SimulationParams
+     get all params from simulation params file.
+    and create dataframe with all the combinations that can be.
+    Notice, the whole grid is kept in memory, for big grids use iter_simulation_params
+    :return:
+    """
+    options = simulation_params_options()
+    all_simulation_options_df = pd.DataFrame.from_records(itertools.product(*[values for _, values in options]),
+                                                          columns=[name for name, _ in options])
     return all_simulation_options_df
 
 
+def iter_simulation_params(options=None):
+    """
+    Generates the grid of simulation params one simulation at a time, in the same order (and ids) as
+    load_simulation_params
+    :param options: from simulation_params_options, None loads them
+    :return: generator of (simulation id, {param name: value})
+    """
+    if options is None:
+        options = simulation_params_options()
+    names = [name for name, _ in options]
+    for simulation_id, values in enumerate(itertools.product(*[values for _, values in options])):
+        yield simulation_id, dict(zip(names, values))
+
+
+def ignored_simulation_params(params):
+    """
+    :param params: {param name: value} of a simulation
+    :return: list of the param names which have no effect on the simulation
+    """
+    ignored = []
+    if params.get('leverage', 1) <= 1:
+        ignored += PARAMS_IGNORED_WITHOUT_LEVERAGE
+    if not params.get('shorts', True):
+        ignored += PARAMS_IGNORED_WITHOUT_SHORTS
+    if not params.get('longs', True):
+        ignored += PARAMS_IGNORED_WITHOUT_LONGS
+    return [name for name in ignored if name in params]
+
+
+def canonical_simulation_params(params):
+    """
+    Equivalent simulations (which differ only by ignored params) have the same canonical params
+    :param params: {param name: value} of a simulation
+    :return: copy of params where the ignored params are None
+    """
+    canonical = dict(params)
+    for name in ignored_simulation_params(params):
+        canonical[name] = None
+    return canonical
+
+
+def iter_distinct_simulation_params(options=None):
+    """
+    Generates the grid of simulation params like iter_simulation_params, but only the first simulation of every group
+    of equivalent simulations (see canonical_simulation_params), together with the other simulations of the group.
+    The groups are derived from the positions in the grid, so nothing but the current simulation is kept in memory.
+    :param options: from simulation_params_options, None loads them
+    :return: generator of (simulation id, {param name: value}, [(simulation id, {param name: value}), ...])
+    """
+    if options is None:
+        options = simulation_params_options()
+    names = [name for name, _ in options]
+    sizes = [len(values) for _, values in options]
+
+    # The id of a simulation is its position in the grid, the last param changes the fastest
+    strides = [1] * len(sizes)
+    for position in range(len(sizes) - 2, -1, -1):
+        strides[position] = strides[position + 1] * sizes[position + 1]
+
+    for simulation_id, values_positions in enumerate(itertools.product(*[range(size) for size in sizes])):
+        params = {name: options[position][1][value_position]
+                  for position, (name, value_position) in enumerate(zip(names, values_positions))}
+        ignored_positions = [names.index(name) for name in ignored_simulation_params(params)]
+
+        # Only the first simulation of the group runs
+        if any(values_positions[position] != 0 for position in ignored_positions):
+            continue
+
+        duplicates = []
+        for ignored_values_positions in itertools.product(*[range(sizes[position]) for position in ignored_positions]):
+            if not any(ignored_values_positions):
+                continue
+            duplicate_id = simulation_id
+            duplicate_params = dict(params)
+            for position, value_position in zip(ignored_positions, ignored_values_positions):
+                duplicate_id += value_position * strides[position]
+                duplicate_params[names[position]] = options[position][1][value_position]
+            duplicates.append((duplicate_id, duplicate_params))
+
+        yield simulation_id, params, duplicates
+
+
+def simulation_params_frame(simulations, options=None):
+    """
+    Creates the params dataframe of some simulations of the grid, the same as their rows in load_simulation_params
+    after convert_dfs_int_to_float
+    :param simulations: list of (simulation id, {param name: value})
+    :param options: from simulation_params_options, None loads them
+    :return: df with index as simulation_id
+    """
+    if options is None:
+        options = simulation_params_options()
+    df_simulations = pd.DataFrame.from_records([params for _, params in simulations],
+                                               columns=[name for name, _ in options],
+                                               index=[simulation_id for simulation_id, _ in simulations])
+    convert_dfs_int_to_float([df_simulations])
+    df_simulations.index.names = ['index']
+    return df_simulations
+
+
 def get_list_coins_unique(df1, df2):
     new_df = pd.concat([df1.coin_symbol, df2.coin_symbol], ignore_index=True, sort=True)
     return list(set(new_df))
@@ -67,16 +196,13 @@ def convert_dfs_int_to_float(array_of_df):
     for _df in array_of_df:
         for column in _df:
             if _df[column].dtype == int:
-                _df[column] = _df[column].apply(pd.to_numeric(float))
+                _df[column] = _df[column].astype(float)
 
 
-def fetch_simulations(benchmark_symbols_list, path_to_data_file):
+def load_ml_results_and_init_data(benchmark_symbols_list, path_to_data_file):
     """
-    init coins data to redis
-    Creates 3 dataframe 1.MLResult. 2.all simulation params options. 3. fees
-    a data frame with index as simulation_id and the following columns:
-    [amount_of_capital, max_percante_cap_invested_in_a_round, max_percentage_out_of_volume,
-    :return: params, ml_results, prices
+    init coins data of the benchmarks and of the ML results coins
+    :return: df of the ML results of longs and shorts, prediction_time as epoch
     """
     # benchmark_symbols_list, can be list in a list so this how i'm init all coins data to redis
     list_coins_to_init = []
@@ -91,14 +217,38 @@ def fetch_simulations(benchmark_symbols_list, path_to_data_file):
 
     ml_results['prediction_time'] = pd.to_datetime(ml_results['prediction_time'], format=Consts.READ_DATE_FORMAT).apply(
         lambda x: TimeHelper.datetime_to_epoch(x))
-    simulations_options_df = load_simulation_params()
 
     _data_helper.init_data(list(set(list_coins_to_init).union(set(ml_results.coin_symbol))), path_to_data_file,
                            ml_results['prediction_time'].min(), ml_results['prediction_time'].max())
 
-    convert_dfs_int_to_float([ml_results, simulations_options_df])
+    convert_dfs_int_to_float([ml_results])
+    return ml_results
+
+
+def fetch_simulations(benchmark_symbols_list, path_to_data_file):
+    """
+    init coins data to redis
+    Creates 3 dataframe 1.MLResult. 2.all simulation params options. 3. fees
+    a data frame with index as simulation_id and the following columns:
+    [amount_of_capital, max_percante_cap_invested_in_a_round, max_percentage_out_of_volume,
+    Notice, the whole grid of simulation params is kept in memory, for big grids use fetch_simulations_index
+    :return: params, ml_results, prices
+    """
+    ml_results = load_ml_results_and_init_data(benchmark_symbols_list, path_to_data_file)
+    simulations_options_df = load_simulation_params()
+    convert_dfs_int_to_float([simulations_options_df])
     return [ml_results, simulations_options_df]
 
 
+def fetch_simulations_index(benchmark_symbols_list, path_to_data_file):
+    """
+    Same as fetch_simulations, but the ML results are bucketed by prediction time and the simulation params are not
+    materialized, iterate them with iter_distinct_simulation_params(options)
+    :return: ml_results bucketed by prediction time (MLResultsIndex), simulation params options
+    """
+    ml_results = load_ml_results_and_init_data(benchmark_symbols_list, path_to_data_file)
+    return [MLResultsIndex.from_frame(ml_results), simulation_params_options()]
+
+
 if __name__ == '__main__':
     pass
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+from Utilities import Consts
+from Utilities import SharedArrays
+
+INDEX_ARRAY_NAME = '__index__'
+TIMES_ARRAY_NAME = '__times__'
+OFFSETS_ARRAY_NAME = '__offsets__'
+
+
+class MLResultsIndex(object):
+    """
+    ML results bucketed by prediction time: the results are sorted by prediction time (keeping the original order
+    inside a prediction time) and every prediction time points to its [start, end) rows, so fetching the predictions
+    of a tick costs O(predictions in that tick) instead of a scan over all the predictions.
+    The results are kept as a numpy array per column (string columns as codes + categories), so they can be shared
+    between processes with share and attach without a copy per process.
+    """
+
+    def __init__(self, columns, categories, index, times=None, offsets=None):
+        """
+        Use from_frame or attach
+        :param columns: list of (column name, np.array), sorted by prediction time
+        :param categories: {column name: np.array of the categories} of the columns which are codes, the code -1 is
+         a missing value
+        :param index: np.array of the row labels
+        :param times: sorted unique prediction times, computed if None
+        :param offsets: np.array, the rows of times[i] are [offsets[i], offsets[i + 1]), computed if None
+        """
+        self.column_names = [name for name, _ in columns]
+        self.columns = dict(columns)
+        self.categories = {name: np.append(np.asarray(values, dtype=object), None)
+                           for name, values in categories.items()}
+        self.index = index
+        if times is None:
+            prediction_times = self.columns[Consts.TIME_COLUMN_PREDICTION]
+            times, starts = np.unique(prediction_times, return_index=True)
+            offsets = np.append(starts, len(prediction_times))
+        self.times = times  # sorted unique prediction times
+        self.offsets = offsets
+        self.__universes = {}  # coins to invest in -> MLResultsIndex of their predictions
+
+    @classmethod
+    def from_frame(cls, ml_results_df):
+        """
+        :param ml_results_df: df of the ML results, sorted by prediction time once here if it is not sorted
+        :return: MLResultsIndex
+        """
+        prediction_times = ml_results_df[Consts.TIME_COLUMN_PREDICTION].values
+        if (np.diff(prediction_times) < 0).any():
+            ml_results_df = ml_results_df.sort_values(Consts.TIME_COLUMN_PREDICTION, kind='mergesort')
+
+        columns, categories = [], {}
+        for column in ml_results_df.columns:
+            values = ml_results_df[column].values
+            if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+                values, column_categories = pd.factorize(ml_results_df[column])
+                categories[column] = column_categories.values
+            columns.append((column, values))
+        return cls(columns, categories, ml_results_df.index.values)
+
+    def share(self, path):
+        """
+        Writes the ML results as memory-mapped files into path, see attach
+        :param path: directory
+        :return:
+        """
+        SharedArrays.share_arrays(path, [(name, self.columns[name]) for name in self.column_names] +
+                                  [(INDEX_ARRAY_NAME, self.index), (TIMES_ARRAY_NAME, self.times),
+                                   (OFFSETS_ARRAY_NAME, self.offsets)],
+                                  {'column_names': self.column_names,
+                                   'categories': {name: values[:-1].tolist()
+                                                  for name, values in self.categories.items()}})
+
+    @classmethod
+    def attach(cls, path):
+        """
+        Uses the ML results shared by share, read-only and without copies (already sorted and bucketed)
+        :param path: directory passed to share
+        :return: MLResultsIndex
+        """
+        arrays, metadata = SharedArrays.attach_arrays(path)
+        return cls([(name, arrays[name]) for name in metadata['column_names']], metadata['categories'],
+                   arrays[INDEX_ARRAY_NAME], arrays[TIMES_ARRAY_NAME], arrays[OFFSETS_ARRAY_NAME])
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def start_time(self):
+        return self.times[0]
+
+    @property
+    def end_time(self):
+        return self.times[-1]
+
+    def _bucket(self, prediction_time):
+        """
+        :return: start, end rows of prediction_time (start == end if there are no predictions)
+        """
+        position = np.searchsorted(self.times, prediction_time)
+        if position == len(self.times) or self.times[position] != prediction_time:
+            return 0, 0
+        return self.offsets[position], self.offsets[position + 1]
+
+    def _values(self, column, rows):
+        """
+        :return: np.array of the values of column in rows (a slice or an array of rows), codes are decoded
+        """
+        values = self.columns[column][rows]
+        if column in self.categories:
+            return self.categories[column][values]
+        return np.array(values)
+
+    def count(self, prediction_time):
+        """
+        :return: amount of predictions at prediction_time
+        """
+        start, end = self._bucket(prediction_time)
+        return end - start
+
+    def get(self, prediction_time):
+        """
+        :return: df (a new frame) of the predictions at prediction_time, empty if there are none
+        """
+        start, end = self._bucket(prediction_time)
+        rows = slice(start, end)
+        return pd.DataFrame({column: self._values(column, rows) for column in self.column_names},
+                            index=np.array(self.index[rows]), columns=self.column_names)
+
+    def ticks_with_predictions(self, start_time, tick_time_hours):
+        """
+        :param start_time: epoch timestamp of the first tick
+        :param tick_time_hours: the time between ticks
+        :return: sorted np.array of the prediction times which are ticks (start_time + k * tick_time_hours)
+        """
+        tick_seconds = tick_time_hours * 60 * 60
+        times = self.times[self.times >= start_time]
+        return times[(times - start_time) % tick_seconds == 0]
+
+    def probabilities_by_symbol(self, prediction_time, symbols_indexes, amount_of_symbols):
+        """
+        The probabilities of the first prediction of every coin at prediction_time, as arrays indexed by symbol offset
+        :param prediction_time: epoch timestamp
+        :param symbols_indexes: function coin symbols -> np.array of symbol offsets (-1 for unknown symbols),
+         e.x. PriceStore.symbols_indexes
+        :param amount_of_symbols: length of the arrays
+        :return: prob_positive, prob_negative np.arrays, NaN for coins without a prediction
+        """
+        prob_positive = np.full(amount_of_symbols, np.nan)
+        prob_negative = np.full(amount_of_symbols, np.nan)
+        start, end = self._bucket(prediction_time)
+        if end > start:
+            symbol_codes, first_rows = np.unique(self.columns[Consts.COIN_SYMBOL][start:end], return_index=True)
+            indexes = symbols_indexes(self.categories[Consts.COIN_SYMBOL][symbol_codes])
+            known = indexes >= 0
+            rows = start + first_rows[known]
+            prob_positive[indexes[known]] = self.columns[Consts.PROB_POSITIVE_HEADER][rows]
+            prob_negative[indexes[known]] = self.columns[Consts.PROB_NEGATIVE_HEADER][rows]
+        return prob_positive, prob_negative
+
+    def for_coins(self, coins_to_invest):
+        """
+        Index of the predictions of a coin universe, built once per universe
+        :param coins_to_invest: list of coin symbols, [Consts.ALL] for all coins
+        :return: MLResultsIndex
+        """
+        if coins_to_invest[0] == Consts.ALL:
+            return self
+        key = tuple(sorted(coins_to_invest))
+        if key not in self.__universes:
+            symbol_categories = self.categories[Consts.COIN_SYMBOL][:-1]
+            codes = np.flatnonzero(np.isin(symbol_categories, list(coins_to_invest)))
+            rows = np.isin(self.columns[Consts.COIN_SYMBOL], codes)
+            self.__universes[key] = MLResultsIndex(
+                [(name, self.columns[name][rows]) for name in self.column_names],
+                {name: values[:-1] for name, values in self.categories.items()}, self.index[rows])
+        return self.__universes[key]
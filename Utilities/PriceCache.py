@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import pandas as pd
+from Utilities import Consts
+from Utilities.PriceStore import PriceStore
+
+logger = logging.getLogger("PriceCache")
+
+CACHE_VERSION = 1  # Bump when the on-disk layout of the price store changes
+MANIFEST_FILE_NAME = 'manifest.json'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_path(path_to_data_file):
+    """
+    :param path_to_data_file: path to the coins price file
+    :return: the cache directory, Consts.PRICE_CACHE_PATH if set, otherwise next to the coins price file
+    """
+    if Consts.PRICE_CACHE_PATH is not None:
+        return os.path.join(Consts.PRICE_CACHE_PATH, os.path.basename(path_to_data_file) + Consts.PRICE_CACHE_SUFFIX)
+    return path_to_data_file + Consts.PRICE_CACHE_SUFFIX
+
+
+def file_content_hash(path):
+    """
+    :param path: file path
+    :return: sha1 hex digest of the file content
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def file_fingerprint(path, content_hash=None):
+    """
+    :param path: file path
+    :param content_hash: the content hash if it is already known
+    :return: {size, mtime, content_hash}
+    """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+            'content_hash': content_hash if content_hash is not None else file_content_hash(path)}
+
+
+def price_file_content_hash(path_to_data_file, cache_path=None):
+    """
+    The content hash of the coins price file, taken from the price cache manifest when the cache is valid so the file
+    is not read again
+    :param path_to_data_file: path to the coins price file
+    :param cache_path: cache directory, default see default_cache_path
+    :return: sha1 hex digest of the file content
+    """
+    if Consts.USE_PRICE_CACHE:
+        if cache_path is None:
+            cache_path = default_cache_path(path_to_data_file)
+        if is_cache_valid(cache_path, path_to_data_file):
+            return _read_manifest(cache_path)['fingerprint']['content_hash']
+    return file_content_hash(path_to_data_file)
+
+
+def _read_manifest(cache_path):
+    try:
+        with open(os.path.join(cache_path, MANIFEST_FILE_NAME), 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write_manifest(cache_path, fingerprint):
+    with open(os.path.join(cache_path, MANIFEST_FILE_NAME), 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'fingerprint': fingerprint}, f)
+
+
+def is_cache_valid(cache_path, path_to_data_file):
+    """
+    Size and mtime are checked first, the content hash is computed only when they changed (e.x. the file was copied
+    or touched), in that case the manifest is updated so the next run is fast again.
+    :return: Boolean
+    """
+    manifest = _read_manifest(cache_path)
+    if manifest is None or manifest.get('version') != CACHE_VERSION:
+        return False
+
+    cached_fingerprint = manifest['fingerprint']
+    stat = os.stat(path_to_data_file)
+    if stat.st_size != cached_fingerprint['size']:
+        return False
+    if stat.st_mtime_ns == cached_fingerprint['mtime']:
+        return True
+
+    fingerprint = file_fingerprint(path_to_data_file)
+    if fingerprint['content_hash'] != cached_fingerprint['content_hash']:
+        return False
+    try:
+        _write_manifest(cache_path, fingerprint)
+    except (IOError, OSError) as e:
+        logger.warning("Failed to update price cache manifest {}, error: {}".format(cache_path, e))
+    return True
+
+
+def read_price_file(path_to_data_file, compression='gzip'):
+    """
+    Parses the coins price file into a price store with all the coins in the file
+    :return: PriceStore
+    """
+    df_data = pd.read_csv(path_to_data_file, compression=compression)
+    diff_col = Consts.COINS_CANDLE_STICK_HEADERS - set(df_data.columns)
+    if len(diff_col) > 0:
+        logger.error("There are missing columns in candle stick info, headers: {}".format(diff_col))
+        quit(1)
+    return PriceStore.from_frame(df_data)
+
+
+def build_cache(cache_path, path_to_data_file, compression='gzip'):
+    """
+    Converts the coins price file into a memory-mappable price store in cache_path
+    :return: PriceStore
+    """
+    fingerprint = file_fingerprint(path_to_data_file)
+    store = read_price_file(path_to_data_file, compression)
+
+    # The manifest is written last, a cache without manifest is never used
+    shutil.rmtree(cache_path, ignore_errors=True)
+    try:
+        store.save(cache_path)
+        _write_manifest(cache_path, fingerprint)
+    except (IOError, OSError) as e:
+        logger.warning("Failed to write price cache {}, error: {}".format(cache_path, e))
+        shutil.rmtree(cache_path, ignore_errors=True)
+    return store
+
+
+def load_price_store(path_to_data_file, compression='gzip', cache_path=None):
+    """
+    Loads the coins price file through the cache, the cache is (re)built when it is missing or the file changed
+    :param path_to_data_file: path to the coins price file
+    :param compression: compression of the coins price file
+    :param cache_path: cache directory, default see default_cache_path
+    :return: PriceStore, memory-mapped when loaded from the cache
+    """
+    if not Consts.USE_PRICE_CACHE:
+        return read_price_file(path_to_data_file, compression)
+
+    if cache_path is None:
+        cache_path = default_cache_path(path_to_data_file)
+
+    if is_cache_valid(cache_path, path_to_data_file):
+        logger.info("Loading coins prices from cache {}".format(cache_path))
+        return PriceStore.load(cache_path)
+
+    logger.info("Building coins prices cache {} from {}".format(cache_path, path_to_data_file))
+    return build_cache(cache_path, path_to_data_file, compression)
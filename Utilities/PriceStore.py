@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+
+import numpy as np
+from Utilities import Consts
+
+logger = logging.getLogger("PriceStore")
+
+SECONDS_IN_HOUR = 60 * 60
+VALUES_FILE_NAME = 'values.npy'
+FIRST_TIMES_FILE_NAME = 'first_times.npy'
+LAST_TIMES_FILE_NAME = 'last_times.npy'
+METADATA_FILE_NAME = 'metadata.json'
+
+
+class PriceStore(object):
+    """
+    Dense (symbol x hour x field) float array of the candle stick information.
+    Symbols and times are translated to integer offsets so every lookup is O(1), missing candles are NaN.
+    """
+
+    def __init__(self, symbols, start_time, values, first_times, last_times, fields=Consts.COINS_CANDLE_STICK_FIELDS,
+                 seconds_per_step=SECONDS_IN_HOUR):
+        self.symbols = list(symbols)
+        self.symbol_to_index = {symbol: index for index, symbol in enumerate(self.symbols)}
+        self.fields = list(fields)
+        self.field_to_index = {field: index for index, field in enumerate(self.fields)}
+        self.start_time = int(start_time)  # ptime of the first hour in the array
+        self.seconds_per_step = int(seconds_per_step)
+        self.values = values  # np.array shape (len(symbols), amount of hours, len(fields))
+        self.first_times = first_times  # per symbol, the first ptime that exists in the data
+        self.last_times = last_times  # per symbol, the last ptime that exists in the data
+
+    @property
+    def amount_of_steps(self):
+        return self.values.shape[1]
+
+    @classmethod
+    def from_frame(cls, df_data, symbols_list=None, fields=Consts.COINS_CANDLE_STICK_FIELDS):
+        """
+        Compiles a candle stick dataframe (columns ptime, coin_symbol and fields) into a price store
+        :param df_data: df with Consts.COINS_CANDLE_STICK_HEADERS columns
+        :param symbols_list: keep only those symbols, None keeps all symbols in df_data
+        :param fields: the fields to keep in the array
+        :return: PriceStore
+        """
+        if symbols_list is not None:
+            df_data = df_data[df_data[Consts.COIN_SYMBOL].isin(symbols_list)]
+
+        symbols = sorted(df_data[Consts.COIN_SYMBOL].unique().tolist())
+        ptimes = df_data[Consts.TIME_COLUMN_PRICE].values.astype(np.int64)
+        if len(ptimes) == 0:
+            return cls(symbols, 0, np.full((0, 0, len(fields)), np.nan), np.zeros(0, dtype=np.int64),
+                       np.zeros(0, dtype=np.int64), fields)
+
+        start_time = int(ptimes.min())
+        offsets = ptimes - start_time
+        on_grid = offsets % SECONDS_IN_HOUR == 0
+        if not on_grid.all():
+            logger.warning("Ignoring {} candle sticks which are not on an hourly grid".format(int((~on_grid).sum())))
+
+        symbol_to_index = {symbol: index for index, symbol in enumerate(symbols)}
+        symbol_indexes = df_data[Consts.COIN_SYMBOL].map(symbol_to_index).values[on_grid].astype(np.int64)
+        time_indexes = offsets[on_grid] // SECONDS_IN_HOUR
+        ptimes = ptimes[on_grid]
+
+        values = np.full((len(symbols), int(time_indexes.max()) + 1, len(fields)), np.nan)
+        values[symbol_indexes, time_indexes, :] = df_data[list(fields)].values[on_grid].astype(np.float64)
+
+        first_times = np.full(len(symbols), np.iinfo(np.int64).max, dtype=np.int64)
+        last_times = np.full(len(symbols), np.iinfo(np.int64).min, dtype=np.int64)
+        np.minimum.at(first_times, symbol_indexes, ptimes)
+        np.maximum.at(last_times, symbol_indexes, ptimes)
+
+        return cls(symbols, start_time, values, first_times, last_times, fields)
+
+    def symbol_index(self, symbol):
+        """
+        :param symbol: coin symbol
+        :return: int offset of the symbol, -1 if symbol does not exist
+        """
+        return self.symbol_to_index.get(symbol, -1)
+
+    def time_index(self, ptime):
+        """
+        :param ptime: epoch timestamp
+        :return: int offset of the time, -1 if the time is out of the array or not on the grid
+        """
+        offset = ptime - self.start_time
+        index = int(offset // self.seconds_per_step)
+        if index < 0 or index >= self.amount_of_steps or offset != index * self.seconds_per_step:
+            return -1
+        return index
+
+    def symbols_indexes(self, symbols):
+        """
+        :param symbols: iterable of coin symbols
+        :return: np.array of symbol offsets, -1 where the symbol does not exist
+        """
+        return np.array([self.symbol_to_index.get(symbol, -1) for symbol in symbols], dtype=np.int64)
+
+    def times_indexes(self, times):
+        """
+        Vectorized time_index
+        :param times: array like of epoch timestamps
+        :return: np.array of time offsets, -1 where the time is out of the array or not on the grid
+        """
+        offsets = np.asarray(times, dtype=np.float64) - self.start_time
+        indexes = np.floor_divide(offsets, self.seconds_per_step)
+        valid = (indexes >= 0) & (indexes < self.amount_of_steps) & (offsets == indexes * self.seconds_per_step)
+        return np.where(valid, indexes, -1).astype(np.int64)
+
+    def get(self, symbol, ptime):
+        """
+        :param symbol: coin symbol
+        :param ptime: epoch timestamp
+        :return: np.array of all fields for symbol at ptime, None if there is no data
+        """
+        symbol_index = self.symbol_index(symbol)
+        time_index = self.time_index(ptime)
+        if symbol_index < 0 or time_index < 0:
+            return None
+        row = self.values[symbol_index, time_index]
+        if np.isnan(row).all():
+            return None
+        return row
+
+    def trailing_sum(self, field, window):
+        """
+        Sum of field over the previous window steps, for every symbol and every step.
+        The window of step i is [i - window, i - 1], summed from the most recent step backwards.
+        :param field: field name
+        :param window: amount of steps to sum
+        :return: np.array shape (len(symbols), amount of hours), NaN where any step in the window is missing
+        """
+        field_values = self.values[:, :, self.field_to_index[field]]
+        sums = np.full(field_values.shape, np.nan)
+        if field_values.shape[1] <= window:
+            return sums
+
+        # Accumulating step by step keeps the same summation order as adding the candles one by one
+        window_sums = np.zeros((field_values.shape[0], field_values.shape[1] - window))
+        for counter in range(1, window + 1):
+            window_sums += field_values[:, window - counter:field_values.shape[1] - counter]
+        sums[:, window:] = window_sums
+        return sums
+
+    def get_many(self, symbols, times, fields=None):
+        """
+        Vectorized lookup, symbols and times are broadcast against each other.
+        :param symbols: array like of coin symbols or symbol offsets (ints)
+        :param times: array like of epoch timestamps
+        :param fields: a single field name, a list of field names or None for all fields
+        :return: np.array of shape broadcast(symbols, times) (+ (len(fields),) if fields is a list), NaN where missing
+        """
+        symbols = np.asarray(symbols)
+        if symbols.dtype.kind not in 'iu':
+            symbols = self.symbols_indexes(symbols.ravel()).reshape(symbols.shape)
+        times_indexes = self.times_indexes(times)
+        symbols, times_indexes = np.broadcast_arrays(symbols, times_indexes)
+
+        if fields is None:
+            fields_indexes = slice(None)
+        elif isinstance(fields, str):
+            fields_indexes = self.field_to_index[fields]
+        else:
+            fields_indexes = [self.field_to_index[field] for field in fields]
+
+        valid = (symbols >= 0) & (times_indexes >= 0)
+        result = self.values[np.where(valid, symbols, 0), np.where(valid, times_indexes, 0)][..., fields_indexes]
+        if not valid.all():
+            result = np.array(result, dtype=np.float64)
+            result[~valid] = np.nan
+        return result
+
+    def select(self, symbols_list):
+        """
+        :param symbols_list: symbols to keep, all of them must exist
+        :return: PriceStore with only the requested symbols (self if nothing is removed)
+        """
+        symbols_to_keep = set(symbols_list)
+        missing_symbols = symbols_to_keep - set(self.symbols)
+        if len(missing_symbols) > 0:
+            raise KeyError("Symbols are not in the price store: {}".format(sorted(missing_symbols)))
+        symbols = [symbol for symbol in self.symbols if symbol in symbols_to_keep]
+        if symbols == self.symbols:
+            return self
+        indexes = self.symbols_indexes(symbols)
+        return PriceStore(symbols, self.start_time, self.values[indexes], self.first_times[indexes],
+                          self.last_times[indexes], self.fields, self.seconds_per_step)
+
+    def save(self, path):
+        """
+        Writes the arrays as .npy files (so they can be memory-mapped) and the metadata as json into path
+        :param path: directory
+        :return:
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, VALUES_FILE_NAME), self.values)
+        np.save(os.path.join(path, FIRST_TIMES_FILE_NAME), self.first_times)
+        np.save(os.path.join(path, LAST_TIMES_FILE_NAME), self.last_times)
+        with open(os.path.join(path, METADATA_FILE_NAME), 'w') as f:
+            json.dump({'symbols': self.symbols, 'fields': self.fields, 'start_time': self.start_time,
+                       'seconds_per_step': self.seconds_per_step}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Opens a price store written by save
+        :param path: directory
+        :param mmap_mode: passed to np.load, 'r' maps the values read-only instead of reading them into memory
+        :return: PriceStore
+        """
+        with open(os.path.join(path, METADATA_FILE_NAME), 'r') as f:
+            metadata = json.load(f)
+        return cls(metadata['symbols'], metadata['start_time'],
+                   np.load(os.path.join(path, VALUES_FILE_NAME), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, FIRST_TIMES_FILE_NAME)),
+                   np.load(os.path.join(path, LAST_TIMES_FILE_NAME)),
+                   metadata['fields'], metadata['seconds_per_step'])
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from Utilities import Consts, PriceCache
+from Utilities.LoaderHelper import canonical_simulation_params
+
+logger = logging.getLogger("ResultCache")
+
+CACHE_VERSION = 2  # Bump when the layout of an entry changes, old entries are never read again
+POSITIONS_FILE_NAME = 'positions.pkl'
+CAPITAL_HISTORY_FILE_NAME = 'capital_history.pkl'
+SOURCE_PACKAGES = ['Simulation', 'Fees', 'Utilities']  # the code which produces the results of a simulation
+
+
+def source_fingerprint():
+    """
+    Hash of the source code of SOURCE_PACKAGES, so entries written by another version of the simulation code are
+    never read
+    :return: sha1 hex digest
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sha1 = hashlib.sha1()
+    for package in SOURCE_PACKAGES:
+        for file_name in sorted(os.listdir(os.path.join(root, package))):
+            if file_name.endswith('.py'):
+                sha1.update('{}/{}:{}'.format(package, file_name, PriceCache.file_content_hash(
+                    os.path.join(root, package, file_name))).encode())
+    return sha1.hexdigest()
+
+
+def data_fingerprint(path_to_data_file, tick_time_hours):
+    """
+    Hash of all the inputs of the simulations except their params: the coins price file, the ML results files, the
+    individual fees file, the tick and the simulation code (see source_fingerprint)
+    :param path_to_data_file: path to the coins price file
+    :param tick_time_hours:
+    :return: sha1 hex digest
+    """
+    sha1 = hashlib.sha1()
+    sha1.update('version:{} tick:{}'.format(CACHE_VERSION, tick_time_hours).encode())
+    sha1.update('source:{}'.format(source_fingerprint()).encode())
+    sha1.update('prices:{}'.format(PriceCache.price_file_content_hash(path_to_data_file)).encode())
+    for ml_results_path in [Consts.ML_RESULT_LONG_PATH, Consts.ML_RESULT_SHORT_PATH]:
+        for file_name in sorted(os.listdir(ml_results_path)):
+            sha1.update('{}{}:{}'.format(ml_results_path, file_name, PriceCache.file_content_hash(
+                os.path.join(ml_results_path, file_name))).encode())
+    fees_file = Consts.FEES_FILE_PATH + Consts.FEES_FILE_NAME
+    sha1.update('fees:{}'.format(PriceCache.file_content_hash(fees_file) if os.path.isfile(fees_file) else '').encode())
+    return sha1.hexdigest()
+
+
+def _normalize(value):
+    """
+    The same param has the same value whether it comes from the params grid or from a params dataframe
+    (e.x. 1 and 1.0, True and np.bool_(True))
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    if isinstance(value, dict):
+        return {str(key): _normalize(value[key]) for key in value}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+class ResultCache(object):
+    """
+    Content addressed cache of simulation results on disk, an entry is the positions history and the capital history
+    of a simulation (the analytics are created from them, so benchmarks can change without running again).
+    The key of an entry is the hash of the data fingerprint and the canonical params of the simulation, so
+    equivalent simulations share an entry.
+    """
+
+    def __init__(self, cache_path, fingerprint):
+        self.cache_path = cache_path
+        self.fingerprint = fingerprint
+        os.makedirs(self.cache_path, exist_ok=True)
+
+    def key(self, params):
+        """
+        :param params: {param name: value} of a simulation
+        :return: sha1 hex digest
+        """
+        canonical_params = _normalize(canonical_simulation_params(params))
+        return hashlib.sha1('{}:{}'.format(self.fingerprint, json.dumps(canonical_params, sort_keys=True,
+                                                                         default=str)).encode()).hexdigest()
+
+    def get(self, params):
+        """
+        :param params: {param name: value} of a simulation
+        :return: (positions history df, capital history df), None if the simulation is not in the cache
+        """
+        path = os.path.join(self.cache_path, self.key(params))
+        if not os.path.isdir(path):
+            return None
+        try:
+            positions_history = pd.read_pickle(os.path.join(path, POSITIONS_FILE_NAME))
+            capital_history = pd.read_pickle(os.path.join(path, CAPITAL_HISTORY_FILE_NAME))
+        except Exception as e:
+            # Any entry which can not be read (corrupted, or pickled by other versions of the libraries) is removed
+            logger.warning("Failed to read result cache entry {}, removing it, error: {}".format(path, e))
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+
+        # Recently used entries are evicted last
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return positions_history, capital_history
+
+    def put(self, df_simulation, positions_history, capital_history):
+        """
+        :param df_simulation: a single row of simulation params
+        :param positions_history: df
+        :param capital_history: df, as sent to AnalyticsFactory.start
+        :return:
+        """
+        path = os.path.join(self.cache_path, self.key(df_simulation.iloc[0].to_dict()))
+        if os.path.isdir(path):
+            return
+
+        # The entry is written aside and renamed into place, a partial entry is never read
+        temp_path = None
+        try:
+            temp_path = tempfile.mkdtemp(prefix='.entry_', dir=self.cache_path)
+            positions_history.to_pickle(os.path.join(temp_path, POSITIONS_FILE_NAME))
+            capital_history.to_pickle(os.path.join(temp_path, CAPITAL_HISTORY_FILE_NAME))
+            os.rename(temp_path, path)
+        except (IOError, OSError) as e:
+            logger.warning("Failed to write result cache entry {}, error: {}".format(path, e))
+            if temp_path is not None:
+                shutil.rmtree(temp_path, ignore_errors=True)
+
+    def evict(self, max_size_mb):
+        """
+        Removes the least recently used entries until the cache is within max_size_mb
+        :param max_size_mb: disk budget of the cache in MB
+        :return: amount of removed entries
+        """
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.cache_path):
+            if not entry.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            entries.append((entry.stat().st_mtime, size, entry.path))
+            total_size += size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_size <= max_size_mb * 1024 * 1024:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+            removed += 1
+
+        if removed > 0:
+            logger.info("Removed {} entries from result cache {}, size {:.1f} MB".format(
+                removed, self.cache_path, total_size / 1024.0 / 1024.0))
+        return removed
@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger("SharedArrays")
+
+ARRAYS_METADATA_FILE_NAME = 'arrays.json'
+
+
+def default_shared_data_path():
+    """
+    :return: /dev/shm when available (memory backed), otherwise the temp directory
+    """
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def create_shared_dir(prefix, base_path=None):
+    """
+    :param prefix: prefix for the directory name
+    :param base_path: where to create the directory, default see default_shared_data_path
+    :return: path of a new empty directory
+    """
+    return tempfile.mkdtemp(prefix=prefix, dir=base_path if base_path is not None else default_shared_data_path())
+
+
+def release_shared_dir(path):
+    """
+    Removes the shared directory, processes that already attached keep their mapping until they exit
+    :param path: directory created by create_shared_dir
+    :return:
+    """
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def share_array(path, array):
+    """
+    :param path: file path to write the array to
+    :param array: np.array
+    :return: read-only memory-mapped view of the array
+    """
+    np.save(path, np.ascontiguousarray(array))
+    return attach_array(path)
+
+
+def attach_array(path):
+    """
+    :param path: file written by share_array
+    :return: read-only memory-mapped view of the array
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def share_arrays(path, arrays, metadata=None):
+    """
+    Writes every array as a .npy file and the names (and metadata) as json, so they can be attached without copies.
+    :param path: directory
+    :param arrays: list of (name, np.array) of numeric or boolean arrays
+    :param metadata: json serializable object returned by attach_arrays
+    :return:
+    """
+    os.makedirs(path, exist_ok=True)
+    names = []
+    for array_number, (name, array) in enumerate(arrays):
+        file_name = 'array_{}.npy'.format(array_number)
+        np.save(os.path.join(path, file_name), np.ascontiguousarray(array))
+        names.append({'name': name, 'file_name': file_name})
+
+    with open(os.path.join(path, ARRAYS_METADATA_FILE_NAME), 'w') as f:
+        json.dump({'arrays': names, 'metadata': metadata}, f)
+
+
+def attach_arrays(path):
+    """
+    :param path: directory written by share_arrays
+    :return: {name: read-only memory-mapped array}, metadata
+    """
+    with open(os.path.join(path, ARRAYS_METADATA_FILE_NAME), 'r') as f:
+        content = json.load(f)
+    arrays = {name['name']: attach_array(os.path.join(path, name['file_name'])) for name in content['arrays']}
+    return arrays, content['metadata']
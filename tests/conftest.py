@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from Fees.Fees import Fees
+from Utilities import Consts
+from Utilities.DataHelper import DataHelper
+
+SYMBOLS = ['BTC', 'ETH', 'XRP', 'LTC', 'ADA']
+START_TIME = 1514764800  # 2018-01-01, the first prediction
+HOURS = 240  # hours of predictions
+HISTORY_HOURS = 30  # hours of prices before the first prediction (the 24h volume of the first tick)
+EXTRA_HOURS = 60  # hours of prices after the last prediction
+JUMP_HOUR = 100  # XRP jumps x2.5 between high and low
+CRASH_HOUR = 120  # LTC opens 15% lower
+
+
+@pytest.fixture(scope='session')
+def market(tmp_path_factory):
+    """
+    A small synthetic market: hourly prices of SYMBOLS with a jump and a crash, individual fees for ETH (leverage fee
+    every 6 hours) and long and short ML results every 3 hours. The prices are loaded into the DataHelper.
+    :return: {'ml_results': df of the ML results as loaded by LoaderHelper (prediction_time as epoch), 'fees': Fees,
+     'path_to_data_file': path of the coins price file}
+    """
+    path = str(tmp_path_factory.mktemp('market'))
+    rng = np.random.RandomState(7)
+
+    rows = []
+    for symbol in SYMBOLS:
+        price = 100 * rng.uniform() + 1
+        for hour in range(-HISTORY_HOURS, HOURS + EXTRA_HOURS):
+            open_price = price
+            close_price = open_price * np.exp(rng.normal(0, 0.01))
+            if symbol == 'LTC' and hour == CRASH_HOUR - 1:
+                close_price *= 0.85
+            high_price = max(open_price, close_price) * (1 + abs(rng.normal(0, 0.008)))
+            low_price = min(open_price, close_price) * (1 - abs(rng.normal(0, 0.008)))
+            if symbol == 'XRP' and hour == JUMP_HOUR:
+                high_price = low_price * 2.5
+            rows.append((START_TIME + hour * 3600, symbol, close_price, high_price, low_price, open_price,
+                         rng.uniform(1e6, 1e8)))
+            price = close_price
+    path_to_data_file = os.path.join(path, 'prices.csv.gz')
+    pd.DataFrame(rows, columns=['ptime', 'coin_symbol', '_close', '_high', '_low', '_open', '_volumeto']).to_csv(
+        path_to_data_file, compression='gzip', index=False)
+
+    with open(os.path.join(path, Consts.FEES_FILE_NAME), 'w') as f:
+        f.write('coin_symbol,taker_fee,maker_fee,leverage_buy_fee,leverage_sell_fee,leverage_time_for_fees_in_hours,'
+                'leverage_fees_for_time_interval\nETH,0.008,0.008,0.002,0.003,6,0.004\n')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(Consts, 'FEES_FILE_PATH', path + os.sep)
+        fees = Fees()
+
+    predictions = []
+    for order_type in [Consts.LONG, Consts.SHORT]:
+        for hour in range(0, HOURS, 3):
+            if rng.uniform() < 0.2:
+                continue
+            for symbol in rng.choice(SYMBOLS[1:], size=rng.randint(1, 4), replace=False):
+                predictions.append((START_TIME + hour * 3600, rng.uniform(0.1, 1.0), rng.uniform(0.01, 0.05),
+                                    rng.uniform(0, 1.0), -rng.uniform(0.01, 0.05), float(rng.randint(3, 30)),
+                                    symbol, order_type))
+    ml_results = pd.DataFrame(predictions, columns=[Consts.TIME_COLUMN_PREDICTION, Consts.PROB_POSITIVE_HEADER,
+                                                    'high_boundary', Consts.PROB_NEGATIVE_HEADER, 'low_boundary',
+                                                    'time_predict', Consts.COIN_SYMBOL, 'order_type'])
+    ml_results = ml_results[sorted(ml_results.columns)]
+
+    DataHelper().init_data(SYMBOLS, path_to_data_file, ml_results[Consts.TIME_COLUMN_PREDICTION].min(),
+                           ml_results[Consts.TIME_COLUMN_PREDICTION].max())
+    return {'ml_results': ml_results, 'fees': fees, 'path_to_data_file': path_to_data_file}
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+from Simulation.MultiPortfolio import MultiPortfolio
+from Simulation.Portfolio import Portfolio
+from Simulation.TimeTicker import TimeTicker
+from Utilities import Consts
+from tests.test_sizing import baseline_calc_invest
+
+COIN_SYMBOLS = ['AAA', 'BBB', 'CCC', 'DDD', 'EEE', 'FFF', 'GGG']
+
+
+def baseline_allocation(predictions, volume, available_capital, min_investment, max_percent_out_of_volume,
+                        capital_to_invest=None, fully_invested=None):
+    """
+    The recursive allocation as computed before the iterative water filling, one prediction at a time
+    :param predictions: df of the predictions to invest in
+    :param volume: {coin symbol: 24h volume}
+    :return: list of capital to invest of every prediction
+    """
+    if capital_to_invest is None:
+        capital_to_invest = [0.0] * len(predictions)
+        fully_invested = [False] * len(predictions)
+
+    total_positions_count = fully_invested.count(False)
+    if total_positions_count == 0:
+        return capital_to_invest
+    coins_available_capital = available_capital / total_positions_count
+    if coins_available_capital < min_investment:
+        return capital_to_invest
+
+    used_capital = 0
+    for row, (_, prediction) in enumerate(predictions.iterrows()):
+        if fully_invested[row]:
+            continue
+        coin_current_volume = volume[prediction['coin_symbol']]
+        if coin_current_volume == 0.0:
+            fully_invested[row] = True
+            continue
+
+        coins_max_capital_volume_boundary = max_percent_out_of_volume * coin_current_volume
+        if coins_max_capital_volume_boundary < coins_available_capital:
+            fully_invested[row] = True
+            max_amount_to_invest_in_coin = coins_max_capital_volume_boundary
+        else:
+            max_amount_to_invest_in_coin = coins_available_capital
+
+        prob = prediction[Consts.PROB_POSITIVE_HEADER] if prediction['order_type'] == Consts.LONG else \
+            prediction[Consts.PROB_NEGATIVE_HEADER]
+        current_capital_to_invest_in_position = baseline_calc_invest(prob) * max_amount_to_invest_in_coin
+        capital_to_invest[row] = capital_to_invest[row] + current_capital_to_invest_in_position
+        used_capital += current_capital_to_invest_in_position
+
+    available_capital -= used_capital
+    return baseline_allocation(predictions, volume, available_capital, min_investment, max_percent_out_of_volume,
+                               capital_to_invest, fully_invested)
+
+
+def random_predictions(rng):
+    """
+    :return: df of predictions of all coins (the probability of the side of the position is at least 0.4, like
+     the investment strategies require), {coin symbol: 24h volume} with a coin without volume
+    """
+    amount = len(COIN_SYMBOLS)
+    order_type = np.where(rng.uniform(0, 1, amount) < 0.5, Consts.LONG, Consts.SHORT)
+    prob_side, prob_other = rng.uniform(0.4, 1.0, amount), rng.uniform(0, 0.6, amount)
+    prob_side[rng.randint(amount)] = 1.0
+    predictions = pd.DataFrame({'coin_symbol': COIN_SYMBOLS,
+                                Consts.PROB_POSITIVE_HEADER: np.where(order_type == Consts.LONG, prob_side, prob_other),
+                                Consts.PROB_NEGATIVE_HEADER: np.where(order_type == Consts.LONG, prob_other, prob_side),
+                                'order_type': order_type})
+    volume = dict(zip(COIN_SYMBOLS, rng.uniform(1e5, 1e8, amount)))
+    volume[COIN_SYMBOLS[rng.randint(amount)]] = 0.0
+    return predictions, volume
+
+
+def portfolio(min_investment, max_percent_out_of_volume, volume):
+    """
+    :return: Portfolio with only the params of the allocation, the volume is taken from volume
+    """
+    single = Portfolio.__new__(Portfolio)
+    single.min_investment = min_investment
+    single.max_percent_out_of_volume = max_percent_out_of_volume
+    single.sizing_table = None
+    single.time_ticker = TimeTicker(1514764800, 1)
+    single.fetch_coins_24h_volumeto = lambda coin_symbol: (True, volume[coin_symbol])
+    return single
+
+
+SIMULATIONS = [(200000.0, 1000.0, 0.01), (200000.0, 10000.0, 0.01), (1000000.0, 10000.0, 0.0005),
+               (50000.0, 10000.0, 0.01), (5000.0, 10000.0, 0.01)]  # available capital, min investment, % of volume
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_portfolio_allocation_matches_recursive(seed):
+    rng = np.random.RandomState(seed)
+    for available_capital, min_investment, max_percent_out_of_volume in SIMULATIONS:
+        predictions, volume = random_predictions(rng)
+        coins_to_invest = predictions.copy()
+        coins_to_invest[Consts.FULLY_INVESTED] = False
+        coins_to_invest[Consts.CAPITAL_TO_INVEST] = 0.0
+
+        allocated = portfolio(min_investment, max_percent_out_of_volume, volume).capital_allocation_strategy(
+            coins_to_invest, available_capital)
+        np.testing.assert_array_equal(allocated[Consts.CAPITAL_TO_INVEST].values, baseline_allocation(
+            predictions, volume, available_capital, min_investment, max_percent_out_of_volume))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_multi_portfolio_allocation_matches_recursive(seed):
+    rng = np.random.RandomState(seed)
+    predictions, volume = random_predictions(rng)
+    candidates = rng.uniform(0, 1, (len(SIMULATIONS), len(predictions))) < 0.7
+    candidates[-1] = False  # a simulation without new positions
+
+    batch = MultiPortfolio.__new__(MultiPortfolio)
+    batch.min_investment = np.array([min_investment for _, min_investment, _ in SIMULATIONS])
+    batch.max_percent_out_of_volume = np.array([max_percent for _, _, max_percent in SIMULATIONS])
+    batch.sizing_table = None
+    batch.time_ticker = TimeTicker(1514764800, 1)
+    available_capital = np.array([capital for capital, _, _ in SIMULATIONS])
+    simulations = np.arange(len(SIMULATIONS))
+
+    allocated = batch.capital_allocation_strategy(simulations, candidates, available_capital,
+                                                  np.array([volume[coin] for coin in predictions['coin_symbol']]),
+                                                  predictions)
+    for simulation, (capital, min_investment, max_percent_out_of_volume) in enumerate(SIMULATIONS):
+        expected = np.zeros(len(predictions))
+        expected[candidates[simulation]] = baseline_allocation(
+            predictions[candidates[simulation]], volume, capital, min_investment, max_percent_out_of_volume)
+        np.testing.assert_array_equal(allocated[simulation], expected)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from Simulation import FirstHit
+from Utilities import Consts
+from Utilities.PriceStore import PriceStore
+
+BUY_PRICE = 100.0
+POSITIVE_TARGET = 0.02
+NEGATIVE_TARGET = -0.02
+
+
+def price_store(high, low):
+    """
+    :param high: np.array of the high price of a single coin in every hour
+    :param low: np.array of the low price in every hour
+    :return: PriceStore of the coin, the other fields are the mean of high and low
+    """
+    values = np.repeat(((high + low) / 2)[:, None], len(Consts.COINS_CANDLE_STICK_FIELDS), axis=1)
+    store = PriceStore(['AAA'], 0, values[None], np.zeros(1, dtype=np.int64), np.full(1, len(high) * 3600))
+    store.values[0, :, store.field_to_index['_high']] = high
+    store.values[0, :, store.field_to_index['_low']] = low
+    return store
+
+
+def per_tick_first_hit(store, time_index, stride, buy_price, positive_target, negative_target, max_steps=None):
+    """
+    The checks of every tick like PositionBook.reach_target_update (and Position.reach_target_update before it),
+    a position which expires is still checked at its expiry tick
+    """
+    step = 1
+    while time_index + step * stride < store.amount_of_steps and (max_steps is None or step <= max_steps):
+        candle = store.values[0, time_index + step * stride]
+        high, low = candle[store.field_to_index['_high']], candle[store.field_to_index['_low']]
+        reason = (FirstHit.REACH_HIGH if (high / buy_price) - 1 >= positive_target else 0) | \
+            (FirstHit.REACH_LOW if (low / buy_price) - 1 <= negative_target else 0) | \
+            (FirstHit.JUMP if high / low > FirstHit.MAX_HIGH_LOW_RATIO else 0)
+        if reason != FirstHit.NO_HIT:
+            return step, reason
+        step += 1
+    return -1, FirstHit.NO_HIT
+
+
+def test_first_hit_matches_per_tick_checks():
+    reasons = set()
+    rng = np.random.RandomState(3)
+    for _ in range(200):
+        close = BUY_PRICE * np.exp(np.cumsum(rng.normal(0, 0.006, 120)))
+        high = close * (1 + np.abs(rng.normal(0, 0.004, 120)))
+        low = close * (1 - np.abs(rng.normal(0, 0.004, 120)))
+        high[rng.randint(0, 120, 2)] *= 2.5  # jumps
+        store = price_store(high, low)
+        time_index = rng.randint(0, 40)
+        stride = rng.randint(1, 4)
+        max_steps = None if rng.rand() < 0.3 else rng.randint(1, 30)
+        expected = per_tick_first_hit(store, time_index, stride, BUY_PRICE, POSITIVE_TARGET, NEGATIVE_TARGET,
+                                      max_steps)
+        assert FirstHit.first_hit(store, 0, time_index, stride, BUY_PRICE, POSITIVE_TARGET, NEGATIVE_TARGET,
+                                  max_steps) == expected
+        reasons.add(expected[1])
+    assert {FirstHit.NO_HIT, FirstHit.REACH_HIGH, FirstHit.REACH_LOW} <= reasons
+
+
+@pytest.mark.parametrize('hit_step, max_steps, expected', [(5, 5, (5, FirstHit.REACH_HIGH)),
+                                                            (6, 5, (-1, FirstHit.NO_HIT)),
+                                                            (4, 5, (4, FirstHit.REACH_HIGH)),
+                                                            (5, None, (5, FirstHit.REACH_HIGH))])
+def test_first_hit_checks_the_expiry_tick(hit_step, max_steps, expected):
+    high = np.full(20, BUY_PRICE * 1.001)
+    low = np.full(20, BUY_PRICE * 0.999)
+    high[hit_step] = BUY_PRICE * 1.05
+    assert FirstHit.first_hit(price_store(high, low), 0, 0, 1, BUY_PRICE, POSITIVE_TARGET, NEGATIVE_TARGET,
+                              max_steps) == expected
+
+
+@pytest.mark.parametrize('field', ['high', 'low'])
+def test_first_hit_stops_at_missing_prices(field):
+    high = np.full(20, BUY_PRICE * 1.001)
+    low = np.full(20, BUY_PRICE * 0.999)
+    high[12] = BUY_PRICE * 1.05
+    (high if field == 'high' else low)[7] = np.nan
+
+    # The per-tick check of the tick with the missing price decides, instead of skipping it
+    assert FirstHit.first_hit(price_store(high, low), 0, 0, 1, BUY_PRICE, POSITIVE_TARGET, NEGATIVE_TARGET) == \
+        (7, FirstHit.MISSING_PRICE)
+    assert FirstHit.FirstHitCache(10).first_hit(price_store(high, low), 0, 0, 1, BUY_PRICE, POSITIVE_TARGET,
+                                                NEGATIVE_TARGET) == (7, FirstHit.MISSING_PRICE)
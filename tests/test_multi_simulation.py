@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+from Simulation.MultiSimulation import MultiSimulation
+from Simulation.Simulation import Simulation
+from Utilities import Consts, LoaderHelper
+from Utilities.MLResultsIndex import MLResultsIndex
+
+LONG_INVESTMENT_STRATEGY = {'min_prob_positive': 0.5, 'max_prob_negative': 0.5}
+SHORT_INVESTMENT_STRATEGY = {'min_prob_negative': 0.5, 'max_prob_positive': 0.5}
+
+# Params of every simulation which are different from the first option of the grid
+SIMULATIONS = [
+    {},
+    {'leverage': 3, 'min_prob_for_leverage': 0.6},
+    {'leverage': 3, 'min_prob_for_leverage': 0.6, 'apply_leverage_fees_on_all_capital': True},
+    {'shorts': False},
+    {'longs': False},
+    {'accept_short_and_long_same_tick_and_symbol': False},
+    {'min_investment': 50000.0},
+    {'max_percent_out_of_volume': 0.00001},
+    {'long_trailing_strategy': {'high_boundary': 0.03, 'low_boundary': -0.01},
+     'short_trailing_strategy': {'high_boundary': 0.01, 'low_boundary': -0.03}},
+    {'active_long_investment_strategy': {}, 'active_short_investment_strategy': {}},
+    {'coins_to_invest_in': ['ETH', 'XRP']},
+    {'amount_of_capital': 500000.0, 'max_percent_cap_investment_in_a_round': 0.1},
+]
+
+
+def simulations_frame():
+    """
+    :return: df of the params of SIMULATIONS, with looser investment strategies than the grid so the synthetic
+     predictions open positions
+    """
+    options = LoaderHelper.simulation_params_options()
+    simulations = []
+    for simulation_id, changes in enumerate(SIMULATIONS):
+        params = {name: values[0] for name, values in options}
+        params.update(long_investment_strategy=LONG_INVESTMENT_STRATEGY,
+                      short_investment_strategy=SHORT_INVESTMENT_STRATEGY)
+        params.update(changes)
+        simulations.append((simulation_id, params))
+    return LoaderHelper.simulation_params_frame(simulations, options)
+
+
+@pytest.mark.parametrize('tick_time_hours', [1, 3])
+def test_multi_simulation_matches_simulations(market, monkeypatch, tick_time_hours):
+    # The details of all simulations are kept in the results instead of written to files
+    monkeypatch.setattr(Consts, 'RETAIN_TOP_AMOUNT', len(SIMULATIONS))
+    ml_results = MLResultsIndex.from_frame(market['ml_results'])
+    df_simulations = simulations_frame()
+    current_time = 1500000000
+
+    results = {}
+    for position in range(len(df_simulations)):
+        for result in Simulation((ml_results, df_simulations.iloc[[position]], tick_time_hours, market['fees'],
+                                  current_time, [['BTC']], {}, None, None)).results:
+            results[result['simulation_id']] = result
+    batch_results = MultiSimulation((ml_results, df_simulations, tick_time_hours, market['fees'], current_time,
+                                     [['BTC']], {}, None, None)).results
+
+    assert sorted(result['simulation_id'] for result in batch_results) == sorted(results)
+    for batch_result in batch_results:
+        result = results[batch_result['simulation_id']]
+        pd.testing.assert_frame_equal(batch_result['capital_history'], result['capital_history'], check_exact=True)
+        pd.testing.assert_frame_equal(batch_result['positions'], result['positions'], check_exact=True)
+        pd.testing.assert_frame_equal(batch_result['analytics'], result['analytics'], check_exact=True)
+
+    # The simulations invested
+    assert all(len(result['positions']) > 0 for result in batch_results)
@@ -0,0 +1,319 @@
+import numpy as np
+import pandas as pd
+import pytest
+from Simulation.PositionBook import PositionBook
+from Simulation.TimeTicker import TimeTicker
+from Utilities import Consts
+from Utilities.DataHelper import DataHelper
+from tests.conftest import CRASH_HOUR, EXTRA_HOURS, HOURS, JUMP_HOUR, START_TIME, SYMBOLS
+
+data_helper = DataHelper()
+
+TRAILING_STRATEGIES = {Consts.LONG: {'high_boundary': 0.03, 'low_boundary': -0.01},
+                       Consts.SHORT: {'high_boundary': 0.01, 'low_boundary': -0.03}}
+ACTIVE_STRATEGIES = {Consts.LONG: {'max_prob_negative': 0.7}, Consts.SHORT: {'max_prob_positive': 0.7}}
+
+
+class BaselinePosition(object):
+    """
+    A single open position as updated before the position book (Position), without the logs
+    """
+
+    def __init__(self, coin_symbol, order_type, time_ticker, positive_target, negative_target, capital, trailing,
+                 fees, leverage_capital, apply_leverage_fees_on_all_capital, leverage, long_trailing_strategy,
+                 short_trailing_strategy, time_predict, active_long_investment_strategy,
+                 active_short_investment_strategy):
+        self.coin_symbol = coin_symbol
+        self.order_type = order_type
+        self.initial_time = time_ticker.current_time
+        self.position_end_time = None
+        self.position_life_time = time_predict
+        self.positive_target = positive_target
+        self.negative_target = negative_target
+        self.current_capital = capital
+        self.trailing = trailing
+        self.buy_price = []
+        self.last_price = None
+        self.hit_profit_target = False
+        self.hit_loss_target = False
+        self.expired = False
+        self.stopped = False
+        self.liquidated = False
+        self.trailing_activated = 0
+        self.long_trailing_strategy = long_trailing_strategy
+        self.short_trailing_strategy = short_trailing_strategy
+        self.active_long_investment_strategy = active_long_investment_strategy
+        self.active_short_investment_strategy = active_short_investment_strategy
+        self.fees = fees
+        self.hours_position_open = 0
+        self.fees_paid = 0
+        self.leverage_capital = leverage_capital
+        self.leverage = leverage
+        self.time_ticker = time_ticker
+        self.apply_leverage_fees_on_all_capital = apply_leverage_fees_on_all_capital
+
+        success, data = data_helper.get_coin_data(int(self.initial_time), self.coin_symbol)
+        assert success
+        self.buy_price.append(data['_open'])
+        self.last_price = data['_open']
+        leverage_fee = 0
+        if self.leverage > 1:
+            leverage_fee = self.fees.apply_leverage_buy_fees(self.coin_symbol, self.leverage_capital)
+        capital_taker_fee = self.fees.apply_taker_fee(self.coin_symbol, self.current_capital)
+        self.fees_paid = capital_taker_fee + leverage_fee
+        self.current_capital = self.current_capital - capital_taker_fee - leverage_fee
+
+    def updates_new_time_is_liquidate(self, ml_results=None):
+        success, coins_data = data_helper.get_coin_data(int(self.time_ticker.current_time), self.coin_symbol)
+        assert success
+        new_price = coins_data['_open']
+        if self.order_type == Consts.LONG:
+            current_change = (new_price / self.last_price) - 1
+        else:
+            current_change = ((new_price / self.last_price) - 1) * (-1)
+        self.current_capital += (self.current_capital * current_change)
+        self.last_price = new_price
+        self.hours_position_open += self.time_ticker.hours_tick_time_interval
+        if self.current_capital <= self.leverage_capital:
+            self.liquidated = True
+            self.close_position()
+            return True
+        return False
+
+    def apply_time_leverage_fees(self):
+        if self.fees.is_it_time_for_leverage_fee(self.coin_symbol, self.hours_position_open):
+            capital = self.current_capital if self.apply_leverage_fees_on_all_capital else self.leverage_capital
+            fees = self.fees.apply_leverage_time_for_fee_in_hours(self.coin_symbol, capital)
+            self.fees_paid += fees
+            self.current_capital -= fees
+
+    def reach_target_update(self, ml_results=None):
+        success, coins_data = data_helper.get_coin_data(int(self.time_ticker.current_time), self.coin_symbol)
+        assert success
+        diff_high = ((coins_data['_high'] / self.buy_price[-1]) - 1)
+        diff_low = ((coins_data['_low'] / self.buy_price[-1]) - 1)
+
+        if coins_data['_high'] / coins_data['_low'] > 2:
+            self.hit_loss_target += 1
+            self.close_position()
+            return True
+
+        if diff_high >= self.positive_target and diff_low <= self.negative_target:
+            self.hit_loss_target += 1
+            self.close_position()
+            return True
+
+        if (diff_low <= self.negative_target and self.order_type == Consts.SHORT) or (
+                diff_high >= self.positive_target and self.order_type == Consts.LONG):
+            if self.trailing:
+                if (self.order_type == Consts.SHORT and len(self.short_trailing_strategy) != 0) or (
+                        self.order_type == Consts.LONG and len(self.long_trailing_strategy) != 0):
+                    self.handle_trailing()
+                    return False
+            self.close_position()
+            self.hit_profit_target = True
+            return True
+
+        elif (diff_high >= self.positive_target and self.order_type == Consts.SHORT) or (
+                diff_low <= self.negative_target and self.order_type == Consts.LONG):
+            self.close_position()
+            self.hit_loss_target = True
+            return True
+        return False
+
+    def handle_trailing(self):
+        self.buy_price.append(self.last_price)
+        self.trailing_activated += 1
+        self.position_life_time = (self.position_life_time * 2)
+        strategy = self.short_trailing_strategy if self.order_type == Consts.SHORT else self.long_trailing_strategy
+        self.positive_target = strategy['high_boundary']
+        self.negative_target = strategy['low_boundary']
+
+    def close_position(self):
+        self.position_end_time = self.time_ticker.current_time
+        leverage_sell_fee = 0
+        if self.leverage > 1:
+            leverage_sell_fee = self.fees.apply_leverage_sell_fees(self.coin_symbol, self.leverage_capital)
+        taker_capital_sell_fee = self.fees.apply_taker_fee(self.coin_symbol, self.current_capital)
+        self.fees_paid = self.fees_paid + leverage_sell_fee + taker_capital_sell_fee
+        self.current_capital = self.current_capital - taker_capital_sell_fee - leverage_sell_fee
+
+    def is_expired(self, ml_results=None):
+        if self.hours_position_open == self.position_life_time:
+            self.expired = True
+            self.close_position()
+            return True
+        return False
+
+    def force_close(self, ml_results=None):
+        self.expired = True
+        self.close_position()
+        return True
+
+    def is_active_invest_strategy(self, ml_results=None):
+        if self.coin_symbol in ml_results.coin_symbol.tolist():
+            rows = ml_results['coin_symbol'] == self.coin_symbol
+            prob_negative = ml_results.loc[rows, Consts.PROB_NEGATIVE_HEADER].values[0]
+            prob_positive = ml_results.loc[rows, Consts.PROB_POSITIVE_HEADER].values[0]
+            if self.order_type == Consts.LONG and len(self.active_long_investment_strategy) != 0:
+                if self.active_long_investment_strategy['max_prob_negative'] <= prob_negative:
+                    self.stopped = True
+                    self.close_position()
+                    return True
+            elif self.order_type == Consts.SHORT and len(self.active_short_investment_strategy) != 0:
+                if self.active_short_investment_strategy['max_prob_positive'] <= prob_positive:
+                    self.stopped = True
+                    self.close_position()
+                    return True
+        return False
+
+
+def new_positions(rng, hour):
+    """
+    :return: list of params of random positions to open at hour, with positions which are liquidated by the crash
+     and closed by the jump
+    """
+    positions = []
+    for _ in range(rng.randint(1, 4)):
+        leverage = [1.0, 3.0, 10.0][rng.randint(3)]
+        capital = rng.uniform(1e4, 1e5)
+        target = [0.01, 0.02, 0.5][rng.randint(3)]
+        positions.append({'coin_symbol': SYMBOLS[rng.randint(len(SYMBOLS))],
+                          'order_type': [Consts.LONG, Consts.SHORT][rng.randint(2)],
+                          'positive_target': target, 'negative_target': -target, 'capital': capital,
+                          'leverage': leverage, 'leverage_capital': capital - capital / leverage,
+                          'time_predict': float(rng.randint(3, 31)), 'trailing': rng.uniform() < 0.5,
+                          'active': rng.uniform() < 0.5, 'apply_leverage_fees_on_all_capital': rng.uniform() < 0.5})
+    if hour == CRASH_HOUR - 6:
+        positions.append(dict(positions[0], coin_symbol='LTC', order_type=Consts.LONG, leverage=10.0,
+                              leverage_capital=90000.0, capital=100000.0, positive_target=0.5, negative_target=-0.5,
+                              time_predict=24.0, trailing=False, active=False))
+    if hour == JUMP_HOUR - 4:
+        positions.append(dict(positions[0], coin_symbol='XRP', positive_target=0.5, negative_target=-0.5,
+                              time_predict=24.0, trailing=False, active=False))
+    return positions
+
+
+def open_baseline(params, time_ticker, fees):
+    order_type = params['order_type']
+    return BaselinePosition(params['coin_symbol'], order_type, time_ticker, params['positive_target'],
+                            params['negative_target'], params['capital'], True, fees, params['leverage_capital'],
+                            params['apply_leverage_fees_on_all_capital'], params['leverage'],
+                            TRAILING_STRATEGIES[Consts.LONG] if params['trailing'] else {},
+                            TRAILING_STRATEGIES[Consts.SHORT] if params['trailing'] else {},
+                            params['time_predict'], ACTIVE_STRATEGIES[Consts.LONG] if params['active'] else {},
+                            ACTIVE_STRATEGIES[Consts.SHORT] if params['active'] else {})
+
+
+def open_book(book, positions):
+    def column(name, dtype=np.float64):
+        return np.array([params[name] for params in positions], dtype=dtype)
+
+    is_short = np.array([params['order_type'] == Consts.SHORT for params in positions])
+    trailing = column('trailing', bool)
+    active = column('active', bool)
+    book.open_positions(
+        data_helper.price_store.symbols_indexes(np.array([params['coin_symbol'] for params in positions])), is_short,
+        column('positive_target'), column('negative_target'), column('capital'), column('leverage_capital'),
+        column('time_predict'), column('leverage'), np.ones(len(positions), dtype=bool),
+        np.where(trailing, np.where(is_short, 0.01, 0.03), np.nan),
+        np.where(trailing, np.where(is_short, -0.03, -0.01), np.nan), np.where(active, 0.7, np.nan),
+        column('apply_leverage_fees_on_all_capital', bool))
+
+
+def random_probabilities(rng):
+    """
+    :return: df of the predictions of some coins (one per coin), prob_positive, prob_negative np.arrays indexed by
+     symbol offset (see MLResultsIndex.probabilities_by_symbol)
+    """
+    symbols = [symbol for symbol in SYMBOLS if rng.uniform() < 0.5]
+    predictions = pd.DataFrame({'coin_symbol': symbols, Consts.PROB_POSITIVE_HEADER: rng.uniform(0, 1, len(symbols)),
+                                Consts.PROB_NEGATIVE_HEADER: rng.uniform(0, 1, len(symbols))})
+    prob_positive, prob_negative = np.full(len(SYMBOLS), np.nan), np.full(len(SYMBOLS), np.nan)
+    indexes = data_helper.price_store.symbols_indexes(np.array(symbols, dtype=object))
+    prob_positive[indexes] = predictions[Consts.PROB_POSITIVE_HEADER].values
+    prob_negative[indexes] = predictions[Consts.PROB_NEGATIVE_HEADER].values
+    return predictions, (prob_positive, prob_negative)
+
+
+@pytest.mark.parametrize('tick_hours', [1, 2])
+def test_position_book_matches_positions(market, tick_hours):
+    rng = np.random.RandomState(tick_hours)
+    fees = market['fees']
+    baseline_ticker, book_ticker = TimeTicker(START_TIME, tick_hours), TimeTicker(START_TIME, tick_hours)
+    book = PositionBook(fees, book_ticker)
+    open_positions, baseline_closed, book_closed = [], [], []
+
+    def close_book(closed):
+        rows = book.take_closed(closed)
+        book_closed.extend(dict(zip(rows, values)) for values in zip(*rows.values()))
+        for row in book_closed[len(book_closed) - int(closed.sum()):]:
+            row['position_end_time'] = book_ticker.current_time
+
+    def close_baseline(func_name, ml_results=None):
+        for position in list(open_positions):
+            if getattr(position, func_name)(ml_results=ml_results):
+                open_positions.remove(position)
+                baseline_closed.append(position)
+
+    end_time = START_TIME + (HOURS + EXTRA_HOURS - 2 * tick_hours) * 3600
+    while baseline_ticker.current_time < end_time:
+        hour = (baseline_ticker.current_time - START_TIME) // 3600
+
+        close_baseline(Consts.UPDATES_NEW_TIME_IS_LIQUIDATE)
+        close_book(book.updates_new_time_is_liquidate())
+        for position in open_positions:
+            if position.leverage > 1:
+                position.apply_time_leverage_fees()
+        book.apply_time_leverage_fees()
+        close_baseline(Consts.REACH_TARGET_UPDATE)
+        close_book(book.reach_target_update())
+        close_baseline(Consts.IS_EXPIRED)
+        close_book(book.is_expired())
+
+        if hour % 3 == 0 and hour < HOURS - 60:
+            predictions, probabilities = random_probabilities(rng)
+            close_baseline(Consts.IS_ACTIVE_INVEST_STRATEGY, predictions)
+            close_book(book.is_active_invest_strategy(probabilities))
+            positions = new_positions(rng, hour)
+            for params in positions:
+                position = open_baseline(params, baseline_ticker, fees)
+                position.position_id = len(open_positions) + len(baseline_closed)
+                open_positions.append(position)
+            open_book(book, positions)
+
+        assert len(book) == len(open_positions)
+        baseline_ticker.advance_one_step()
+        book_ticker.advance_one_step()
+
+    close_baseline(Consts.FORCE_CLOSE_ALL_POSITIONS)
+    book.force_close()
+    close_book(np.ones(len(book), dtype=bool))
+
+    # Positions are compared by their opening order
+    baseline_closed.sort(key=lambda position: position.position_id)
+    book_closed.sort(key=lambda row: row['position_id'])
+    assert len(book_closed) == len(baseline_closed)
+    for position, row in zip(baseline_closed, book_closed):
+        assert data_helper.price_store.symbols[row['symbol_index']] == position.coin_symbol
+        assert row['initial_time'] == position.initial_time
+        assert row['current_capital'] == position.current_capital
+        assert row['fees_paid'] == position.fees_paid
+        assert row['last_price'] == position.last_price
+        assert row['buy_price_history'] == position.buy_price
+        assert row['hours_position_open'] == position.hours_position_open
+        assert row['position_life_time'] == position.position_life_time
+        assert row['trailing_activated'] == position.trailing_activated
+        assert row['position_end_time'] == position.position_end_time
+        for flag in ['hit_profit_target', 'hit_loss_target', 'expired', 'stopped', 'liquidated']:
+            assert row[flag] == bool(getattr(position, flag)), flag
+
+    # Every way to close a position was checked
+    assert any(row['liquidated'] and row['position_end_time'] == START_TIME + CRASH_HOUR * 3600 for row in book_closed)
+    assert any(row['hit_loss_target'] and row['position_end_time'] == START_TIME + JUMP_HOUR * 3600 and
+               data_helper.price_store.symbols[row['symbol_index']] == 'XRP' for row in book_closed)
+    assert any(row['hit_profit_target'] for row in book_closed)
+    assert any(row['hit_loss_target'] for row in book_closed)
+    assert any(row['stopped'] for row in book_closed)
+    assert any(row['trailing_activated'] > 0 for row in book_closed)
+    assert any(row['expired'] and row['position_end_time'] < end_time for row in book_closed)
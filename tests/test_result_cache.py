@@ -0,0 +1,35 @@
+import os
+
+import pandas as pd
+from Utilities import ResultCache
+
+PARAMS = {'amount_of_capital': 1000.0, 'leverage': 1.0}
+
+
+def cache_entry(tmp_path):
+    cache = ResultCache.ResultCache(str(tmp_path), 'fingerprint')
+    positions_history = pd.DataFrame({'coin_symbol': ['AAA'], 'current_capital': [1.5]})
+    capital_history = pd.DataFrame({'liquid_capital': [1000.0, 1001.5]})
+    cache.put(pd.DataFrame([PARAMS]), positions_history, capital_history)
+    return cache, os.path.join(str(tmp_path), cache.key(PARAMS))
+
+
+def test_result_cache_reads_its_entries(tmp_path):
+    cache, _ = cache_entry(tmp_path)
+    positions_history, capital_history = cache.get(PARAMS)
+    assert positions_history['current_capital'].tolist() == [1.5]
+    assert capital_history['liquid_capital'].tolist() == [1000.0, 1001.5]
+    assert cache.get(dict(PARAMS, leverage=2.0)) is None
+
+
+def test_result_cache_removes_unreadable_entries(tmp_path):
+    cache, path = cache_entry(tmp_path)
+    with open(os.path.join(path, ResultCache.POSITIONS_FILE_NAME), 'wb') as f:
+        f.write(b'not a pickle')
+
+    assert cache.get(PARAMS) is None
+    assert not os.path.exists(path)
+
+
+def test_source_fingerprint_is_stable():
+    assert ResultCache.source_fingerprint() == ResultCache.source_fingerprint()
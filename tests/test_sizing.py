@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from scipy.stats import norm
+from Simulation import Sizing
+from Utilities import Consts
+
+
+def baseline_calc_invest(prob):
+    """
+    The position size of a single probability as computed before Sizing.calc_invest
+    """
+    if prob == 1.0:
+        prob = 0.999
+    elif prob == 0.0:
+        prob = 0.001
+    signal = (prob - (1.0 / Consts.NUM_OF_CLASSES)) / ((prob * (1.0 - prob)) ** 0.5)
+    return 2 * norm.cdf(signal) - 1
+
+
+def probabilities():
+    """
+    :return: np.array of random probabilities, the edges and probabilities on the grid of a sizing table
+    """
+    rng = np.random.RandomState(5)
+    return np.concatenate([[0.0, 1.0, 1.0 / 3, 0.5, 0.001, 0.999], np.arange(101) / 100, rng.uniform(0, 1, 300)])
+
+
+@pytest.mark.parametrize('steps', [None, 100, 1000])
+def test_calc_invest_matches_scalar(steps):
+    prob = probabilities()
+    size = Sizing.calc_invest if steps is None else Sizing.SizingTable(steps).calc_invest
+    np.testing.assert_array_equal(size(prob), [baseline_calc_invest(value) for value in prob])
+
+
+@pytest.mark.parametrize('steps', [None, 100])
+def test_percent_capital_according_to_probability_by_order_type(steps):
+    rng = np.random.RandomState(6)
+    prob_positive, prob_negative = rng.uniform(0, 1, 50), rng.uniform(0, 1, 50)
+    order_type = np.where(rng.uniform(0, 1, 50) < 0.5, Consts.LONG, Consts.SHORT)
+    table = None if steps is None else Sizing.SizingTable(steps)
+
+    percent = Sizing.percent_capital_according_to_probability(prob_positive, prob_negative, order_type, table)
+    expected = [baseline_calc_invest(positive if order == Consts.LONG else negative)
+                for positive, negative, order in zip(prob_positive, prob_negative, order_type)]
+    np.testing.assert_array_equal(percent, expected)
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+from Analytics import AnalyticsFactory
+
+RISK_FREE_RATE = 0.005
+
+
+# The statistics of a single pair of storylines as computed before get_statistics_many, one value at a time
+def baseline_percentage_change(prices):
+    new_change_array = []
+    yesterday_price = None
+    for price in prices:
+        if yesterday_price is None:
+            new_change_array.append(0)
+            yesterday_price = price
+            continue
+        change = (price - yesterday_price) / yesterday_price
+        if abs(change) > 20:
+            new_change_array.append(new_change_array[-1])
+        else:
+            new_change_array.append(change)
+            yesterday_price = price
+    return new_change_array
+
+
+def baseline_alpha(benchmark_prices, acc_prices, beta):
+    last_benchmark_price = (benchmark_prices[-1] - benchmark_prices[0]) / benchmark_prices[0]
+    last_acc_price = (acc_prices[-1] - acc_prices[0]) / acc_prices[0]
+    return last_acc_price - RISK_FREE_RATE - beta * (last_benchmark_price - RISK_FREE_RATE)
+
+
+def baseline_beta(benchmark_change, acc_change):
+    mean_acc = np.mean(np.array(acc_change))
+    mean_benchmark = np.mean(np.array(benchmark_change))
+    total = 0
+    for benchmark_value, acc_value in zip(benchmark_change, acc_change):
+        total += ((acc_value - mean_acc) * (benchmark_value - mean_benchmark))
+    cov = total / (len(benchmark_change) - 1)
+    return cov / np.var(np.array(acc_change))
+
+
+def baseline_rsquared(benchmark_prices, acc_prices):
+    mean_acc = np.mean(acc_prices)
+    mean_benchmark = np.mean(benchmark_prices)
+    denominator = 0.0
+    numerator = 0.0
+    for benchmark_value, acc_value in zip(benchmark_prices, acc_prices):
+        numerator += (acc_value - mean_acc) * (benchmark_value - mean_benchmark)
+        denominator += ((acc_value - mean_acc) ** 2)
+    m = numerator / denominator
+    b = mean_benchmark - (m * mean_acc)
+
+    predicted_price = [(point * m) + b for point in acc_prices]
+    prediction_error = []
+    sum_errors = 0.0
+    for prediction, real_price in zip(predicted_price, benchmark_prices):
+        new_point = (prediction - real_price) ** 2
+        prediction_error.append(new_point)
+        sum_errors += new_point
+
+    average_error = sum_errors / len(benchmark_prices)
+    second_sum = 0.0
+    for pred_error in prediction_error:
+        second_sum += ((pred_error - average_error) ** 2)
+    return 1 - (sum_errors / second_sum)
+
+
+def baseline_standard_deviation(acc_change):
+    average_acc = np.average(np.array(acc_change))
+    sum_st = 0.0
+    for change in acc_change:
+        sum_st += ((average_acc - change) ** 2)
+    return np.sqrt(sum_st / (len(acc_change) - 1))
+
+
+def baseline_sharp_ratio(acc_change, standard_deviation):
+    mean = np.mean(np.array(acc_change))
+    if standard_deviation == 0:
+        standard_deviation = 0.00001
+    return (mean - RISK_FREE_RATE) / standard_deviation
+
+
+def baseline_statistics(acc_storyline, benchmark_storyline):
+    acc_change = baseline_percentage_change(acc_storyline)
+    benchmark_change = baseline_percentage_change(benchmark_storyline)
+    beta = baseline_beta(benchmark_change, acc_change)
+    standard_deviation = baseline_standard_deviation(acc_change)
+    return {'alpha': baseline_alpha(benchmark_storyline, acc_storyline, beta), 'beta': beta,
+            'rsquared': baseline_rsquared(benchmark_storyline, acc_storyline),
+            'standard_deviation': standard_deviation,
+            'sharp_ratio': baseline_sharp_ratio(acc_change, standard_deviation)}
+
+
+def storylines(rng, amount, ticks):
+    """
+    :return: np.array (amount, ticks) of random capital curves, some flat and some with a x20 jump
+    """
+    curves = 1000000 * np.exp(np.cumsum(rng.normal(0, 0.01, (amount, ticks)), axis=1))
+    curves[0, ticks // 3:] = curves[0, ticks // 3]  # no positions for a while
+    curves[1, ticks // 2] *= 30  # a change bigger than 20 is skipped
+    curves[2, ticks // 2:] *= 25
+    return curves
+
+
+def test_percentage_changes_matches_loop():
+    curves = storylines(np.random.RandomState(1), 6, 80)
+    changes = AnalyticsFactory.percentage_changes(curves)
+    for curve, change in zip(curves, changes):
+        np.testing.assert_array_equal(change, baseline_percentage_change(curve))
+
+
+@pytest.mark.parametrize('benchmarks_per_simulation', [False, True])
+def test_get_statistics_many_matches_loop(benchmarks_per_simulation):
+    rng = np.random.RandomState(2)
+    acc = storylines(rng, 6, 120)
+    if benchmarks_per_simulation:
+        benchmarks = storylines(rng, 6 * 2, 120).reshape(6, 2, 120)
+    else:
+        benchmarks = storylines(rng, 3, 120)
+
+    statistics = AnalyticsFactory.get_statistics_many(acc, benchmarks)
+    for simulation, acc_storyline in enumerate(acc):
+        simulation_benchmarks = benchmarks[simulation] if benchmarks_per_simulation else benchmarks
+        for benchmark, benchmark_storyline in enumerate(simulation_benchmarks):
+            expected = baseline_statistics(acc_storyline, benchmark_storyline)
+            for name, value in expected.items():
+                assert statistics[name][simulation, benchmark] == value, name
+
+
+def test_get_statistics_matches_loop():
+    rng = np.random.RandomState(4)
+    acc, benchmark, _ = storylines(rng, 3, 50)
+    result = AnalyticsFactory.get_statistics(7, 'ACC-benchmark_BTC', acc, benchmark)
+    assert result['simulation_id'] == 7 and result['subject'] == 'ACC-benchmark_BTC'
+    for name, value in baseline_statistics(acc, benchmark).items():
+        assert result[name] == value, name
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from Analytics.TopSimulations import TopSimulations, drop_details_below
+
+
+def result(simulation_id, roi):
+    return {'simulation_id': simulation_id, 'analytics': pd.DataFrame({'ACC_ROI': [roi]}),
+            'positions': pd.DataFrame(), 'capital_history': pd.DataFrame()}
+
+
+def test_top_simulations_keep_the_best_and_the_first_on_ties():
+    top = TopSimulations(2, 'ACC_ROI')
+    assert top.threshold() is None
+    top.add([result(0, 1.0), result(1, 3.0), result(2, np.nan), result(3, 3.0), result(4, 2.0)])
+    assert [item['simulation_id'] for item in top.results()] == [1, 3]
+    assert top.threshold() == 3.0
+
+
+def test_dropped_details_can_not_enter_the_top_simulations():
+    rng = np.random.RandomState(5)
+    rois = rng.choice([0.5, 1.0, 1.5, 2.0, np.nan], 60)
+    top = TopSimulations(5, 'ACC_ROI')
+    thresholds = [None, None]
+    for start in range(0, len(rois), 6):
+
+        # Tasks run with the threshold of when they were sent, which is behind the collected results
+        results = [result(simulation_id, rois[simulation_id]) for simulation_id in range(start, start + 6)]
+        top.add(drop_details_below(results, 'ACC_ROI', thresholds[-2]))
+        thresholds.append(top.threshold())
+
+    kept = top.results()
+    assert all(item['positions'] is not None and item['capital_history'] is not None for item in kept)
+    assert [item['simulation_id'] for item in kept] == \
+        sorted(range(len(rois)), key=lambda index: (-np.nan_to_num(rois[index], nan=-np.inf), index))[:5]